@@ -1,10 +1,13 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from django.db.models import Count, Q
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
-from dashboard.models import LogEntry, Anomaly
+from dashboard.models import LogEntry, Anomaly, LogRollup
+from dashboard.counters import get_counters
+from dashboard.iputils import InvalidCIDR, cidr_q
+from dashboard.rollups import rollup_queryset
 import json
 from django.conf import settings
 
@@ -17,8 +20,9 @@ def analytics_dashboard(request):
     start_date = end_date - timedelta(days=7)  # Last 7 days
     
     # Calculate key metrics
-    total_logs = LogEntry.objects.count()
-    total_anomalies = Anomaly.objects.count()
+    counters = get_counters()
+    total_logs = counters['total_logs']
+    total_anomalies = counters['total_anomalies']
     
     # Calculate anomaly rate
     anomaly_rate = 0
@@ -44,26 +48,37 @@ def analytics_dashboard(request):
     else:
         avg_response_time = 0
     
-    # Get anomaly data for charts
-    anomalies_by_date = Anomaly.objects.filter(
-        detected_at__range=(start_date, end_date)
-    ).extra(
-        select={'date': 'date(detected_at)'}
-    ).values('date').annotate(
-        count=Count('id')
-    ).order_by('date')
+    # Chart aggregates come from the day rollups, bucketed by log timestamp
+    anomalies_by_date = [
+        {'date': row['bucket'].date().isoformat(), 'count': row['count']}
+        for row in rollup_queryset(start_date, end_date, 'day')
+            .values('bucket')
+            .annotate(count=Sum('anomaly_count'))
+            .filter(count__gt=0)
+            .order_by('bucket')
+    ]
+    
+    all_rollups = LogRollup.objects.filter(resolution='day')
+    
+    # Host breakdowns can be narrowed to a subnet, e.g. ?cidr=10.0.0.0/8
+    host_rollups = all_rollups
+    cidr = request.GET.get('cidr')
+    cidr_error = None
+    if cidr:
+        try:
+            host_rollups = all_rollups.filter(cidr_q(cidr))
+        except InvalidCIDR as e:
+            cidr_error = str(e)
     
     # Get anomalies by source
-    anomalies_by_source = LogEntry.objects.filter(
-        anomalies__isnull=False
-    ).values('host_ip').annotate(
-        anomaly_count=Count('anomalies')
-    ).order_by('-anomaly_count')[:10]
+    anomalies_by_source = host_rollups.values('host_ip').annotate(
+        anomaly_count=Sum('anomaly_count')
+    ).filter(anomaly_count__gt=0).order_by('-anomaly_count')[:10]
     
     # Get anomaly categories (if available)
-    anomaly_categories = Anomaly.objects.values('log_entry__log_type').annotate(
-        count=Count('id')
-    ).exclude(log_entry__log_type='').order_by('-count')[:10]
+    anomaly_categories = all_rollups.exclude(log_type='').values('log_type').annotate(
+        count=Sum('anomaly_count')
+    ).filter(count__gt=0).order_by('-count')[:10]
     
     # Get anomaly score distribution
     score_ranges = [
@@ -98,11 +113,9 @@ def analytics_dashboard(request):
             item['percentage'] = 0
     
     # Get top anomaly sources with actual data
-    top_sources = LogEntry.objects.filter(
-        anomalies__isnull=False
-    ).values('host_ip', 'log_type').annotate(
-        anomaly_count=Count('anomalies')
-    ).order_by('-anomaly_count')[:5]
+    top_sources = host_rollups.values('host_ip', 'log_type').annotate(
+        anomaly_count=Sum('anomaly_count')
+    ).filter(anomaly_count__gt=0).order_by('-anomaly_count')[:5]
     
     # Calculate max for progress bar scaling
     max_anomaly_count = 0
@@ -136,6 +149,8 @@ def analytics_dashboard(request):
         'top_sources': top_sources_list,
         'start_date': start_date,
         'end_date': end_date,
+        'cidr': cidr,
+        'cidr_error': cidr_error,
     }
     
     return render(request, 'analytics/dashboard.html', context)
@@ -150,32 +165,34 @@ def api_chart_data(request):
     end_date = timezone.now()
     start_date = end_date - timedelta(days=days)
     
+    # Served from the rollups at a resolution chosen from the range
+    rollups = rollup_queryset(start_date, end_date)
+    
     if chart_type == 'line':
         # Log volume over time (ALL logs)
-        data = LogEntry.objects.filter(
-            timestamp__range=(start_date, end_date)
-        ).extra(
-            select={'date': 'date(timestamp)'}
-        ).values('date').annotate(
-            count=Count('id')
-        ).order_by('date')
+        data = rollup_queryset(start_date, end_date, 'day').values('bucket').annotate(
+            count=Sum('log_count')
+        ).filter(count__gt=0).order_by('bucket')
         
         return JsonResponse({
             'type': 'line',
-            'data': list(data),
+            'data': [{'date': row['bucket'].date().isoformat(), 'count': row['count']} for row in data],
             'x_axis': 'date',
             'y_axis': 'count',
             'title': f'Log Volume Over Time (Last {days} days)'
         })
     
     elif chart_type == 'bar':
-        # Anomalies by source
-        data = LogEntry.objects.filter(
-            anomalies__isnull=False,
-            timestamp__range=(start_date, end_date)
-        ).values('host_ip').annotate(
-            count=Count('anomalies')
-        ).order_by('-count')[:10]
+        # Anomalies by source, optionally within a subnet
+        cidr = request.GET.get('cidr')
+        if cidr:
+            try:
+                rollups = rollups.filter(cidr_q(cidr))
+            except InvalidCIDR as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        data = rollups.values('host_ip').annotate(
+            count=Sum('anomaly_count')
+        ).filter(count__gt=0).order_by('-count')[:10]
         
         return JsonResponse({
             'type': 'bar',
@@ -187,11 +204,9 @@ def api_chart_data(request):
     
     elif chart_type == 'pie':
         # Log Type Distribution (ALL logs, not just anomalies)
-        data = LogEntry.objects.filter(
-            timestamp__range=(start_date, end_date)
-        ).values('log_type').annotate(
-            count=Count('id')
-        ).exclude(log_type='').order_by('-count')[:10]
+        data = rollups.exclude(log_type='').values('log_type').annotate(
+            count=Sum('log_count')
+        ).filter(count__gt=0).order_by('-count')[:10]
         
         return JsonResponse({
             'type': 'pie',
@@ -1,6 +1,6 @@
 """Admin configuration for API models."""
 from django.contrib import admin
-from .models import Alert, SystemMetric, LogStatistic, RawModelOutput
+from .models import Alert, SystemMetric, SystemMetricRollup, LogStatistic, RawModelOutput
 
 
 @admin.register(Alert)
@@ -38,6 +38,15 @@ class SystemMetricAdmin(admin.ModelAdmin):
     date_hierarchy = 'timestamp'
 
 
+@admin.register(SystemMetricRollup)
+class SystemMetricRollupAdmin(admin.ModelAdmin):
+    """Admin interface for SystemMetricRollup model."""
+    list_display = ['id', 'bucket', 'resolution', 'school_id', 'metric_type', 'sample_count', 'value_min', 'value_max', 'unit']
+    list_filter = ['resolution', 'metric_type', 'school_id']
+    search_fields = ['metric_type', 'school_id']
+    date_hierarchy = 'bucket'
+
+
 @admin.register(LogStatistic)
 class LogStatisticAdmin(admin.ModelAdmin):
     """Admin interface for LogStatistic model."""
@@ -0,0 +1,105 @@
+"""
+Request body decompression for the ingestion API.
+
+Supports ``Content-Encoding: gzip`` (or its legacy alias ``x-gzip``) and,
+when the optional ``zstandard`` package is installed, ``Content-Encoding:
+zstd``. Decoding is streamed and the decompressed size is capped to guard
+against zip bombs.
+"""
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+
+# Legacy names (RFC 9110 section 8.4.1.3) decoded as their canonical encoding
+ENCODING_ALIASES = {'x-gzip': 'gzip'}
+
+
+class DecompressionError(Exception):
+    """The request body could not be decompressed."""
+
+
+class DecompressedBodyTooLarge(DecompressionError):
+    """The decompressed request body exceeded the configured limit."""
+
+
+def supported_encodings():
+    """Content-Encoding values accepted by the API."""
+    encodings = ['gzip']
+    if zstandard is not None:
+        encodings.append('zstd')
+    return encodings
+
+
+def normalize_encoding(encoding):
+    """The canonical name for a Content-Encoding value (``x-gzip`` -> ``gzip``)."""
+    encoding = (encoding or '').strip().lower()
+    return ENCODING_ALIASES.get(encoding, encoding)
+
+
+class _BoundedDecoder(io.RawIOBase):
+    """Raw stream that reads from a decoder and enforces a size limit."""
+
+    def __init__(self, decoder, max_size):
+        self._decoder = decoder
+        self._max_size = max_size
+        self._total = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        try:
+            data = self._decoder.read(len(buffer))
+        except (OSError, EOFError, zlib.error) as e:
+            raise DecompressionError(f'Malformed compressed body: {e}')
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                raise DecompressionError(f'Malformed compressed body: {e}')
+            raise
+
+        self._total += len(data)
+        if self._max_size and self._total > self._max_size:
+            raise DecompressedBodyTooLarge(
+                f'Decompressed body exceeds {self._max_size} bytes'
+            )
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_decompressed_stream(source, encoding, max_size=None):
+    """
+    Wrap the file-like ``source`` in a stream that yields decompressed bytes.
+
+    The returned object supports ``read`` and ``readline``. Reads raise
+    ``DecompressionError`` for corrupt input and ``DecompressedBodyTooLarge``
+    once more than ``max_size`` bytes have been produced.
+    """
+    encoding = normalize_encoding(encoding)
+    if encoding == 'gzip':
+        decoder = gzip.GzipFile(fileobj=source, mode='rb')
+    elif encoding == 'zstd' and zstandard is not None:
+        decoder = zstandard.ZstdDecompressor().stream_reader(source)
+    else:
+        raise DecompressionError(f'Unsupported Content-Encoding: {encoding}')
+
+    return io.BufferedReader(_BoundedDecoder(decoder, max_size))
+
+
+def decompress_body(source, encoding, max_size=None):
+    """Read and decompress the whole body from ``source``."""
+    return open_decompressed_stream(source, encoding, max_size).read()
+
+
+def compress_body(data, encoding, level=None):
+    """Compress ``data`` with ``encoding`` (used by clients and benchmarks)."""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level or 6)
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor(level=level or 3).compress(data)
+    raise ValueError(f'Unsupported encoding: {encoding}')
@@ -0,0 +1,224 @@
+"""
+Fast, schema-driven validation for the ingestion endpoints.
+
+DRF ModelSerializer re-builds its fields and runs a chain of validators for
+every item it sees, which dominates CPU time on high-volume ingestion. A
+``FastValidator`` compiles the serializer's writable fields into a flat
+list of coercion functions once, then validates plain dicts and returns
+model instances directly. Enabled per endpoint with
+API_FAST_VALIDATION_ENDPOINTS.
+
+Error messages follow the DRF ``{"field": ["message"]}`` shape.
+"""
+import math
+from datetime import datetime
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class FastValidationError(Exception):
+    """Raised by ``FastValidator.build`` with DRF-shaped ``errors``."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+_MISSING = object()
+
+
+def parse_iso_datetime(value):
+    """
+    Parse an ISO 8601 timestamp (``T`` or space separated, optional ``Z``).
+
+    Uses ``datetime.fromisoformat`` and only falls back to Django's regex
+    parser for forms it does not accept. Naive values are made aware in the
+    current time zone when USE_TZ is on. Raises ``ValueError``.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError('Datetime has wrong format.')
+    else:
+        raise ValueError('Datetime has wrong format.')
+
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _char_coercer(field):
+    max_length = field.max_length
+    choices = {str(choice) for choice, _ in field.flatchoices} if field.choices else None
+
+    def coerce(value):
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError('Not a valid string.')
+        value = str(value)
+        if not value and not field.blank:
+            raise ValueError('This field may not be blank.')
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f'Ensure this field has no more than {max_length} characters.')
+        if choices is not None and value not in choices:
+            raise ValueError(f'"{value}" is not a valid choice.')
+        return value
+    return coerce
+
+
+def _float_coerce(value):
+    if isinstance(value, bool):
+        raise ValueError('A valid number is required.')
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('A valid number is required.')
+    if math.isnan(value) or math.isinf(value):
+        raise ValueError('A valid number is required.')
+    return value
+
+
+def _int_coerce(value):
+    if isinstance(value, bool):
+        raise ValueError('A valid integer is required.')
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('A valid integer is required.')
+    if not number.is_integer():
+        raise ValueError('A valid integer is required.')
+    return int(number)
+
+
+_TRUE_VALUES = {True, 1, 'true', 'True', 'TRUE', '1', 'yes', 'on', 't', 'y'}
+_FALSE_VALUES = {False, 0, 'false', 'False', 'FALSE', '0', 'no', 'off', 'f', 'n'}
+
+
+def _bool_coerce(value):
+    try:
+        if value in _TRUE_VALUES:
+            return True
+        if value in _FALSE_VALUES:
+            return False
+    except TypeError:  # unhashable
+        pass
+    raise ValueError('Must be a valid boolean.')
+
+
+def _datetime_coerce(value):
+    return parse_iso_datetime(value)
+
+
+def _json_coerce(value):
+    return value
+
+
+def _compile_field(field):
+    """Return the coercion function for a model field."""
+    if isinstance(field, models.JSONField):
+        return _json_coerce
+    if isinstance(field, models.DateTimeField):
+        return _datetime_coerce
+    if isinstance(field, models.BooleanField):
+        return _bool_coerce
+    if isinstance(field, models.FloatField):
+        return _float_coerce
+    if isinstance(field, models.IntegerField):
+        return _int_coerce
+    if isinstance(field, (models.CharField, models.TextField)):
+        return _char_coercer(field)
+    raise TypeError(f'Unsupported field type for fast validation: {type(field).__name__}')
+
+
+class FastValidator:
+    """Validator compiled from a ModelSerializer's writable fields."""
+
+    def __init__(self, serializer_class):
+        meta = serializer_class.Meta
+        self.model = meta.model
+        read_only = set(getattr(meta, 'read_only_fields', ()))
+
+        self._fields = []
+        for name in meta.fields:
+            if name in read_only:
+                continue
+            field = self.model._meta.get_field(name)
+            required = not (field.has_default() or field.null or field.blank)
+            self._fields.append((name, _compile_field(field), required, field.null))
+
+    def validate(self, data):
+        """Return ``(attrs, errors)`` for one item; ``errors`` is empty when valid."""
+        if not isinstance(data, dict):
+            return None, {'non_field_errors': ['Invalid data. Expected a dictionary.']}
+
+        attrs = {}
+        errors = {}
+        for name, coerce, required, nullable in self._fields:
+            value = data.get(name, _MISSING)
+            if value is _MISSING:
+                if required:
+                    errors[name] = ['This field is required.']
+                continue
+            if value is None:
+                if nullable:
+                    attrs[name] = None
+                else:
+                    errors[name] = ['This field may not be null.']
+                continue
+            try:
+                attrs[name] = coerce(value)
+            except ValueError as e:
+                errors[name] = [str(e)]
+        return attrs, errors
+
+    def build(self, data):
+        """Return an unsaved model instance or raise ``FastValidationError``."""
+        attrs, errors = self.validate(data)
+        if errors:
+            raise FastValidationError(errors)
+        return self.model(**attrs)
+
+    def build_many(self, items):
+        """
+        Validate a list of items.
+
+        Returns ``(instances, valid_indexes, item_errors)`` with the same
+        meaning as ``BulkCreateListSerializer``.
+        """
+        instances = []
+        valid_indexes = []
+        item_errors = {}
+        model = self.model
+        for index, item in enumerate(items):
+            attrs, errors = self.validate(item)
+            if errors:
+                item_errors[index] = errors
+            else:
+                instances.append(model(**attrs))
+                valid_indexes.append(index)
+        return instances, valid_indexes, item_errors
+
+
+_validators = {}
+
+
+def get_fast_validator(serializer_class):
+    """Compiled validator for ``serializer_class`` (built once per process)."""
+    validator = _validators.get(serializer_class)
+    if validator is None:
+        validator = _validators[serializer_class] = FastValidator(serializer_class)
+    return validator
+
+
+def fast_validation_enabled(endpoint):
+    """Whether the endpoint (router basename) uses fast validation."""
+    return endpoint in getattr(settings, 'API_FAST_VALIDATION_ENDPOINTS', ())
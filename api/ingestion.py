@@ -0,0 +1,271 @@
+"""
+Log ingestion helpers shared by the log endpoints.
+
+Turns the JSON records pushed by the local consumer into ``LogEntry`` and
+``Anomaly`` rows. Batches are written with ``bulk_create`` inside a single
+transaction so a push cycle costs one SQLite write transaction. Streamed
+NDJSON bodies are committed in fixed-size chunks instead.
+
+In write-behind mode (see ``api.spool``) records are only validated here
+and appended to the spool; the drainer writes them later.
+"""
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from dashboard.counters import count_logs, count_anomalies
+from dashboard.iputils import pack_ip
+from dashboard.models import LogEntry, Anomaly
+from dashboard.rollups import record_logs, record_anomalies
+from dashboard.utils import invalidate_log_caches
+
+from .fast_validation import parse_iso_datetime
+from .parsers import iter_ndjson
+from .spool import get_spool
+
+
+DEFAULT_ANOMALY_THRESHOLD = 0.5
+
+
+def get_max_batch_size():
+    """Maximum number of records accepted in a single batch request."""
+    return getattr(settings, 'API_MAX_BATCH_SIZE', 5000)
+
+
+def get_stream_chunk_size():
+    """Number of streamed records committed per transaction."""
+    return getattr(settings, 'API_STREAM_CHUNK_SIZE', 1000)
+
+
+def get_stream_max_line_bytes():
+    """Longest NDJSON line accepted by the streaming endpoint."""
+    return getattr(settings, 'API_STREAM_MAX_LINE_BYTES', 1024 * 1024)
+
+
+def parse_log_timestamp(value):
+    """Parse a record timestamp, defaulting to now when it is missing."""
+    if not value:
+        return timezone.now()
+    return parse_iso_datetime(value)
+
+
+def get_string_field(record, key, default):
+    """``record[key]``, or ``default`` when missing; null and non-string values are rejected"""
+    value = record.get(key, default)
+    if not isinstance(value, str):
+        raise TypeError(f"'{key}' must be a string, not {'null' if value is None else type(value).__name__}")
+    return value
+
+
+def build_log_entry(record):
+    """
+    Build an unsaved ``LogEntry`` and the anomaly score for one record.
+
+    Returns ``(log_entry, anomaly_score)`` where ``anomaly_score`` is None
+    when the record is not flagged as an anomaly. Raises ``ValueError`` or
+    ``TypeError`` for malformed records.
+    """
+    if not isinstance(record, dict):
+        raise TypeError('Log record must be a JSON object')
+
+    host_ip = get_string_field(record, 'host', 'unknown')
+    log_entry = LogEntry(
+        timestamp=parse_log_timestamp(record.get('timestamp')),
+        host_ip=host_ip,
+        # bulk_create skips LogEntry.save(), so pack the address here
+        ip_numeric=pack_ip(host_ip),
+        log_type=get_string_field(record, 'log_type', 'INFO'),
+        source=get_string_field(record, 'source', 'unknown'),
+        log_message=get_string_field(record, 'message', ''),
+    )
+
+    anomaly_score = float(record.get('anomaly_score', 0.0))
+    if not record.get('is_anomaly', False):
+        anomaly_score = None
+    return log_entry, anomaly_score
+
+
+def ingest_log_records(records):
+    """
+    Validate and persist a batch of log records.
+
+    Valid records are inserted with ``bulk_create`` in one transaction;
+    invalid ones are skipped. If the database rejects the batch, the rows
+    are retried one at a time and those that still fail are reported as
+    errors. Returns a list with one result dict per input record, in input
+    order.
+    """
+    results = [None] * len(records)
+    pending = []
+
+    for index, record in enumerate(records):
+        try:
+            log_entry, anomaly_score = build_log_entry(record)
+        except (TypeError, ValueError) as e:
+            results[index] = {'index': index, 'status': 'error', 'message': str(e)}
+            continue
+        pending.append((index, log_entry, anomaly_score))
+
+    if not pending:
+        return results
+
+    try:
+        with transaction.atomic():
+            write_log_entries(pending, results)
+    except DatabaseError:
+        # One row the database rejects fails the whole bulk insert; retry
+        # row by row, each in its own savepoint, so only that row is lost
+        for index, log_entry, anomaly_score in pending:
+            log_entry.pk = None
+            log_entry._state.adding = True
+            try:
+                with transaction.atomic():
+                    write_log_entries([(index, log_entry, anomaly_score)], results)
+            except DatabaseError as e:
+                results[index] = {'index': index, 'status': 'error', 'message': f'Database error: {e}'}
+
+    return results
+
+
+def check_database():
+    """
+    Raise ``DatabaseError`` when the default database cannot run a query.
+
+    Callers use it to tell an outage from a batch of bad records when
+    every record of a batch failed.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def write_log_entries(pending, results):
+    """
+    Insert ``(index, log_entry, anomaly_score)`` items and fill in ``results``.
+
+    Call inside a transaction: the rows, rollups and counters are written
+    together or not at all.
+    """
+    LogEntry.objects.bulk_create([log_entry for _, log_entry, _ in pending])
+
+    anomalies = []
+    anomaly_indexes = []
+    for index, log_entry, anomaly_score in pending:
+        if anomaly_score is not None:
+            anomalies.append(Anomaly(
+                log_entry=log_entry,
+                anomaly_score=anomaly_score,
+                is_anomaly=True,
+                threshold=DEFAULT_ANOMALY_THRESHOLD,
+            ))
+            anomaly_indexes.append(index)
+    Anomaly.objects.bulk_create(anomalies)
+
+    # bulk_create does not send post_save; update the rollups and
+    # counters and bump the cache version once for the whole batch
+    log_entries = [log_entry for _, log_entry, _ in pending]
+    record_logs(log_entries)
+    record_anomalies(anomalies)
+    count_logs(log_entries)
+    count_anomalies(anomalies)
+    invalidate_log_caches()
+
+    for index, log_entry, _ in pending:
+        results[index] = {'index': index, 'status': 'created', 'log_id': log_entry.id}
+    for index, anomaly in zip(anomaly_indexes, anomalies):
+        results[index]['anomaly_id'] = anomaly.id
+
+
+def queue_log_records(records):
+    """
+    Validate a batch of log records and append the valid ones to the spool.
+
+    Returns one result dict per input record, like ``ingest_log_records``,
+    with status 'queued' instead of 'created'.
+    """
+    results = []
+    valid = []
+    for index, record in enumerate(records):
+        try:
+            build_log_entry(record)
+        except (TypeError, ValueError) as e:
+            results.append({'index': index, 'status': 'error', 'message': str(e)})
+            continue
+        valid.append(record)
+        results.append({'index': index, 'status': 'queued'})
+
+    get_spool().append(valid)
+    return results
+
+
+class StreamIngestResult:
+    """Running totals for a streamed ingestion request."""
+
+    # Cap the number of reported errors so the response stays small
+    MAX_REPORTED_ERRORS = 100
+
+    def __init__(self):
+        self.received = 0
+        self.created = 0
+        self.queued = 0
+        self.failed = 0
+        self.chunks = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < self.MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'message': message})
+
+    def as_dict(self):
+        return {
+            'received': self.received,
+            'created': self.created,
+            'queued': self.queued,
+            'failed': self.failed,
+            'chunks': self.chunks,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def ingest_log_stream(stream, encoding='utf-8', chunk_size=None, write_behind=False):
+    """
+    Ingest an NDJSON body read incrementally from ``stream``.
+
+    Records are committed every ``chunk_size`` lines, so peak memory is
+    bounded by one chunk regardless of the body size. A failure in a later
+    chunk does not roll back chunks that were already committed. With
+    ``write_behind`` each chunk is appended to the spool instead.
+    """
+    chunk_size = chunk_size or get_stream_chunk_size()
+    write_chunk = queue_log_records if write_behind else ingest_log_records
+    result = StreamIngestResult()
+    line_numbers = []
+    records = []
+
+    def flush():
+        for item in write_chunk(records):
+            if item['status'] == 'created':
+                result.created += 1
+            elif item['status'] == 'queued':
+                result.queued += 1
+            else:
+                result.add_error(line_numbers[item['index']], item['message'])
+        result.chunks += 1
+        line_numbers.clear()
+        records.clear()
+
+    for line_number, record, error in iter_ndjson(stream, encoding, get_stream_max_line_bytes()):
+        result.received += 1
+        if error:
+            result.add_error(line_number, error)
+            continue
+        line_numbers.append(line_number)
+        records.append(record)
+        if len(records) >= chunk_size:
+            flush()
+
+    if records:
+        flush()
+
+    return result
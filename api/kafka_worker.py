@@ -0,0 +1,485 @@
+"""
+Staged Kafka ingestion worker.
+
+Messages flow through four stages connected by bounded queues, so a slow
+stage applies back-pressure instead of buffering without limit:
+
+    fetch   poll the broker                           (thread)
+    parse   decode messages into API-style records,   (thread)
+            grouped into batches of ``batch_size``
+            (or whatever arrived within ``linger`` seconds)
+    infer   score each batch with one predict call    (thread)
+    write   ``ingest_log_records``: one bulk insert   (caller's thread)
+            and one cache-version bump per batch
+
+The version bump is the batch's single broadcast: the SSE stream and the
+WebSocket publisher (``dashboard.broadcast``) pick it up once for every
+subscriber.
+
+Offsets are committed only after a batch is persisted. Kafka consumers
+are not thread-safe, so the writer hands the batch's offsets back to the
+fetch thread, which commits them before its next poll. After a crash,
+batches that were persisted but not yet committed are delivered again
+(at-least-once, like the spool).
+
+``FakeBroker`` is an in-memory stand-in for a topic, used by tests and by
+``run_kafka_worker --fake N``.
+"""
+import json
+import queue
+import random
+import threading
+import time
+
+from .fast_validation import parse_iso_datetime
+from .ingestion import DEFAULT_ANOMALY_THRESHOLD, check_database, ingest_log_records
+
+
+STAGES = ('fetch', 'parse', 'infer', 'write')
+
+_STOP = object()
+
+
+class StageStats:
+    """Items handled and time spent working (not waiting) by one stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    def add(self, items, seconds, batches=1):
+        self.items += items
+        self.batches += batches
+        self.seconds += seconds
+
+    def as_dict(self):
+        return {
+            'items': self.items,
+            'batches': self.batches,
+            'seconds': self.seconds,
+            'rate': self.items / self.seconds if self.seconds else 0.0,
+        }
+
+
+class Batch:
+    def __init__(self):
+        self.records = []
+        self.positions = {}     # partition -> highest offset in the batch
+        self.messages = 0
+        self.invalid = 0
+        self.started = time.monotonic()
+
+    def add(self, partition, offset, record):
+        self.messages += 1
+        self.positions[partition] = max(offset, self.positions.get(partition, -1))
+        if record is None:
+            self.invalid += 1
+        else:
+            self.records.append(record)
+
+
+def parse_message(value):
+    """
+    Turn a message into a log record (the API's JSON shape).
+
+    Accepts a JSON object, or a plain ``<timestamp> <level> <message>``
+    line; lines without a leading timestamp are taken as the message.
+    Raises ``ValueError`` for anything else.
+    """
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    value = value.strip()
+    if not value:
+        raise ValueError('Empty message')
+    if value.startswith('{'):
+        record = json.loads(value)
+        if not isinstance(record, dict):
+            raise ValueError('Log record must be a JSON object')
+        return record
+
+    parts = value.split(None, 2)
+    try:
+        parse_iso_datetime(parts[0])
+    except ValueError:
+        return {'message': value}
+    record = {'timestamp': parts[0]}
+    if len(parts) > 1:
+        record['log_type'] = parts[1].upper()
+    record['message'] = parts[2] if len(parts) > 2 else ''
+    return record
+
+
+class FakeBroker:
+    """
+    In-memory topic with partitions and one consumer group.
+
+    Supports the worker's source interface (``poll``/``commit``/``close``)
+    plus ``produce``, ``lag`` and ``rewind`` (restart from the committed
+    offsets) for tests and dry runs.
+    """
+
+    def __init__(self, partitions=1):
+        self._lock = threading.Lock()
+        self.partitions = [[] for _ in range(partitions)]
+        self.positions = [0] * partitions
+        self.committed = [-1] * partitions
+        self._next_partition = 0
+
+    def produce(self, value, partition=None):
+        with self._lock:
+            if partition is None:
+                partition = self._next_partition
+                self._next_partition = (partition + 1) % len(self.partitions)
+            self.partitions[partition].append(value)
+
+    def poll(self, max_records, timeout):
+        with self._lock:
+            messages = []
+            for partition, log in enumerate(self.partitions):
+                while self.positions[partition] < len(log) and len(messages) < max_records:
+                    offset = self.positions[partition]
+                    messages.append((partition, offset, log[offset]))
+                    self.positions[partition] += 1
+        if not messages:
+            time.sleep(min(timeout, 0.01))
+        return messages
+
+    def commit(self, positions):
+        with self._lock:
+            for partition, offset in positions.items():
+                self.committed[partition] = max(self.committed[partition], offset)
+
+    def lag(self):
+        """Messages not yet committed"""
+        return sum(len(log) - (self.committed[p] + 1) for p, log in enumerate(self.partitions))
+
+    def rewind(self):
+        with self._lock:
+            self.positions = [offset + 1 for offset in self.committed]
+
+    def close(self):
+        pass
+
+
+class KafkaSource:
+    """kafka-python consumer with manual commits, adapted to the worker's source interface"""
+
+    def __init__(self, bootstrap_servers, topic, group_id):
+        from kafka import KafkaConsumer
+
+        self.consumer = KafkaConsumer(
+            topic,
+            bootstrap_servers=bootstrap_servers,
+            group_id=group_id,
+            enable_auto_commit=False,
+            auto_offset_reset='earliest',
+        )
+
+    def poll(self, max_records, timeout):
+        polled = self.consumer.poll(timeout_ms=int(timeout * 1000), max_records=max_records)
+        return [
+            (partition, message.offset, message.value)
+            for partition, messages in polled.items()
+            for message in messages
+        ]
+
+    def commit(self, positions):
+        from kafka.structs import OffsetAndMetadata
+
+        # Kafka commits the next offset to read
+        self.consumer.commit({
+            partition: OffsetAndMetadata(offset + 1, '', -1)
+            for partition, offset in positions.items()
+        })
+
+    def close(self):
+        self.consumer.close(autocommit=False)
+
+
+def model_predict():
+    """``ModelManager.predict_batch``; imported here so the worker loads torch only when scoring"""
+    from dashboard.ml_utils import ModelManager
+
+    manager = ModelManager()
+    manager.ensure_loaded()
+    if isinstance(manager.load_error, ImportError):
+        # torch/transformers (or onnxruntime) missing: scoring would only return defaults
+        raise manager.load_error
+    return manager.predict_batch
+
+
+class StagedIngestWorker:
+    """
+    Run the fetch/parse/infer/write pipeline over ``source``.
+
+    ``predict(messages) -> scores`` scores each batch; with None the
+    records keep the ``anomaly_score``/``is_anomaly`` they arrived with
+    (pre-scored pushes). With a ``dynamic_threshold``
+    (``dashboard.dynamic_threshold.DynamicThreshold``) the scores are
+    flagged against its current value, which it recomputes from them.
+    ``once`` stops when the source has nothing more to give;
+    ``max_messages`` stops after that many messages.
+    """
+
+    def __init__(self, source, predict=None, batch_size=500, linger=0.5, queue_size=4,
+                 threshold=DEFAULT_ANOMALY_THRESHOLD, once=False, max_messages=None, dynamic_threshold=None):
+        self.source = source
+        self.predict = predict
+        self.batch_size = batch_size
+        self.linger = linger
+        self.threshold = threshold
+        self.dynamic_threshold = dynamic_threshold
+        self.once = once
+        self.max_messages = max_messages
+
+        self.parse_queue = queue.Queue(maxsize=queue_size)
+        self.infer_queue = queue.Queue(maxsize=queue_size)
+        self.write_queue = queue.Queue(maxsize=queue_size)
+        self.commit_queue = queue.Queue()
+
+        self.stats = {name: StageStats(name) for name in STAGES}
+        self.totals = {'created': 0, 'failed': 0, 'invalid': 0, 'committed_batches': 0}
+        self.started = None
+        self._stop = threading.Event()
+        self._writer_done = threading.Event()
+        self._errors = []
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self):
+        """Per-stage stats, totals and the overall rate"""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        written = self.stats['write'].items
+        return {
+            'stages': {name: stats.as_dict() for name, stats in self.stats.items()},
+            'totals': dict(self.totals),
+            'threshold': self.dynamic_threshold.threshold if self.dynamic_threshold else self.threshold,
+            'elapsed': elapsed,
+            'rate': written / elapsed if elapsed else 0.0,
+        }
+
+    # Queue helpers: never block forever, so a stopped pipeline can drain
+
+    def _put(self, target, item):
+        while True:
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                # Nobody downstream will take it after a failure or once
+                # the writer has exited
+                if self._errors or self._writer_done.is_set():
+                    return
+
+    def _fail(self, error):
+        self._errors.append(error)
+        self._stop.set()
+
+    # Stages
+
+    def _commit_pending(self):
+        positions = {}
+        while True:
+            try:
+                batch_positions = self.commit_queue.get_nowait()
+            except queue.Empty:
+                break
+            for partition, offset in batch_positions.items():
+                positions[partition] = max(offset, positions.get(partition, -1))
+        if positions:
+            self.source.commit(positions)
+
+    def _fetch(self):
+        stats = self.stats['fetch']
+        try:
+            while not self._stop.is_set():
+                self._commit_pending()
+                limit = self.batch_size
+                if self.max_messages is not None:
+                    limit = min(limit, self.max_messages - stats.items)
+                    if limit <= 0:
+                        break
+
+                started = time.monotonic()
+                messages = self.source.poll(limit, self.linger)
+                if not messages:
+                    if self.once:
+                        break
+                    continue
+                stats.add(len(messages), time.monotonic() - started)
+                self._put(self.parse_queue, messages)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.parse_queue, _STOP)
+            # Commit what the writer persists after the last poll
+            while not self._writer_done.wait(0.05):
+                self._commit_pending()
+            try:
+                self._commit_pending()
+            except Exception as e:
+                self._fail(e)
+
+    def _parse(self):
+        stats = self.stats['parse']
+        batch = Batch()
+        try:
+            while True:
+                timeout = max(0.0, self.linger - (time.monotonic() - batch.started))
+                try:
+                    messages = self.parse_queue.get(timeout=timeout)
+                except queue.Empty:
+                    messages = None
+
+                if messages is _STOP:
+                    break
+                if messages:
+                    started = time.monotonic()
+                    for partition, offset, value in messages:
+                        try:
+                            record = parse_message(value)
+                        except (ValueError, UnicodeDecodeError):
+                            record = None
+                        batch.add(partition, offset, record)
+                    stats.add(len(messages), time.monotonic() - started, batches=0)
+
+                lingered = time.monotonic() - batch.started >= self.linger
+                if batch.messages >= self.batch_size or (batch.messages and lingered):
+                    stats.batches += 1
+                    self._put(self.infer_queue, batch)
+                    batch = Batch()
+                elif not batch.messages and lingered:
+                    batch.started = time.monotonic()
+            if batch.messages:
+                stats.batches += 1
+                self._put(self.infer_queue, batch)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.infer_queue, _STOP)
+
+    def _infer(self):
+        stats = self.stats['infer']
+        try:
+            while True:
+                batch = self.infer_queue.get()
+                if batch is _STOP:
+                    break
+                started = time.monotonic()
+                if self.predict is not None and batch.records:
+                    scores = self.predict([str(record.get('message', '')) for record in batch.records])
+                    threshold = self.dynamic_threshold.threshold if self.dynamic_threshold else self.threshold
+                    for record, score in zip(batch.records, scores):
+                        record['anomaly_score'] = float(score)
+                        record['is_anomaly'] = score > threshold
+                    if self.dynamic_threshold:
+                        self.dynamic_threshold.observe(scores)
+                stats.add(len(batch.records), time.monotonic() - started)
+                self._put(self.write_queue, batch)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._put(self.write_queue, _STOP)
+
+    def _write(self):
+        stats = self.stats['write']
+        try:
+            while True:
+                batch = self.write_queue.get()
+                if batch is _STOP:
+                    break
+                if self._errors:
+                    # An upstream stage failed: leave the rest uncommitted
+                    continue
+                started = time.monotonic()
+                # Records the database rejects come back as per-record
+                # errors: they count as failed and their offsets are
+                # committed like the rest, so one bad message cannot stall
+                # the partition
+                results = ingest_log_records(batch.records) if batch.records else []
+                created = sum(1 for result in results if result['status'] == 'created')
+                if results and not created:
+                    # Nothing written may mean the database is down: raise
+                    # (leaving the offsets uncommitted) if it is unreachable
+                    check_database()
+                stats.add(batch.messages, time.monotonic() - started)
+
+                self.totals['created'] += created
+                self.totals['failed'] += len(results) - created
+                self.totals['invalid'] += batch.invalid
+                self.totals['committed_batches'] += 1
+                # Persisted: the fetch thread may now commit these offsets
+                self.commit_queue.put(batch.positions)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._writer_done.set()
+
+    def run(self, progress=None, progress_interval=10.0):
+        """
+        Run until stopped (or drained with ``once``); returns ``report()``.
+
+        The write stage runs in the calling thread, so database work uses
+        the caller's connection. ``progress(report)`` is called about every
+        ``progress_interval`` seconds. Re-raises the first stage error.
+        """
+        self.started = time.monotonic()
+        threads = [
+            threading.Thread(target=target, name=f'kafka-worker-{name}', daemon=True)
+            for name, target in (('fetch', self._fetch), ('parse', self._parse), ('infer', self._infer))
+        ]
+        for thread in threads:
+            thread.start()
+
+        if progress:
+            reporter = threading.Thread(
+                target=self._report_loop, args=(progress, progress_interval), daemon=True
+            )
+            reporter.start()
+
+        try:
+            self._write()
+        finally:
+            # Normally a no-op (the pipeline has drained); on an interrupt
+            # the batches in flight stay uncommitted and are redelivered
+            self.stop()
+            for thread in threads:
+                thread.join()
+            self.source.close()
+
+        if self._errors:
+            raise self._errors[0]
+        return self.report()
+
+    def _report_loop(self, progress, interval):
+        while not self._writer_done.wait(interval):
+            progress(self.report())
+
+
+def fake_messages(count, seed=42, anomaly_rate=0.05):
+    """JSON log messages shaped like the local consumer's output"""
+    rng = random.Random(seed)
+    hosts = [f'192.168.{rng.randint(0, 3)}.{rng.randint(1, 254)}' for _ in range(50)]
+    messages = [
+        'GET /index.html HTTP/1.1 200 5123',
+        'Failed password for invalid user admin from 203.0.113.45 port 52311 ssh2',
+        'Accepted publickey for deploy from 10.0.0.12 port 40022 ssh2',
+        'Database query executed in 2.3 seconds',
+        'Connection timeout after 30 seconds',
+        'kernel: eth0: link up, 1000 Mbps, full duplex',
+    ]
+    for _ in range(count):
+        score = rng.random()
+        record = {
+            'host': rng.choice(hosts),
+            'log_type': rng.choice(['INFO', 'INFO', 'INFO', 'WARNING', 'ERROR']),
+            'source': rng.choice(['apache', 'linux', 'firewall']),
+            'message': rng.choice(messages),
+        }
+        if score < anomaly_rate:
+            record.update(anomaly_score=round(0.5 + score * 10, 4), is_anomaly=True)
+        yield json.dumps(record).encode()
+
@@ -0,0 +1,64 @@
+"""
+Django management command to downsample and expire SystemMetric samples
+Usage: python manage.py apply_metric_retention [--once] [--interval 300]
+
+Also drops log rollup minute buckets past LOG_ROLLUP_MINUTE_RETENTION_DAYS.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.retention import apply_retention, get_cutoffs
+from dashboard.rollups import minute_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Fold expired SystemMetric samples into minute/hour buckets and drop expired buckets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Apply the retention policy once, then exit (for cron)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'METRIC_RETENTION_BATCH_SIZE', 5000),
+            help='Rows processed per transaction',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=300.0,
+            help='Seconds between runs when not using --once',
+        )
+
+    def handle(self, *args, **options):
+        cutoffs = get_cutoffs()
+        self.stdout.write(
+            f"🗜️  Metric retention: raw before {cutoffs['raw']:%Y-%m-%d %H:%M}, "
+            f"minute buckets before {cutoffs['minute']:%Y-%m-%d %H:%M}, "
+            f"hour buckets before {cutoffs['hour']:%Y-%m-%d %H:%M} (UTC)"
+        )
+        self.stdout.write(f"🗜️  Log rollups: minute buckets before {minute_cutoff():%Y-%m-%d %H:%M} (UTC)")
+        try:
+            while True:
+                start = time.time()
+                result = apply_retention(batch_size=options['batch_size'])
+                if result['batches']:
+                    self.stdout.write(
+                        f"  - Downsampled {result['downsampled']} samples, dropped "
+                        f"{result['minute_deleted']} minute and {result['hour_deleted']} hour buckets "
+                        f"and {result['log_minute_deleted']} log rollup minute buckets "
+                        f"in {time.time() - start:.2f}s"
+                    )
+
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('✅ Metric retention applied'))
@@ -0,0 +1,200 @@
+"""
+Django management command to benchmark the log ingestion path
+Usage: python manage.py benchmark_ingestion --compression
+       python manage.py benchmark_ingestion --validator
+"""
+import io
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.compression import compress_body, open_decompressed_stream, supported_encodings
+from api.fast_validation import FastValidator
+from api.parsers import iter_ndjson
+from api.serializers import AlertSerializer, SystemMetricSerializer, RawModelOutputSerializer
+
+
+SAMPLE_MESSAGES = [
+    "GET /index.html HTTP/1.1 200 5123",
+    "Failed password for invalid user admin from 203.0.113.45 port 52311 ssh2",
+    "Accepted publickey for deploy from 10.0.0.12 port 40022 ssh2",
+    "Database query executed in 2.3 seconds",
+    "Connection timeout after 30 seconds",
+    "POST /api/v1/login HTTP/1.1 401 312",
+    "kernel: eth0: link up, 1000 Mbps, full duplex",
+    "CRON[2211]: (root) CMD (run-parts /etc/cron.hourly)",
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark log ingestion payload handling'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--compression',
+            action='store_true',
+            help='Compare wall time and bytes on the wire for each Content-Encoding',
+        )
+        parser.add_argument(
+            '--validator',
+            action='store_true',
+            help='Compare DRF serializer and fast validator throughput (no database writes)',
+        )
+        parser.add_argument(
+            '--records',
+            type=int,
+            default=20000,
+            help='Number of log records in the benchmark payload',
+        )
+        parser.add_argument(
+            '--bandwidth-kbps',
+            type=float,
+            default=1024.0,
+            help='Simulated uplink bandwidth used to estimate transfer time',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for the generated payload',
+        )
+
+    def handle(self, *args, **options):
+        if options['compression']:
+            self.benchmark_compression(options)
+        if options['validator']:
+            self.benchmark_validator(options)
+
+    def build_payload(self, count, seed):
+        """Build an NDJSON payload that looks like a push cycle"""
+        rng = random.Random(seed)
+        lines = []
+        for i in range(count):
+            score = rng.random()
+            lines.append(json.dumps({
+                'timestamp': f'2025-11-06 02:{(i // 60) % 60:02d}:{i % 60:02d}',
+                'host': f'192.168.{rng.randint(0, 3)}.{rng.randint(1, 254)}',
+                'log_type': rng.choice(['INFO', 'INFO', 'INFO', 'WARNING', 'ERROR']),
+                'source': rng.choice(['apache', 'linux', 'firewall']),
+                'message': rng.choice(SAMPLE_MESSAGES),
+                'anomaly_score': round(score, 4),
+                'is_anomaly': score > 0.95,
+            }))
+        return ('\n'.join(lines) + '\n').encode()
+
+    def benchmark_compression(self, options):
+        """Compare identity/gzip/zstd for a generated payload"""
+        payload = self.build_payload(options['records'], options['seed'])
+        bytes_per_second = options['bandwidth_kbps'] * 1000 / 8
+
+        self.stdout.write(self.style.SUCCESS('=== Ingestion Compression Benchmark ==='))
+        self.stdout.write(
+            f"Records: {options['records']:,}  Payload: {len(payload) / 1024:.1f} KB  "
+            f"Uplink: {options['bandwidth_kbps']:.0f} kbps"
+        )
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'encoding':<10}{'wire KB':>12}{'ratio':>8}{'compress s':>13}"
+            f"{'transfer s':>13}{'decode s':>11}{'total s':>10}"
+        )
+
+        for encoding in ['identity'] + supported_encodings():
+            start = time.perf_counter()
+            body = payload if encoding == 'identity' else compress_body(payload, encoding)
+            compress_time = time.perf_counter() - start
+
+            transfer_time = len(body) / bytes_per_second
+
+            # Server side: decode and parse the body as the streaming endpoint does
+            start = time.perf_counter()
+            stream = io.BytesIO(body)
+            if encoding != 'identity':
+                stream = open_decompressed_stream(stream, encoding)
+            parsed = sum(1 for _, record, _ in iter_ndjson(stream) if record is not None)
+            decode_time = time.perf_counter() - start
+
+            if parsed != options['records']:
+                self.stdout.write(self.style.ERROR(f'{encoding}: parsed {parsed} records'))
+                continue
+
+            total = compress_time + transfer_time + decode_time
+            self.stdout.write(
+                f"{encoding:<10}{len(body) / 1024:>12.1f}{len(payload) / len(body):>7.1f}x"
+                f"{compress_time:>13.3f}{transfer_time:>13.3f}{decode_time:>11.3f}{total:>10.3f}"
+            )
+
+        if 'zstd' not in supported_encodings():
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING('zstd skipped: install the "zstandard" package to enable it'))
+
+    def build_items(self, serializer_class, count, seed):
+        """Build request items for one of the ingestion viewsets"""
+        rng = random.Random(seed)
+        items = []
+        for i in range(count):
+            timestamp = f'2025-11-06T02:{(i // 60) % 60:02d}:{i % 60:02d}Z'
+            school_id = f'school-{rng.randint(1, 20):03d}'
+            if serializer_class is AlertSerializer:
+                items.append({
+                    'timestamp': timestamp,
+                    'school_id': school_id,
+                    'alert_level': rng.choice(['low', 'medium', 'high', 'critical']),
+                    'anomaly_score': round(rng.random(), 4),
+                    'affected_systems': [f'192.168.1.{rng.randint(1, 254)}'],
+                    'summary': rng.choice(SAMPLE_MESSAGES),
+                    'log_count': rng.randint(1, 500),
+                })
+            elif serializer_class is SystemMetricSerializer:
+                items.append({
+                    'timestamp': timestamp,
+                    'school_id': school_id,
+                    'metric_type': rng.choice(['cpu', 'memory', 'processing_time']),
+                    'value': round(rng.uniform(0, 100), 2),
+                    'unit': 'percent',
+                    'metadata': {'host': f'node-{rng.randint(1, 8)}'},
+                })
+            else:
+                items.append({
+                    'timestamp': timestamp,
+                    'school_id': school_id,
+                    'model_name': rng.choice(['apache_full', 'linux_full']),
+                    'log_sequence': rng.choice(SAMPLE_MESSAGES),
+                    'masked_predictions': [rng.randint(0, 1000) for _ in range(8)],
+                    'anomaly_scores': [round(rng.random(), 4) for _ in range(8)],
+                    'is_anomaly': rng.random() > 0.95,
+                    'confidence_score': round(rng.random(), 4),
+                })
+        return items
+
+    def benchmark_validator(self, options):
+        """Compare BulkCreateListSerializer and FastValidator on the same items"""
+        count = options['records']
+
+        self.stdout.write(self.style.SUCCESS('=== Ingestion Validator Benchmark ==='))
+        self.stdout.write(f'Records per endpoint: {count:,}')
+        self.stdout.write('')
+        self.stdout.write(f"{'serializer':<28}{'DRF rec/s':>14}{'fast rec/s':>14}{'speedup':>10}")
+
+        for serializer_class in [AlertSerializer, SystemMetricSerializer, RawModelOutputSerializer]:
+            items = self.build_items(serializer_class, count, options['seed'])
+
+            start = time.perf_counter()
+            serializer = serializer_class(data=items, many=True)
+            serializer.is_valid()
+            drf_time = time.perf_counter() - start
+
+            validator = FastValidator(serializer_class)
+            start = time.perf_counter()
+            instances, _, item_errors = validator.build_many(items)
+            fast_time = time.perf_counter() - start
+
+            if item_errors or serializer.item_errors:
+                self.stdout.write(self.style.ERROR(f'{serializer_class.__name__}: items failed validation'))
+                continue
+
+            self.stdout.write(
+                f"{serializer_class.__name__:<28}{count / drf_time:>14,.0f}"
+                f"{len(instances) / fast_time:>14,.0f}{drf_time / fast_time:>9.1f}x"
+            )
@@ -0,0 +1,86 @@
+"""
+Django management command to load spooled logs into the database
+Usage: python manage.py drain_ingest_spool [--once] [--stats]
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.spool import drain_spool, get_spool
+
+
+class Command(BaseCommand):
+    help = 'Drain the write-behind ingestion spool into LogEntry/Anomaly in large batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain until the spool is empty, then exit',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print queue depth and lag, then exit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'LOG_SPOOL_DRAIN_BATCH_SIZE', 5000),
+            help='Records inserted per database transaction',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the spool is empty',
+        )
+
+    def handle(self, *args, **options):
+        spool = get_spool()
+
+        if options['stats']:
+            self.print_stats(spool.stats())
+            return
+
+        self.stdout.write(f'📥 Draining spool {spool.path} (batch size {options["batch_size"]})')
+        try:
+            while True:
+                start = time.time()
+                try:
+                    drained = drain_spool(spool, options['batch_size'])
+                except Exception as e:
+                    # e.g. the database is unavailable: nothing was acknowledged, try again later
+                    if options['once']:
+                        raise CommandError(f'Drain failed: {e}')
+                    self.stdout.write(self.style.ERROR(f'❌ Drain failed: {e}; retrying in {options["interval"]}s'))
+                    time.sleep(options['interval'])
+                    continue
+                if drained:
+                    duration = time.time() - start
+                    stats = spool.stats()
+                    self.stdout.write(
+                        f'  - Loaded {drained} records in {duration:.2f}s '
+                        f'({drained / duration if duration else 0:.0f}/s), '
+                        f'depth {stats["depth"]}, lag {stats["lag_seconds"]:.1f}s'
+                    )
+                    continue
+
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('✅ Spool drained'))
+        self.print_stats(spool.stats())
+
+    def print_stats(self, stats):
+        self.stdout.write('📊 Ingestion spool:')
+        self.stdout.write(f'  - Queue depth: {stats["depth"]}')
+        self.stdout.write(f'  - Lag (oldest queued record): {stats["lag_seconds"]:.1f}s')
+        self.stdout.write(f'  - Enqueued total: {stats["enqueued_total"]}')
+        self.stdout.write(f'  - Drained total: {stats["drained_total"]}')
+        self.stdout.write(f'  - Failed total: {stats["failed_total"]}')
+        self.stdout.write(f'  - Rejected records kept: {stats["rejected"]}')
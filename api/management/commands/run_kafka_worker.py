@@ -0,0 +1,127 @@
+"""
+Django management command to ingest logs from Kafka in micro-batches
+Usage: python manage.py run_kafka_worker [--topic logs] [--batch-size 500] [--no-model]
+       python manage.py run_kafka_worker --fake 100000 --no-model
+
+Runs outside the web process. Offsets are committed after each batch is
+persisted; see api.kafka_worker for the stage layout.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingestion import DEFAULT_ANOMALY_THRESHOLD
+from api.kafka_worker import STAGES, FakeBroker, KafkaSource, StagedIngestWorker, fake_messages, model_predict
+from dashboard.dynamic_threshold import DynamicThreshold
+from dashboard.models import PlatformSettings
+
+
+class Command(BaseCommand):
+    help = 'Consume logs from Kafka through fetch/parse/infer/write stages with micro-batching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bootstrap-servers', help='Kafka brokers (default: platform settings)')
+        parser.add_argument('--topic', help='Topic to consume (default: platform settings)')
+        parser.add_argument('--group-id', default='log-ingest-worker', help='Consumer group')
+        parser.add_argument('--batch-size', type=int, default=500, help='Messages per batch')
+        parser.add_argument(
+            '--linger',
+            type=float,
+            default=0.5,
+            help='Seconds to wait for a batch to fill before sending it on',
+        )
+        parser.add_argument('--queue-size', type=int, default=4, help='Batches buffered between stages')
+        parser.add_argument(
+            '--no-model',
+            action='store_true',
+            help='Skip inference and keep the anomaly_score/is_anomaly sent with each record',
+        )
+        parser.add_argument(
+            '--fixed-threshold',
+            action='store_true',
+            help='Keep the platform anomaly threshold instead of recomputing it from recent scores',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the topic has no more messages',
+        )
+        parser.add_argument('--max-messages', type=int, help='Exit after this many messages')
+        parser.add_argument(
+            '--fake',
+            type=int,
+            metavar='N',
+            help='Use an in-memory broker preloaded with N generated messages (implies --once)',
+        )
+        parser.add_argument('--report-interval', type=float, default=10.0, help='Seconds between progress lines')
+
+    def handle(self, *args, **options):
+        platform = PlatformSettings.objects.first()
+        threshold = platform.anomaly_threshold if platform else DEFAULT_ANOMALY_THRESHOLD
+
+        if options['fake'] is not None:
+            source = FakeBroker(partitions=3)
+            for message in fake_messages(options['fake']):
+                source.produce(message)
+            options['once'] = True
+            self.stdout.write(f"🧪 In-memory broker with {options['fake']:,} messages")
+        else:
+            servers = options['bootstrap_servers'] or (platform.kafka_broker_url if platform else 'localhost:9092')
+            topic = options['topic'] or (platform.kafka_topic_logs if platform else 'logs')
+            try:
+                source = KafkaSource(servers, topic, options['group_id'])
+            except ImportError:
+                raise CommandError('kafka-python is not installed')
+            self.stdout.write(f'📥 Consuming {topic} from {servers} as {options["group_id"]}')
+
+        predict = None
+        if not options['no_model']:
+            try:
+                predict = model_predict()
+            except ImportError as e:
+                raise CommandError(f'Model dependencies are missing ({e}); use --no-model for pre-scored records')
+
+        dynamic_threshold = None
+        if predict is not None and not options['fixed_threshold']:
+            # Resume from the last saved threshold (see dashboard.dynamic_threshold)
+            dynamic_threshold = DynamicThreshold.load(threshold)
+            self.stdout.write(f'🎯 Dynamic anomaly threshold, starting at {dynamic_threshold.threshold:.4f}')
+        worker = StagedIngestWorker(
+            source,
+            predict=predict,
+            batch_size=options['batch_size'],
+            linger=options['linger'],
+            queue_size=options['queue_size'],
+            threshold=threshold,
+            once=options['once'],
+            max_messages=options['max_messages'],
+            dynamic_threshold=dynamic_threshold,
+        )
+
+        try:
+            report = worker.run(progress=self.print_progress, progress_interval=options['report_interval'])
+        except KeyboardInterrupt:
+            report = worker.report()
+            self.stdout.write(self.style.WARNING('⏹️  Interrupted; uncommitted batches will be redelivered'))
+
+        self.print_report(report)
+
+    def print_progress(self, report):
+        totals = report['totals']
+        self.stdout.write(
+            f"  - {totals['created']:,} logs written, {totals['committed_batches']} batches, "
+            f"{report['rate']:,.0f} msg/s"
+        )
+
+    def print_report(self, report):
+        totals = report['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {totals['created']:,} logs in {report['elapsed']:.1f}s ({report['rate']:,.0f} msg/s end to end)"
+        ))
+        self.stdout.write(f"  - Anomaly threshold: {report['threshold']:.4f}")
+        self.stdout.write(f"  - Failed (validation or database): {totals['failed']:,}, unparseable: {totals['invalid']:,}")
+        self.stdout.write('  Stage throughput (items per busy second):')
+        for name in STAGES:
+            stage = report['stages'][name]
+            self.stdout.write(
+                f"  - {name:<6} {stage['items']:>10,} items {stage['batches']:>6,} batches "
+                f"{stage['seconds']:>8.2f}s busy {stage['rate']:>12,.0f}/s"
+            )
@@ -0,0 +1,77 @@
+"""
+Middleware for the ingestion API.
+"""
+import io
+
+from django.conf import settings
+from django.http import JsonResponse
+
+from .compression import (
+    DecompressionError, DecompressedBodyTooLarge,
+    decompress_body, normalize_encoding, open_decompressed_stream, supported_encodings
+)
+
+
+def streams_request_body(view_func):
+    """
+    Mark a view as reading its request body incrementally.
+
+    Compressed bodies for marked views are decompressed on the fly as the
+    view reads them instead of being decoded into memory up front.
+    """
+    view_func.streams_request_body = True
+    return view_func
+
+
+class RequestDecompressionMiddleware:
+    """
+    Decompress gzip/zstd request bodies sent to the API before DRF parses them.
+
+    Requests with a ``Content-Encoding`` header under ``/api/`` have their
+    body replaced by the decoded bytes, so parsers and serializers see plain
+    JSON/NDJSON. The decompressed size is capped by
+    API_MAX_DECOMPRESSED_BODY_SIZE (API_MAX_DECOMPRESSED_STREAM_SIZE for
+    streaming views) to guard against zip bombs.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        encoding = normalize_encoding(request.META.get('HTTP_CONTENT_ENCODING'))
+        if not encoding or not request.path.startswith('/api/'):
+            return None
+
+        if encoding == 'identity':
+            del request.META['HTTP_CONTENT_ENCODING']
+            return None
+
+        if encoding not in supported_encodings():
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Unsupported Content-Encoding: {encoding}',
+                'supported': supported_encodings(),
+            }, status=415)
+
+        if getattr(view_func, 'streams_request_body', False):
+            # Decode lazily as the view reads; errors surface from the view
+            max_size = getattr(settings, 'API_MAX_DECOMPRESSED_STREAM_SIZE', 2 * 1024 ** 3)
+            request._stream = open_decompressed_stream(request._stream, encoding, max_size)
+        else:
+            max_size = getattr(settings, 'API_MAX_DECOMPRESSED_BODY_SIZE', 64 * 1024 * 1024)
+            try:
+                body = decompress_body(request._stream, encoding, max_size)
+            except DecompressedBodyTooLarge as e:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=413)
+            except DecompressionError as e:
+                return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+            request._stream = io.BytesIO(body)
+            request.META['CONTENT_LENGTH'] = str(len(body))
+
+        request._read_started = False
+        del request.META['HTTP_CONTENT_ENCODING']
+        return None
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_localsystemstatus'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('school_id', models.CharField(max_length=100)),
+                ('metric_type', models.CharField(max_length=50)),
+                ('unit', models.CharField(max_length=20)),
+                ('sample_count', models.IntegerField(default=0)),
+                ('value_sum', models.FloatField(default=0.0)),
+                ('value_min', models.FloatField()),
+                ('value_max', models.FloatField()),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['resolution', 'metric_type', 'bucket'], name='api_systemm_resolut_cfd672_idx'), models.Index(fields=['resolution', 'school_id', 'bucket'], name='api_systemm_resolut_7b3a6e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'bucket', 'school_id', 'metric_type', 'unit'), name='api_metricrollup_unique_key')],
+            },
+        ),
+    ]
@@ -4,6 +4,7 @@ API Models for storing data received from local network.
 Models:
 - Alert: Anomaly alerts from LogBERT analysis
 - SystemMetric: System health and performance metrics
+- SystemMetricRollup: Downsampled SystemMetric buckets (see api.retention)
 - RawModelOutput: Raw model inference outputs for detailed analysis
 """
 from django.db import models
@@ -89,6 +90,47 @@ class SystemMetric(models.Model):
         return f"{self.metric_type}: {self.value}{self.unit} at {self.timestamp}"
 
 
+class SystemMetricRollup(models.Model):
+    """Minute/hour buckets of SystemMetric samples past raw retention."""
+    
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+    ]
+    
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()  # Start of the bucket (UTC)
+    school_id = models.CharField(max_length=100)
+    metric_type = models.CharField(max_length=50)
+    unit = models.CharField(max_length=20)
+    
+    # Aggregates of the samples in the bucket
+    sample_count = models.IntegerField(default=0)
+    value_sum = models.FloatField(default=0.0)
+    value_min = models.FloatField()
+    value_max = models.FloatField()
+    
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['resolution', 'bucket', 'school_id', 'metric_type', 'unit'],
+                name='api_metricrollup_unique_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'metric_type', 'bucket']),
+            models.Index(fields=['resolution', 'school_id', 'bucket']),
+        ]
+    
+    @property
+    def value_avg(self):
+        return self.value_sum / self.sample_count if self.sample_count else 0.0
+    
+    def __str__(self):
+        return f"{self.metric_type} {self.resolution} {self.bucket}: avg {self.value_avg:.2f}{self.unit}"
+
+
 class LogStatistic(models.Model):
     """Aggregated log processing statistics."""
     
@@ -0,0 +1,64 @@
+"""
+Additional request parsers for the ingestion API.
+"""
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def iter_ndjson(stream, encoding='utf-8', max_line_bytes=None):
+    """
+    Lazily decode newline-delimited JSON from a file-like object.
+
+    Reads one line at a time so memory use is bounded by the longest line,
+    not by the size of the body. Yields ``(line_number, record, error)``
+    tuples where exactly one of ``record`` and ``error`` is set. Blank
+    lines are skipped. Lines longer than ``max_line_bytes`` are discarded
+    and reported as errors.
+    """
+    read_limit = max_line_bytes + 1 if max_line_bytes else -1
+    line_number = 0
+
+    while True:
+        raw_line = stream.readline(read_limit)
+        if not raw_line:
+            return
+        line_number += 1
+
+        if max_line_bytes and len(raw_line) > max_line_bytes and not raw_line.endswith(b'\n'):
+            # Drain the rest of the oversized line before moving on
+            while raw_line and not raw_line.endswith(b'\n'):
+                raw_line = stream.readline(read_limit)
+            yield line_number, None, f'Line exceeds {max_line_bytes} bytes'
+            continue
+
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line.decode(encoding)), None
+        except ValueError as exc:
+            yield line_number, None, f'Invalid JSON: {exc}'
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON (one JSON object per line).
+
+    Blank lines are ignored. Returns a list of the decoded objects so that
+    views can treat an NDJSON body exactly like a JSON array body.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+
+        records = []
+        for line_number, record, error in iter_ndjson(stream, encoding):
+            if error:
+                raise ParseError(f'NDJSON parse error on line {line_number}: {error}')
+            records.append(record)
+        return records
@@ -0,0 +1,215 @@
+"""
+Retention and downsampling for SystemMetric.
+
+Samples move through three tiers:
+
+    raw       SystemMetric rows, kept for METRIC_RAW_RETENTION_DAYS
+    minute    SystemMetricRollup buckets, kept for METRIC_MINUTE_RETENTION_DAYS
+    hour      SystemMetricRollup buckets, kept for METRIC_HOUR_RETENTION_DAYS
+
+``apply_retention`` folds expired raw samples into minute and hour buckets
+(count, sum, min, max) and deletes them in the same transaction, then
+drops expired buckets. All work is done in batches of at most
+``batch_size`` rows, each in its own short transaction, so ingestion is
+never blocked for long and an interrupted run loses nothing.
+
+The same pass drops LogRollup minute buckets older than
+LOG_ROLLUP_MINUTE_RETENTION_DAYS (``dashboard.rollups``); hour and day
+log rollups are kept.
+
+``metric_series`` reads a time range across the tiers: raw samples that
+have not been downsampled yet, minute buckets while they are kept, and
+hour buckets before that.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from dashboard.rollups import minute_cutoff, prune_minute_rollups, truncate
+
+from .models import SystemMetric, SystemMetricRollup
+
+
+ROLLUP_RESOLUTIONS = ('minute', 'hour')
+
+_KEY_COLUMNS = ('resolution', 'bucket', 'school_id', 'metric_type', 'unit')
+_VALUE_COLUMNS = ('sample_count', 'value_sum', 'value_min', 'value_max')
+
+
+def get_retention_policy():
+    """Retention periods from settings as timedeltas"""
+    return {
+        'raw': timedelta(days=getattr(settings, 'METRIC_RAW_RETENTION_DAYS', 7)),
+        'minute': timedelta(days=getattr(settings, 'METRIC_MINUTE_RETENTION_DAYS', 30)),
+        'hour': timedelta(days=getattr(settings, 'METRIC_HOUR_RETENTION_DAYS', 365)),
+    }
+
+
+def get_cutoffs(now=None):
+    """
+    Oldest timestamp kept by each tier.
+
+    Cutoffs fall on bucket boundaries so a tier never holds part of a
+    bucket: raw on a minute boundary, minute and hour on an hour boundary.
+    """
+    now = now or timezone.now()
+    policy = get_retention_policy()
+    return {
+        'raw': truncate(now - policy['raw'], 'minute'),
+        'minute': truncate(now - policy['minute'], 'hour'),
+        'hour': truncate(now - policy['hour'], 'hour'),
+    }
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Merge ``{(resolution, bucket, school_id, metric_type, unit): [count, sum, min, max]}``
+    into SystemMetricRollup with one upsert per key.
+    """
+    if not deltas:
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(SystemMetricRollup._meta.db_table)
+    least, greatest = ('MIN', 'MAX') if connection.vendor == 'sqlite' else ('LEAST', 'GREATEST')
+    key_columns = ', '.join(quote(column) for column in _KEY_COLUMNS)
+    count, total, low, high = (quote(column) for column in _VALUE_COLUMNS)
+    placeholders = ', '.join(['%s'] * (len(_KEY_COLUMNS) + len(_VALUE_COLUMNS)))
+    sql = (
+        f'INSERT INTO {table} ({key_columns}, {count}, {total}, {low}, {high}) VALUES ({placeholders}) '
+        f'ON CONFLICT ({key_columns}) DO UPDATE SET '
+        f'{count} = {table}.{count} + excluded.{count}, '
+        f'{total} = {table}.{total} + excluded.{total}, '
+        f'{low} = {least}({table}.{low}, excluded.{low}), '
+        f'{high} = {greatest}({table}.{high}, excluded.{high})'
+    )
+    params = [
+        (resolution, connection.ops.adapt_datetimefield_value(bucket), school_id, metric_type, unit,
+         values[0], values[1], values[2], values[3])
+        for (resolution, bucket, school_id, metric_type, unit), values in deltas.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def downsample_raw(cutoff, batch_size):
+    """
+    Fold one batch of raw samples older than ``cutoff`` into the rollups
+    and delete them. Returns the number of samples processed (0 when done).
+    """
+    with transaction.atomic():
+        samples = list(
+            SystemMetric.objects.filter(timestamp__lt=cutoff)
+            .order_by('timestamp', 'id')
+            .values_list('id', 'timestamp', 'school_id', 'metric_type', 'unit', 'value')[:batch_size]
+        )
+        if not samples:
+            return 0
+
+        deltas = {}
+        for _, timestamp, school_id, metric_type, unit, value in samples:
+            for resolution in ROLLUP_RESOLUTIONS:
+                key = (resolution, truncate(timestamp, resolution), school_id, metric_type, unit)
+                bucket = deltas.get(key)
+                if bucket is None:
+                    deltas[key] = [1, value, value, value]
+                else:
+                    bucket[0] += 1
+                    bucket[1] += value
+                    bucket[2] = min(bucket[2], value)
+                    bucket[3] = max(bucket[3], value)
+
+        apply_rollup_deltas(deltas)
+        SystemMetric.objects.filter(id__in=[sample[0] for sample in samples]).delete()
+    return len(samples)
+
+
+def prune_rollups(resolution, cutoff, batch_size):
+    """Delete one batch of ``resolution`` buckets older than ``cutoff``; returns the count"""
+    ids = list(
+        SystemMetricRollup.objects.filter(resolution=resolution, bucket__lt=cutoff)
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    return SystemMetricRollup.objects.filter(id__in=ids).delete()[0]
+
+
+def apply_retention(now=None, batch_size=None, max_batches=None):
+    """
+    Downsample expired raw samples and drop expired buckets.
+
+    Returns ``{'downsampled': n, 'minute_deleted': n, 'hour_deleted': n,
+    'log_minute_deleted': n, 'batches': n, 'remaining': bool}``. ``max_batches`` bounds the work
+    done by one call; the next call picks up where it stopped.
+    """
+    batch_size = batch_size or getattr(settings, 'METRIC_RETENTION_BATCH_SIZE', 5000)
+    cutoffs = get_cutoffs(now)
+    log_minute_cutoff = minute_cutoff(now)
+    result = {
+        'downsampled': 0, 'minute_deleted': 0, 'hour_deleted': 0, 'log_minute_deleted': 0,
+        'batches': 0, 'remaining': False,
+    }
+
+    steps = [
+        ('downsampled', lambda: downsample_raw(cutoffs['raw'], batch_size)),
+        ('minute_deleted', lambda: prune_rollups('minute', cutoffs['minute'], batch_size)),
+        ('hour_deleted', lambda: prune_rollups('hour', cutoffs['hour'], batch_size)),
+        ('log_minute_deleted', lambda: prune_minute_rollups(log_minute_cutoff, batch_size)),
+    ]
+    for name, step in steps:
+        while True:
+            if max_batches is not None and result['batches'] >= max_batches:
+                result['remaining'] = True
+                return result
+            processed = step()
+            if not processed:
+                break
+            result[name] += processed
+            result['batches'] += 1
+    return result
+
+
+def metric_series(start, end, metric_type=None, school_id=None, now=None):
+    """
+    Points for ``[start, end)`` from whichever tier holds each part of it.
+
+    Returns dicts ``{'timestamp', 'resolution', 'school_id', 'metric_type',
+    'unit', 'count', 'avg', 'min', 'max'}`` sorted by time. Raw samples have
+    resolution 'raw' and a count of 1.
+    """
+    filters = {}
+    if metric_type:
+        filters['metric_type'] = metric_type
+    if school_id:
+        filters['school_id'] = school_id
+
+    points = []
+    raw = SystemMetric.objects.filter(timestamp__gte=start, timestamp__lt=end, **filters)
+    for timestamp, sample_school, sample_type, unit, value in raw.values_list(
+        'timestamp', 'school_id', 'metric_type', 'unit', 'value'
+    ):
+        points.append({
+            'timestamp': timestamp, 'resolution': 'raw',
+            'school_id': sample_school, 'metric_type': sample_type, 'unit': unit,
+            'count': 1, 'avg': value, 'min': value, 'max': value,
+        })
+
+    # Minute buckets from the minute cutoff on, hour buckets before it; the
+    # cutoff is on an hour boundary so the two never overlap
+    boundary = get_cutoffs(now)['minute']
+    rollups = SystemMetricRollup.objects.filter(bucket__lt=end, **filters)
+    minute = rollups.filter(resolution='minute', bucket__gte=max(truncate(start, 'minute'), boundary))
+    hour = rollups.filter(resolution='hour', bucket__gte=truncate(start, 'hour'), bucket__lt=boundary)
+    for rollup in list(hour) + list(minute):
+        points.append({
+            'timestamp': rollup.bucket, 'resolution': rollup.resolution,
+            'school_id': rollup.school_id, 'metric_type': rollup.metric_type, 'unit': rollup.unit,
+            'count': rollup.sample_count, 'avg': rollup.value_avg,
+            'min': rollup.value_min, 'max': rollup.value_max,
+        })
+
+    points.sort(key=lambda point: point['timestamp'])
+    return points
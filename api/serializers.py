@@ -1,8 +1,43 @@
 """Serializers for API data models."""
+from django.db import transaction
 from rest_framework import serializers
 from .models import Alert, SystemMetric, LogStatistic, RawModelOutput
 
 
+class BulkCreateListSerializer(serializers.ListSerializer):
+    """
+    List serializer used when an ingestion endpoint receives a JSON array.
+    
+    Each item is validated on its own so one bad item does not reject the
+    whole list. Per-item errors are kept in ``item_errors`` (keyed by input
+    index) and ``validated_data`` holds only the valid items, which
+    ``save()`` persists with a single ``bulk_create``.
+    """
+    
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                'non_field_errors': ['Expected a list of items.']
+            })
+        
+        self.item_errors = {}
+        self.valid_indexes = []
+        validated = []
+        for index, item in enumerate(data):
+            try:
+                validated.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                self.item_errors[index] = exc.detail
+            else:
+                self.valid_indexes.append(index)
+        return validated
+    
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        with transaction.atomic():
+            return model.objects.bulk_create([model(**attrs) for attrs in validated_data])
+
+
 class AlertSerializer(serializers.ModelSerializer):
     """Serializer for Alert model."""
     
@@ -15,6 +50,7 @@ class AlertSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = BulkCreateListSerializer
 
 
 class SystemMetricSerializer(serializers.ModelSerializer):
@@ -27,6 +63,7 @@ class SystemMetricSerializer(serializers.ModelSerializer):
             'metadata', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = BulkCreateListSerializer
 
 
 class LogStatisticSerializer(serializers.ModelSerializer):
@@ -41,6 +78,7 @@ class LogStatisticSerializer(serializers.ModelSerializer):
             'logs_per_second', 'source_breakdown', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = BulkCreateListSerializer
 
 
 class RawModelOutputSerializer(serializers.ModelSerializer):
@@ -54,3 +92,4 @@ class RawModelOutputSerializer(serializers.ModelSerializer):
             'is_anomaly', 'confidence_score', 'metadata', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = BulkCreateListSerializer
@@ -0,0 +1,234 @@
+"""
+Durable write-behind spool for log ingestion.
+
+When LOG_INGEST_MODE is 'write_behind', the log endpoints append incoming
+records to this spool and return 202 immediately. The spool is a separate
+SQLite file in WAL mode, so appends never wait on the main database lock
+while the dashboard runs heavy aggregate queries. The ``drain_ingest_spool``
+management command moves spooled records into LogEntry/Anomaly in large
+batches.
+
+Delivery is at-least-once: a drainer that crashes after committing a
+batch but before acknowledging it will insert that batch again. Records
+the database still rejects after a row-by-row retry are moved to the
+``spool_rejected`` table with the error, so one bad record never holds
+up the records behind it.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    enqueued_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spool_rejected (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rejected_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spool_stats (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+
+def get_ingest_mode():
+    """Return 'sync' or 'write_behind'."""
+    return getattr(settings, 'LOG_INGEST_MODE', 'sync')
+
+
+def write_behind_enabled():
+    return get_ingest_mode() == 'write_behind'
+
+
+class IngestSpool:
+    """Append-only queue of raw log records backed by its own SQLite file."""
+
+    def __init__(self, path=None):
+        self.path = str(path or getattr(
+            settings, 'LOG_SPOOL_PATH', settings.BASE_DIR / 'spool' / 'ingest_spool.sqlite3'
+        ))
+        self._local = threading.local()
+
+    def _connection(self):
+        """Return this thread's connection, creating the spool on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def append(self, records):
+        """Durably append records; returns the number appended."""
+        if not records:
+            return 0
+
+        now = time.time()
+        rows = [(now, json.dumps(record)) for record in records]
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT INTO spool (enqueued_at, payload) VALUES (?, ?)', rows)
+            self._incr(conn, 'enqueued_total', len(rows))
+        return len(rows)
+
+    def peek(self, limit):
+        """Return up to ``limit`` of the oldest spooled ``(id, enqueued_at, record)``."""
+        cursor = self._connection().execute(
+            'SELECT id, enqueued_at, payload FROM spool ORDER BY id LIMIT ?', (limit,)
+        )
+        return [(row_id, enqueued_at, json.loads(payload)) for row_id, enqueued_at, payload in cursor]
+
+    def ack(self, through_id, drained=0, failed=0, lag_seconds=None, rejected=()):
+        """
+        Remove every record up to ``through_id`` and record drain stats.
+
+        ``rejected`` is a list of ``(record, error)`` kept in the
+        ``spool_rejected`` table for inspection.
+        """
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM spool WHERE id <= ?', (through_id,))
+            conn.executemany(
+                'INSERT INTO spool_rejected (rejected_at, payload, error) VALUES (?, ?, ?)',
+                [(now, json.dumps(record), error) for record, error in rejected],
+            )
+            self._incr(conn, 'drained_total', drained)
+            self._incr(conn, 'failed_total', failed)
+            self._set(conn, 'last_drained_at', now)
+            if lag_seconds is not None:
+                self._set(conn, 'last_drain_lag_seconds', lag_seconds)
+
+    def rejected(self, limit=100):
+        """The newest ``(rejected_at, record, error)`` the drainer could not load."""
+        cursor = self._connection().execute(
+            'SELECT rejected_at, payload, error FROM spool_rejected ORDER BY id DESC LIMIT ?', (limit,)
+        )
+        return [(rejected_at, json.loads(payload), error) for rejected_at, payload, error in cursor]
+
+    def stats(self):
+        """Queue depth, lag and throughput counters."""
+        conn = self._connection()
+        depth, oldest = conn.execute('SELECT COUNT(*), MIN(enqueued_at) FROM spool').fetchone()
+        rejected = conn.execute('SELECT COUNT(*) FROM spool_rejected').fetchone()[0]
+        values = dict(conn.execute('SELECT name, value FROM spool_stats'))
+
+        now = time.time()
+        last_drained_at = values.get('last_drained_at')
+        return {
+            'depth': depth,
+            'lag_seconds': round(now - oldest, 3) if oldest else 0.0,
+            'oldest_enqueued_at': oldest,
+            'enqueued_total': int(values.get('enqueued_total', 0)),
+            'drained_total': int(values.get('drained_total', 0)),
+            'failed_total': int(values.get('failed_total', 0)),
+            'rejected': rejected,
+            'last_drained_at': last_drained_at,
+            'last_drain_lag_seconds': values.get('last_drain_lag_seconds'),
+            'seconds_since_last_drain': round(now - last_drained_at, 3) if last_drained_at else None,
+        }
+
+    def _incr(self, conn, name, amount):
+        conn.execute(
+            'INSERT INTO spool_stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value',
+            (name, amount)
+        )
+
+    def _set(self, conn, name, value):
+        conn.execute(
+            'INSERT INTO spool_stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = excluded.value',
+            (name, value)
+        )
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """Process-wide spool for the configured LOG_SPOOL_PATH."""
+    global _spool
+    path = str(getattr(settings, 'LOG_SPOOL_PATH', settings.BASE_DIR / 'spool' / 'ingest_spool.sqlite3'))
+    with _spool_lock:
+        if _spool is None or _spool.path != path:
+            _spool = IngestSpool(path)
+        return _spool
+
+
+def drain_spool(spool, batch_size):
+    """
+    Move one batch of spooled records into the database.
+
+    Records that fail validation or that the database rejects are moved
+    to ``spool_rejected``; the batch is acknowledged either way. Returns
+    the number of records taken from the spool (0 when empty).
+    """
+    from .ingestion import check_database, ingest_log_records
+
+    batch = spool.peek(batch_size)
+    if not batch:
+        return 0
+
+    records = [record for _, _, record in batch]
+    try:
+        results = ingest_log_records(records)
+    except Exception:
+        # ingest_log_records already isolates database errors per row;
+        # anything else gets the same treatment here
+        logger.exception('Spool batch of %d failed; loading it record by record', len(records))
+        results = [ingest_one_record(ingest_log_records, record) for record in records]
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    rejected = [
+        (record, result['message'])
+        for record, result in zip(records, results)
+        if result['status'] != 'created'
+    ]
+    if rejected and not created:
+        # A batch that fails completely may be an outage rather than bad
+        # records: leave it spooled if the database cannot be reached
+        check_database()
+
+    oldest_enqueued_at = batch[0][1]
+    spool.ack(
+        batch[-1][0],
+        drained=created,
+        failed=len(rejected),
+        lag_seconds=time.time() - oldest_enqueued_at,
+        rejected=rejected,
+    )
+    return len(batch)
+
+
+def ingest_one_record(ingest, record):
+    try:
+        return ingest([record])[0]
+    except Exception as e:
+        return {'index': 0, 'status': 'error', 'message': f'{type(e).__name__}: {e}'}
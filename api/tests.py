@@ -9,6 +9,7 @@ Tests cover:
 - Error handling
 """
 
+import io
 import json
 from datetime import datetime, timedelta
 from django.test import TestCase, Client
@@ -19,7 +20,9 @@ from rest_framework import status
 from unittest.mock import patch
 import os
 
-from .models import Alert, SystemMetric, LogStatistic, RawModelOutput
+from .models import Alert, SystemMetric, SystemMetricRollup, LogStatistic, RawModelOutput
+from .retention import apply_retention, metric_series
+from .kafka_worker import FakeBroker, StagedIngestWorker, parse_message
 from .authentication import APIKeyAuthentication
 
 
@@ -527,3 +530,756 @@ class DataValidationTests(APITestCase):
         
         response = self.client.post('/api/v1/metrics/', data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchLogAPITests(APITestCase):
+    """Test batch log ingestion endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.test_api_key = "test-api-key-12345"
+        
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+        
+        self.records = [
+            {
+                "timestamp": "2025-11-06 02:45:15",
+                "host": "192.168.1.10",
+                "log_type": "INFO",
+                "source": "apache",
+                "message": "GET /index.html HTTP/1.1",
+                "anomaly_score": 0.1,
+                "is_anomaly": False
+            },
+            {
+                "timestamp": "2025-11-06T02:45:16Z",
+                "host": "192.168.1.11",
+                "log_type": "ERROR",
+                "source": "linux",
+                "message": "Failed password for root",
+                "anomaly_score": 0.93,
+                "is_anomaly": True
+            },
+        ]
+    
+    def tearDown(self):
+        self.env_patcher.stop()
+    
+    def test_batch_json_array(self):
+        """Test POST /api/v1/logs/batch/ with a JSON array"""
+        from dashboard.models import LogEntry, Anomaly
+        
+        response = self.client.post('/api/v1/logs/batch/', self.records, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(LogEntry.objects.count(), 2)
+        self.assertEqual(Anomaly.objects.count(), 1)
+        self.assertIn('anomaly_id', response.data['results'][1])
+        self.assertNotIn('anomaly_id', response.data['results'][0])
+    
+    def test_batch_updates_rollups(self):
+        """Test that bulk ingestion keeps the dashboard rollups current"""
+        from django.db.models import Sum
+        from dashboard.models import LogRollup
+        
+        self.client.post('/api/v1/logs/batch/', self.records, format='json')
+        
+        totals = LogRollup.objects.filter(resolution='day').aggregate(
+            logs=Sum('log_count'), anomalies=Sum('anomaly_count')
+        )
+        self.assertEqual(totals, {'logs': 2, 'anomalies': 1})
+    
+    def test_batch_ndjson(self):
+        """Test POST /api/v1/logs/batch/ with an NDJSON body"""
+        from dashboard.models import LogEntry
+        
+        body = '\n'.join(json.dumps(record) for record in self.records) + '\n'
+        response = self.client.post(
+            '/api/v1/logs/batch/', body, content_type='application/x-ndjson'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LogEntry.objects.count(), 2)
+    
+    def test_batch_reports_invalid_items(self):
+        """Test that invalid records are reported without dropping valid ones"""
+        from dashboard.models import LogEntry
+        
+        records = self.records + [{"timestamp": "not-a-date", "message": "bad"}]
+        response = self.client.post('/api/v1/logs/batch/', {"logs": records}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['results'][2]['status'], 'error')
+        self.assertEqual(LogEntry.objects.count(), 2)
+    
+    def test_batch_rejects_null_and_non_string_fields(self):
+        """Test that null or non-string text fields are per-record errors, not a 500"""
+        from dashboard.models import LogEntry
+        
+        records = self.records + [
+            {"host": None, "message": "a"},
+            {"message": None},
+            {"host": ["10.0.0.1"], "message": "b"},
+            {"source": 7, "message": "c"},
+        ]
+        response = self.client.post('/api/v1/logs/batch/', records, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 4)
+        self.assertIn("'host' must be a string, not null", response.data['results'][2]['message'])
+        self.assertIn("'host' must be a string, not list", response.data['results'][4]['message'])
+        self.assertEqual(LogEntry.objects.count(), 2)
+    
+    def test_batch_falls_back_to_per_record_inserts(self):
+        """Test that a row the database rejects only fails that row"""
+        from django.db import IntegrityError
+        from dashboard.models import LogEntry
+        from . import ingestion
+        
+        write_log_entries = ingestion.write_log_entries
+        
+        def reject_root(pending, results):
+            write_log_entries(pending, results)
+            if any('root' in log_entry.log_message for _, log_entry, _ in pending):
+                raise IntegrityError('rejected')
+        
+        with patch('api.ingestion.write_log_entries', side_effect=reject_root):
+            response = self.client.post('/api/v1/logs/batch/', self.records, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['results'][0]['status'], 'created')
+        self.assertEqual(response.data['results'][1]['status'], 'error')
+        self.assertEqual(list(LogEntry.objects.values_list('log_message', flat=True)), ["GET /index.html HTTP/1.1"])
+    
+    def test_batch_too_large(self):
+        """Test that oversized batches are rejected"""
+        with self.settings(API_MAX_BATCH_SIZE=1):
+            response = self.client.post('/api/v1/logs/batch/', self.records, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+class StreamLogAPITests(APITestCase):
+    """Test streaming NDJSON log ingestion endpoint"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.test_api_key = "test-api-key-12345"
+        
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+    
+    def tearDown(self):
+        self.env_patcher.stop()
+    
+    def _ndjson(self, count):
+        return ''.join(
+            json.dumps({
+                "timestamp": "2025-11-06T02:45:15Z",
+                "host": "10.0.0.%d" % (i % 255),
+                "log_type": "INFO",
+                "source": "apache",
+                "message": f"GET /page/{i} HTTP/1.1",
+                "anomaly_score": 0.9,
+                "is_anomaly": i % 10 == 0
+            }) + '\n'
+            for i in range(count)
+        )
+    
+    def test_stream_commits_in_chunks(self):
+        """Test POST /api/v1/logs/stream/ commits records in fixed-size chunks"""
+        from dashboard.models import LogEntry, Anomaly
+        
+        with self.settings(API_STREAM_CHUNK_SIZE=10):
+            response = self.client.post(
+                '/api/v1/logs/stream/', self._ndjson(25), content_type='application/x-ndjson'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 25)
+        self.assertEqual(response.data['chunks'], 3)
+        self.assertEqual(LogEntry.objects.count(), 25)
+        self.assertEqual(Anomaly.objects.count(), 3)
+    
+    def test_stream_reports_bad_lines(self):
+        """Test that malformed and oversized lines are reported by line number"""
+        body = self._ndjson(2) + '{not json}\n' + json.dumps({"message": "x" * 500}) + '\n'
+        
+        with self.settings(API_STREAM_MAX_LINE_BYTES=300):
+            response = self.client.post(
+                '/api/v1/logs/stream/', body, content_type='application/x-ndjson'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([e['line'] for e in response.data['errors']], [3, 4])
+    
+    def test_stream_reports_null_fields(self):
+        """Test that a record with a null field fails its line and the stream continues"""
+        from dashboard.models import LogEntry
+        
+        body = self._ndjson(2) + json.dumps({"message": None}) + '\n' + self._ndjson(3)
+        with self.settings(API_STREAM_CHUNK_SIZE=2):
+            response = self.client.post(
+                '/api/v1/logs/stream/', body, content_type='application/x-ndjson'
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual([e['line'] for e in response.data['errors']], [3])
+        self.assertEqual(LogEntry.objects.count(), 5)
+    
+    def test_stream_empty_body(self):
+        """Test that an empty body is rejected"""
+        response = self.client.post('/api/v1/logs/stream/', '', content_type='application/x-ndjson')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CompressedRequestTests(APITestCase):
+    """Test gzip request body decompression"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.test_api_key = "test-api-key-12345"
+        
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+    
+    def tearDown(self):
+        self.env_patcher.stop()
+    
+    def _post_gzip(self, path, body, content_type='application/json', encoding='gzip'):
+        import gzip
+        return self.client.post(
+            path, gzip.compress(body.encode()), content_type=content_type,
+            HTTP_CONTENT_ENCODING=encoding
+        )
+    
+    def test_gzip_receive_log(self):
+        """Test gzip-compressed body on POST /api/v1/logs/"""
+        from dashboard.models import LogEntry
+        
+        body = json.dumps({"host": "10.0.0.1", "message": "compressed log"})
+        response = self._post_gzip('/api/v1/logs/', body)
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LogEntry.objects.get().log_message, "compressed log")
+    
+    def test_gzip_viewset_create(self):
+        """Test gzip-compressed body on a viewset create path"""
+        body = json.dumps({
+            "school_id": "school-001",
+            "metric_type": "cpu_usage",
+            "value": 42.0,
+            "unit": "percent"
+        })
+        response = self._post_gzip('/api/v1/metrics/', body)
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SystemMetric.objects.get().value, 42.0)
+    
+    def test_gzip_stream(self):
+        """Test gzip-compressed NDJSON on the streaming endpoint"""
+        from dashboard.models import LogEntry
+        
+        body = ''.join(json.dumps({"message": f"line {i}"}) + '\n' for i in range(50))
+        response = self._post_gzip('/api/v1/logs/stream/', body, 'application/x-ndjson')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LogEntry.objects.count(), 50)
+    
+    def test_x_gzip_alias(self):
+        """Test that the legacy x-gzip name is accepted on both body paths"""
+        from dashboard.models import LogEntry
+        
+        response = self._post_gzip('/api/v1/logs/', json.dumps({"message": "single"}), encoding='x-gzip')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        body = ''.join(json.dumps({"message": f"line {i}"}) + '\n' for i in range(5))
+        response = self._post_gzip('/api/v1/logs/stream/', body, 'application/x-ndjson', encoding='X-Gzip')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(LogEntry.objects.count(), 6)
+    
+    def test_decompressed_size_limit(self):
+        """Test that bodies inflating past the limit are rejected"""
+        body = json.dumps({"message": "a" * 10000})
+        
+        with self.settings(API_MAX_DECOMPRESSED_BODY_SIZE=1000):
+            response = self._post_gzip('/api/v1/logs/', body)
+        
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    def test_malformed_gzip(self):
+        """Test that a corrupt gzip body is rejected"""
+        response = self.client.post(
+            '/api/v1/logs/', b'not gzip at all', content_type='application/json',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_unsupported_encoding(self):
+        """Test that unknown encodings are rejected"""
+        response = self.client.post(
+            '/api/v1/logs/', b'{}', content_type='application/json',
+            HTTP_CONTENT_ENCODING='br'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+class WriteBehindIngestionTests(APITestCase):
+    """Test write-behind ingestion through the spool"""
+    
+    def setUp(self):
+        import tempfile
+        
+        self.client = APIClient()
+        self.test_api_key = "test-api-key-12345"
+        
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+        
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.settings_override = self.settings(
+            LOG_INGEST_MODE='write_behind',
+            LOG_SPOOL_PATH=os.path.join(self.spool_dir.name, 'spool.sqlite3'),
+        )
+        self.settings_override.enable()
+    
+    def tearDown(self):
+        from .spool import get_spool
+        
+        get_spool().close()
+        self.settings_override.disable()
+        self.spool_dir.cleanup()
+        self.env_patcher.stop()
+    
+    def test_receive_log_is_queued(self):
+        """Test that POST /api/v1/logs/ returns 202 and defers the insert"""
+        from dashboard.models import LogEntry
+        from .spool import drain_spool, get_spool
+        
+        response = self.client.post(
+            '/api/v1/logs/', {"message": "queued", "is_anomaly": True, "anomaly_score": 0.9},
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(LogEntry.objects.count(), 0)
+        self.assertEqual(get_spool().stats()['depth'], 1)
+        
+        self.assertEqual(drain_spool(get_spool(), 100), 1)
+        self.assertEqual(LogEntry.objects.get().anomalies.count(), 1)
+        self.assertEqual(get_spool().stats()['depth'], 0)
+    
+    def test_batch_is_queued(self):
+        """Test that batches are validated and queued"""
+        records = [{"message": "a"}, {"message": "b"}, "not a record"]
+        response = self.client.post('/api/v1/logs/batch/', records, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['queued'], 2)
+        self.assertEqual(response.data['failed'], 1)
+    
+    def test_batch_rejects_null_fields(self):
+        """Test that records with null text fields are not spooled"""
+        response = self.client.post(
+            '/api/v1/logs/batch/', [{"message": "a"}, {"host": None, "message": "b"}], format='json'
+        )
+        
+        self.assertEqual(response.data['queued'], 1)
+        self.assertEqual(response.data['failed'], 1)
+    
+    def test_bad_record_does_not_block_the_spool(self):
+        """Test that records the drainer cannot load are set aside and the rest drained"""
+        from dashboard.models import LogEntry
+        from .spool import drain_spool, get_spool
+        
+        spool = get_spool()
+        # e.g. spooled before validation rejected nulls
+        spool.append([{"message": "a"}, {"message": None}, {"host": ["x"], "message": "b"}, {"message": "c"}])
+        
+        self.assertEqual(drain_spool(spool, 100), 4)
+        self.assertEqual(LogEntry.objects.count(), 2)
+        stats = spool.stats()
+        self.assertEqual((stats['depth'], stats['drained_total'], stats['failed_total']), (0, 2, 2))
+        self.assertEqual(stats['rejected'], 2)
+        self.assertEqual([record for _, record, _ in spool.rejected()], [{"host": ["x"], "message": "b"}, {"message": None}])
+    
+    def test_unexpected_error_falls_back_to_single_records(self):
+        """Test that a batch raising outside the database path is loaded record by record"""
+        from dashboard.models import LogEntry
+        from . import ingestion
+        from .spool import drain_spool, get_spool
+        
+        ingest_log_records = ingestion.ingest_log_records
+        
+        def fail_batches(records):
+            if len(records) > 1 or records[0]['message'] == 'bad':
+                raise RuntimeError('boom')
+            return ingest_log_records(records)
+        
+        spool = get_spool()
+        spool.append([{"message": "a"}, {"message": "bad"}, {"message": "c"}])
+        with patch('api.ingestion.ingest_log_records', side_effect=fail_batches), self.assertLogs('api.spool', 'ERROR'):
+            drain_spool(spool, 100)
+        
+        self.assertEqual(LogEntry.objects.count(), 2)
+        self.assertEqual(spool.stats()['depth'], 0)
+        self.assertEqual(spool.rejected()[0][2], 'RuntimeError: boom')
+    
+    def test_outage_leaves_batch_spooled(self):
+        """Test that a batch is kept when the database itself is unreachable"""
+        from django.db import OperationalError
+        from .spool import drain_spool, get_spool
+        
+        spool = get_spool()
+        spool.append([{"message": "a"}])
+        with patch('api.ingestion.write_log_entries', side_effect=OperationalError('down')), \
+                patch('api.ingestion.check_database', side_effect=OperationalError('down')):
+            with self.assertRaises(OperationalError):
+                drain_spool(spool, 100)
+        
+        self.assertEqual(spool.stats()['depth'], 1)
+        self.assertEqual(spool.stats()['rejected'], 0)
+    
+    def test_queue_status(self):
+        """Test GET /api/v1/ingest/queue/ reports depth and drain totals"""
+        from django.core.management import call_command
+        
+        self.client.post('/api/v1/logs/batch/', [{"message": "a"}, {"message": "b"}], format='json')
+        response = self.client.get('/api/v1/ingest/queue/')
+        self.assertEqual(response.data['queue']['depth'], 2)
+        
+        call_command('drain_ingest_spool', '--once', stdout=io.StringIO())
+        response = self.client.get('/api/v1/ingest/queue/')
+        self.assertEqual(response.data['mode'], 'write_behind')
+        self.assertEqual(response.data['queue']['depth'], 0)
+        self.assertEqual(response.data['queue']['drained_total'], 2)
+
+
+class BulkCreateAPITests(APITestCase):
+    """Test list (bulk) create on the ingestion viewsets"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.test_api_key = "test-api-key-12345"
+        
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+    
+    def tearDown(self):
+        self.env_patcher.stop()
+    
+    def test_bulk_create_metrics(self):
+        """Test POST /api/v1/metrics/ with a list of samples"""
+        data = [
+            {"school_id": "school-001", "metric_type": "cpu", "value": 51.0, "unit": "percent"},
+            {"school_id": "school-001", "metric_type": "memory", "value": 2048, "unit": "MB"},
+            {"school_id": "school-001", "metric_type": "processing_time", "value": 1.5, "unit": "seconds"},
+        ]
+        
+        response = self.client.post('/api/v1/metrics/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(SystemMetric.objects.count(), 3)
+        ids = [result['id'] for result in response.data['results']]
+        self.assertEqual(sorted(ids), sorted(SystemMetric.objects.values_list('id', flat=True)))
+    
+    def test_bulk_create_keeps_valid_items(self):
+        """Test that invalid items are reported and valid items are kept"""
+        data = [
+            {"school_id": "school-001", "alert_level": "high", "summary": "ok", "anomaly_score": 0.9},
+            {"school_id": "school-001", "alert_level": "invalid_level", "summary": "bad", "anomaly_score": 0.9},
+        ]
+        
+        response = self.client.post('/api/v1/alerts/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['results'][1]['status'], 'error')
+        self.assertIn('alert_level', response.data['results'][1]['errors'])
+        self.assertEqual(Alert.objects.count(), 1)
+    
+    def test_bulk_create_all_invalid(self):
+        """Test that a list with no valid items is rejected"""
+        data = [{"school_id": "school-001", "metric_type": "cpu", "value": "nan-ish"}]
+        
+        response = self.client.post('/api/v1/metrics/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SystemMetric.objects.count(), 0)
+
+
+class FastValidationTests(APITestCase):
+    """Test the compiled fast validator on the ingestion viewsets"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.test_api_key = "test-api-key-12345"
+        
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+        
+        settings_override = self.settings(API_FAST_VALIDATION_ENDPOINTS=['alert', 'metric', 'raw-output'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+    
+    def tearDown(self):
+        self.env_patcher.stop()
+    
+    def test_create_alert(self):
+        """Test that a single alert is created and serialized as usual"""
+        data = {
+            "timestamp": "2025-11-06T02:30:00Z",
+            "school_id": "school-001",
+            "alert_level": "high",
+            "anomaly_score": 0.91,
+            "affected_systems": ["192.168.1.10"],
+            "summary": "Brute force",
+        }
+        
+        response = self.client.post('/api/v1/alerts/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'new')
+        alert = Alert.objects.get(id=response.data['id'])
+        self.assertEqual(alert.affected_systems, ["192.168.1.10"])
+        self.assertEqual(alert.timestamp.minute, 30)
+    
+    def test_invalid_choice_rejected(self):
+        """Test that choices and required fields are enforced"""
+        data = {"school_id": "school-001", "alert_level": "invalid_level", "anomaly_score": 0.9}
+        
+        response = self.client.post('/api/v1/alerts/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('alert_level', response.data)
+        self.assertIn('summary', response.data)
+        self.assertEqual(Alert.objects.count(), 0)
+    
+    def test_bulk_create_reports_item_errors(self):
+        """Test that list creates keep valid items and report invalid ones"""
+        data = [
+            {"school_id": "school-001", "metric_type": "cpu", "value": 51.0, "unit": "percent"},
+            {"school_id": "school-001", "metric_type": "cpu", "value": True, "unit": "percent"},
+            {"school_id": "school-001", "metric_type": "memory", "value": "2048", "unit": "MB"},
+        ]
+        
+        response = self.client.post('/api/v1/metrics/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['results'][1]['status'], 'error')
+        self.assertIn('value', response.data['results'][1]['errors'])
+        self.assertEqual(SystemMetric.objects.get(metric_type='memory').value, 2048.0)
+
+
+class MetricRetentionTests(APITestCase):
+    """Test SystemMetric downsampling, expiry and tiered reads"""
+
+    def setUp(self):
+        self.test_api_key = "test-api-key-12345"
+        self.env_patcher = patch.dict(os.environ, {'LOGBERT_API_KEYS': self.test_api_key})
+        self.env_patcher.start()
+        self.addCleanup(self.env_patcher.stop)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.test_api_key}')
+
+        self.now = timezone.now()
+        # Three samples in one expired minute, one in the next, one still raw
+        old_minute = (self.now - timedelta(days=10)).replace(minute=30, second=0, microsecond=0)
+        samples = [
+            (old_minute + timedelta(seconds=5), 10.0),
+            (old_minute + timedelta(seconds=25), 30.0),
+            (old_minute + timedelta(seconds=45), 20.0),
+            (old_minute + timedelta(minutes=1), 50.0),
+            (self.now - timedelta(hours=1), 70.0),
+        ]
+        for timestamp, value in samples:
+            SystemMetric.objects.create(
+                school_id='school-001', metric_type='cpu_usage', value=value, unit='percent',
+                timestamp=timestamp
+            )
+        self.old_minute = old_minute
+
+    def test_downsamples_expired_samples(self):
+        """Test expired samples become exact minute and hour buckets"""
+        # Batches of two split the first minute, exercising the upsert merge
+        result = apply_retention(now=self.now, batch_size=2)
+
+        self.assertEqual(result['downsampled'], 4)
+        self.assertEqual(SystemMetric.objects.count(), 1)
+
+        minute = SystemMetricRollup.objects.get(resolution='minute', bucket=self.old_minute)
+        self.assertEqual(
+            (minute.sample_count, minute.value_min, minute.value_max, minute.value_avg),
+            (3, 10.0, 30.0, 20.0)
+        )
+        hour = SystemMetricRollup.objects.get(resolution='hour')
+        self.assertEqual((hour.sample_count, hour.value_min, hour.value_max), (4, 10.0, 50.0))
+        self.assertEqual(hour.value_sum, 110.0)
+
+        # A second run has nothing left to do
+        self.assertEqual(apply_retention(now=self.now)['batches'], 0)
+
+    def test_expires_buckets(self):
+        """Test minute buckets expire before hour buckets"""
+        apply_retention(now=self.now)
+        later = self.now + timedelta(days=25)
+        result = apply_retention(now=later)
+
+        self.assertEqual(result['downsampled'], 1)
+        self.assertEqual(result['minute_deleted'], 2)
+        self.assertEqual(result['hour_deleted'], 0)
+        self.assertEqual(SystemMetricRollup.objects.filter(resolution='minute').count(), 1)
+
+        # Old data now comes from the hour tier, without double counting
+        points = metric_series(self.now - timedelta(days=11), later, metric_type='cpu_usage', now=later)
+        self.assertEqual([(point['resolution'], point['count']) for point in points], [('hour', 4), ('minute', 1)])
+
+    def test_series_endpoint(self):
+        """Test the series endpoint reads raw samples and minute buckets"""
+        apply_retention(now=self.now)
+        response = self.client.get('/api/v1/metrics/series/', {
+            'type': 'cpu_usage',
+            'start': (self.now - timedelta(days=11)).isoformat(),
+            'end': self.now.isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(point['resolution'], point['count']) for point in response.data['points']],
+            [('minute', 3), ('minute', 1), ('raw', 1)]
+        )
+
+        response = self.client.get('/api/v1/metrics/series/', {'start': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command_once(self):
+        """Test the management command in --once mode"""
+        from django.core.management import call_command
+        call_command('apply_metric_retention', '--once', stdout=io.StringIO())
+        self.assertEqual(SystemMetric.objects.count(), 1)
+        self.assertEqual(SystemMetricRollup.objects.filter(resolution='hour').count(), 1)
+
+
+class KafkaWorkerTests(TestCase):
+    """Test the staged Kafka ingestion worker against the in-memory broker"""
+
+    def produce(self, broker, count):
+        for i in range(count):
+            message = 'Failed password for root' if i % 10 == 0 else 'GET /index.html 200'
+            broker.produce(json.dumps({'host': f'10.0.0.{i % 5}', 'source': 'ssh', 'message': message}))
+        broker.produce(b'\xff\xfe')
+
+    def test_batches_are_scored_written_and_committed(self):
+        """Test that every message is written and its offset committed"""
+        from dashboard.models import LogEntry, Anomaly
+
+        broker = FakeBroker(partitions=2)
+        self.produce(broker, 95)
+        calls = []
+
+        def predict(messages):
+            calls.append(len(messages))
+            return [0.9 if message.startswith('Failed') else 0.1 for message in messages]
+
+        report = StagedIngestWorker(broker, predict=predict, batch_size=20, linger=0.05, once=True).run()
+
+        self.assertEqual(LogEntry.objects.count(), 95)
+        self.assertEqual(Anomaly.objects.count(), 10)
+        self.assertTrue(all(size <= 20 for size in calls))
+        self.assertEqual(report['totals']['created'], 95)
+        self.assertEqual(report['totals']['invalid'], 1)
+        self.assertEqual(report['stages']['write']['items'], 96)
+        self.assertEqual(broker.lag(), 0)
+
+    def test_offsets_not_committed_when_write_fails(self):
+        """Test that a failed batch leaves its offsets uncommitted for redelivery"""
+        broker = FakeBroker()
+        self.produce(broker, 10)
+
+        with patch('api.kafka_worker.ingest_log_records', side_effect=RuntimeError('db down')):
+            with self.assertRaises(RuntimeError):
+                StagedIngestWorker(broker, batch_size=5, linger=0.05, once=True).run()
+        self.assertEqual(broker.lag(), 11)
+
+        broker.rewind()
+        StagedIngestWorker(broker, batch_size=5, linger=0.05, once=True).run()
+        self.assertEqual(broker.lag(), 0)
+
+    def test_rejected_records_are_counted_and_committed(self):
+        """Test that records the database rejects are counted as failed without stopping the worker"""
+        from dashboard.models import LogEntry
+
+        broker = FakeBroker()
+        self.produce(broker, 10)
+        broker.produce(json.dumps({'host': None, 'message': 'null host'}))
+
+        report = StagedIngestWorker(broker, batch_size=5, linger=0.05, once=True).run()
+
+        self.assertEqual(LogEntry.objects.count(), 10)
+        self.assertEqual(report['totals']['failed'], 1)
+        self.assertEqual(broker.lag(), 0)
+
+    def test_database_outage_leaves_offsets_uncommitted(self):
+        """Test that a batch failing because the database is unreachable is not committed"""
+        from django.db import OperationalError
+
+        broker = FakeBroker()
+        self.produce(broker, 5)
+
+        with patch('api.ingestion.write_log_entries', side_effect=OperationalError('down')), \
+                patch('api.kafka_worker.check_database', side_effect=OperationalError('down')):
+            with self.assertRaises(OperationalError):
+                StagedIngestWorker(broker, batch_size=10, linger=0.05, once=True).run()
+        self.assertEqual(broker.lag(), 6)
+
+    def test_dynamic_threshold_flags_scores(self):
+        """Test that scores are flagged against the dynamic threshold, which sees every score"""
+        from dashboard.dynamic_threshold import DynamicThreshold
+        from dashboard.models import Anomaly
+
+        broker = FakeBroker()
+        self.produce(broker, 20)
+        threshold = DynamicThreshold(0.95, interval=3600, path=os.devnull)
+
+        report = StagedIngestWorker(
+            broker, predict=lambda messages: [0.9] * len(messages), batch_size=10, linger=0.05,
+            once=True, dynamic_threshold=threshold,
+        ).run()
+
+        self.assertEqual(Anomaly.objects.count(), 0)
+        self.assertEqual(len(threshold.normal_scores), 20)
+        self.assertEqual(report['threshold'], 0.95)
+
+    def test_parse_message(self):
+        """Test JSON and plain-text message parsing"""
+        self.assertEqual(parse_message(b'{"message": "x"}'), {'message': 'x'})
+        self.assertEqual(
+            parse_message('2025-01-01T10:00:00 error disk full'),
+            {'timestamp': '2025-01-01T10:00:00', 'log_type': 'ERROR', 'message': 'disk full'},
+        )
+        self.assertEqual(parse_message('kernel: eth0 up'), {'message': 'kernel: eth0 up'})
+        with self.assertRaises(ValueError):
+            parse_message('{"a": ')
@@ -18,6 +18,9 @@ urlpatterns = [
     
     # Log ingestion endpoint
     path('logs/', views.receive_log, name='receive-log'),
+    path('logs/batch/', views.receive_log_batch, name='receive-log-batch'),
+    path('logs/stream/', views.receive_log_stream, name='receive-log-stream'),
+    path('ingest/queue/', views.ingest_queue_status, name='ingest-queue-status'),
     
     # Include router URLs
     path('', include(router.urls)),
@@ -4,10 +4,16 @@ API Views for receiving data from local network.
 All endpoints require API key authentication.
 """
 from rest_framework import status, viewsets
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import (
+    action, api_view, authentication_classes, permission_classes, parser_classes
+)
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from datetime import timedelta
 
 from .models import Alert, SystemMetric, LogStatistic, RawModelOutput
 from .serializers import (
@@ -15,14 +21,105 @@ from .serializers import (
     LogStatisticSerializer, RawModelOutputSerializer
 )
 from .authentication import APIKeyAuthentication
+from .compression import DecompressionError, DecompressedBodyTooLarge
+from .fast_validation import (
+    FastValidationError, fast_validation_enabled, get_fast_validator, parse_iso_datetime
+)
+from .ingestion import (
+    DEFAULT_ANOMALY_THRESHOLD, build_log_entry, get_max_batch_size,
+    ingest_log_records, ingest_log_stream, queue_log_records
+)
+from .middleware import streams_request_body
+from .parsers import NDJSONParser
+from .retention import metric_series
+from .spool import get_ingest_mode, get_spool, write_behind_enabled
 
 
-class AlertViewSet(viewsets.ModelViewSet):
+class BulkCreateModelMixin:
+    """
+    Let a ModelViewSet create many objects from one POST.
+    
+    A JSON object body behaves exactly like ModelViewSet.create. A JSON
+    array body is validated item by item; the valid items are written with
+    one bulk_create in a single transaction and invalid items are reported
+    without rolling back the valid ones:
+        {
+            "received": 3,
+            "created": 2,
+            "failed": 1,
+            "results": [
+                {"index": 0, "status": "created", "id": 10},
+                {"index": 1, "status": "error", "errors": {"value": ["..."]}},
+                {"index": 2, "status": "created", "id": 11}
+            ]
+        }
+    
+    When the viewset's basename is listed in API_FAST_VALIDATION_ENDPOINTS,
+    items are validated with the compiled FastValidator instead of the
+    serializer. Responses have the same shape either way.
+    """
+    
+    def use_fast_validation(self):
+        return fast_validation_enabled(self.basename)
+    
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            if self.use_fast_validation():
+                return self.fast_create(request.data)
+            return super().create(request, *args, **kwargs)
+        
+        items = request.data
+        max_batch_size = get_max_batch_size()
+        if len(items) > max_batch_size:
+            return Response({
+                'status': 'error',
+                'message': f'Batch too large: {len(items)} items (max {max_batch_size})'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        if self.use_fast_validation():
+            validator = get_fast_validator(self.get_serializer_class())
+            instances, valid_indexes, item_errors = validator.build_many(items)
+            if instances:
+                with transaction.atomic():
+                    instances = validator.model.objects.bulk_create(instances)
+        else:
+            serializer = self.get_serializer(data=items, many=True)
+            serializer.is_valid(raise_exception=True)
+            instances = serializer.save() if serializer.validated_data else []
+            valid_indexes, item_errors = serializer.valid_indexes, serializer.item_errors
+        
+        results = [None] * len(items)
+        for index, instance in zip(valid_indexes, instances):
+            results[index] = {'index': index, 'status': 'created', 'id': instance.pk}
+        for index, errors in item_errors.items():
+            results[index] = {'index': index, 'status': 'error', 'errors': errors}
+        
+        # Only reject the request when every item in it was invalid
+        all_failed = bool(items) and not instances
+        return Response({
+            'received': len(items),
+            'created': len(instances),
+            'failed': len(item_errors),
+            'results': results,
+        }, status=status.HTTP_400_BAD_REQUEST if all_failed else status.HTTP_201_CREATED)
+    
+    def fast_create(self, data):
+        """Single-object create using the compiled validator."""
+        validator = get_fast_validator(self.get_serializer_class())
+        try:
+            instance = validator.build(data)
+        except FastValidationError as e:
+            return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+        instance.save()
+        return Response(self.get_serializer(instance).data, status=status.HTTP_201_CREATED)
+
+
+class AlertViewSet(BulkCreateModelMixin, viewsets.ModelViewSet):
     """
     API endpoint for receiving anomaly alerts.
     
     POST /api/v1/alerts/
-        Submit new alert from local network
+        Submit new alert from local network (or a list of alerts)
     
     GET /api/v1/alerts/
         List recent alerts (for internal use)
@@ -54,15 +151,19 @@ class AlertViewSet(viewsets.ModelViewSet):
         return queryset.order_by('-timestamp')[:1000]  # Limit to 1000 most recent
 
 
-class SystemMetricViewSet(viewsets.ModelViewSet):
+class SystemMetricViewSet(BulkCreateModelMixin, viewsets.ModelViewSet):
     """
     API endpoint for receiving system metrics.
     
     POST /api/v1/metrics/
-        Submit system metrics from local network
+        Submit system metrics from local network (one object or a list)
     
     GET /api/v1/metrics/
         List recent metrics
+    
+    GET /api/v1/metrics/series/?type=&school_id=&start=&end=
+        Metrics over a time range (default: last 24 hours), read from raw
+        samples or downsampled buckets depending on their age
     """
     queryset = SystemMetric.objects.all()
     serializer_class = SystemMetricSerializer
@@ -82,14 +183,42 @@ class SystemMetricViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(school_id=school_id)
         
         return queryset.order_by('-timestamp')[:1000]
+    
+    @action(detail=False, methods=['get'])
+    def series(self, request):
+        """Time series across the retention tiers (see api.retention)."""
+        try:
+            end = parse_iso_datetime(request.query_params['end']) if 'end' in request.query_params else timezone.now()
+            start = (
+                parse_iso_datetime(request.query_params['start']) if 'start' in request.query_params
+                else end - timedelta(hours=24)
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start >= end:
+            return Response({'error': 'start must be before end'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        points = metric_series(
+            start, end,
+            metric_type=request.query_params.get('type'),
+            school_id=request.query_params.get('school_id'),
+        )
+        for point in points:
+            point['timestamp'] = point['timestamp'].isoformat()
+        return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'count': len(points),
+            'points': points,
+        })
 
 
-class LogStatisticViewSet(viewsets.ModelViewSet):
+class LogStatisticViewSet(BulkCreateModelMixin, viewsets.ModelViewSet):
     """
     API endpoint for receiving log statistics.
     
     POST /api/v1/statistics/
-        Submit log processing statistics
+        Submit log processing statistics (one object or a list)
     
     GET /api/v1/statistics/
         List recent statistics
@@ -110,12 +239,12 @@ class LogStatisticViewSet(viewsets.ModelViewSet):
         return queryset.order_by('-timestamp')[:500]
 
 
-class RawModelOutputViewSet(viewsets.ModelViewSet):
+class RawModelOutputViewSet(BulkCreateModelMixin, viewsets.ModelViewSet):
     """
     API endpoint for receiving raw model outputs.
     
     POST /api/v1/raw-outputs/
-        Submit raw model inference outputs
+        Submit raw model inference outputs (one object or a list)
     
     GET /api/v1/raw-outputs/
         List recent raw outputs
@@ -165,6 +294,10 @@ def api_status(request):
             'metrics': '/api/v1/metrics/',
             'statistics': '/api/v1/statistics/',
             'raw_outputs': '/api/v1/raw-outputs/',
+            'logs': '/api/v1/logs/',
+            'logs_batch': '/api/v1/logs/batch/',
+            'logs_stream': '/api/v1/logs/stream/',
+            'ingest_queue': '/api/v1/ingest/queue/',
             'health': '/api/v1/health/',
         }
     })
@@ -301,41 +434,28 @@ def receive_log(request):
             "domain": "apache"
         }
     """
-    from dashboard.models import LogEntry, Anomaly
-    from django.utils.dateparse import parse_datetime
+    from dashboard.models import Anomaly
     
     try:
-        data = request.data
+        log_entry, anomaly_score = build_log_entry(request.data)
         
-        # Parse timestamp
-        timestamp_str = data.get('timestamp')
-        if timestamp_str:
-            timestamp = parse_datetime(timestamp_str)
-            if not timestamp:
-                # Try parsing without timezone
-                from datetime import datetime
-                timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-        else:
-            from django.utils import timezone
-            timestamp = timezone.now()
+        if write_behind_enabled():
+            get_spool().append([request.data])
+            return Response({
+                'status': 'accepted',
+                'queued': 1,
+                'message': 'Log queued for processing'
+            }, status=status.HTTP_202_ACCEPTED)
         
-        # Create log entry
-        log_entry = LogEntry.objects.create(
-            timestamp=timestamp,
-            host_ip=data.get('host', 'unknown'),
-            log_type=data.get('log_type', 'INFO'),
-            source=data.get('source', 'unknown'),
-            log_message=data.get('message', '')
-        )
+        log_entry.save()
         
         # Create anomaly record if detected
-        anomaly_score = float(data.get('anomaly_score', 0.0))
-        if data.get('is_anomaly', False):
+        if anomaly_score is not None:
             Anomaly.objects.create(
                 log_entry=log_entry,
                 anomaly_score=anomaly_score,
                 is_anomaly=True,
-                threshold=0.5
+                threshold=DEFAULT_ANOMALY_THRESHOLD
             )
         
         return Response({
@@ -349,3 +469,146 @@ def receive_log(request):
             'status': 'error',
             'message': str(e)
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@authentication_classes([APIKeyAuthentication])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def receive_log_batch(request):
+    """
+    POST /api/v1/logs/batch/
+    
+    Receive many log records in one request. The body is either a JSON
+    array of records (same shape as POST /api/v1/logs/), an object with a
+    "logs" array, or NDJSON (Content-Type: application/x-ndjson).
+    
+    All valid records are written in a single transaction. Invalid records
+    are skipped and reported in the per-item results. In write-behind mode
+    valid records are queued instead ("status": "queued" per item, HTTP 202).
+        {
+            "status": "success",
+            "received": 3,
+            "created": 2,
+            "failed": 1,
+            "results": [
+                {"index": 0, "status": "created", "log_id": 101},
+                {"index": 1, "status": "created", "log_id": 102, "anomaly_id": 7},
+                {"index": 2, "status": "error", "message": "..."}
+            ]
+        }
+    """
+    records = request.data
+    if isinstance(records, dict):
+        records = records.get('logs')
+    
+    if not isinstance(records, list):
+        return Response({
+            'status': 'error',
+            'message': 'Expected a JSON array, an object with a "logs" array, or NDJSON'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    max_batch_size = get_max_batch_size()
+    if len(records) > max_batch_size:
+        return Response({
+            'status': 'error',
+            'message': f'Batch too large: {len(records)} records (max {max_batch_size})'
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    write_behind = write_behind_enabled()
+    results = queue_log_records(records) if write_behind else ingest_log_records(records)
+    accepted = sum(1 for result in results if result['status'] != 'error')
+    
+    # Only reject the request when every record in it was invalid
+    all_failed = bool(records) and accepted == 0
+    if all_failed:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif write_behind:
+        response_status = status.HTTP_202_ACCEPTED
+    else:
+        response_status = status.HTTP_201_CREATED
+    
+    return Response({
+        'status': 'error' if all_failed else 'success',
+        'received': len(records),
+        'created': 0 if write_behind else accepted,
+        'queued': accepted if write_behind else 0,
+        'failed': len(records) - accepted,
+        'results': results,
+    }, status=response_status)
+
+
+@streams_request_body
+@api_view(['POST'])
+@authentication_classes([APIKeyAuthentication])
+@permission_classes([IsAuthenticated])
+@parser_classes([NDJSONParser])
+def receive_log_stream(request):
+    """
+    POST /api/v1/logs/stream/
+    
+    Streaming ingestion for large NDJSON pushes (e.g. a backlog after a
+    network outage). The body is read line by line and never parsed as a
+    whole, and records are committed in chunks of API_STREAM_CHUNK_SIZE,
+    so worker memory stays flat regardless of the payload size. gzip/zstd
+    bodies are decompressed on the fly.
+    
+    Response body:
+        {
+            "status": "success",
+            "received": 250000,
+            "created": 249998,
+            "failed": 2,
+            "chunks": 250,
+            "errors": [{"line": 17, "message": "..."}],
+            "errors_truncated": false
+        }
+    """
+    # Read request.stream directly; touching request.data would buffer
+    # and parse the whole body
+    stream = request.stream
+    if stream is None:
+        return Response({
+            'status': 'error',
+            'message': 'Request body is empty'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    encoding = request.encoding or settings.DEFAULT_CHARSET
+    write_behind = write_behind_enabled()
+    try:
+        result = ingest_log_stream(stream, encoding=encoding, write_behind=write_behind).as_dict()
+    except DecompressionError as e:
+        # Chunks committed before the bad data stay committed
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            if isinstance(e, DecompressedBodyTooLarge) else status.HTTP_400_BAD_REQUEST)
+    
+    all_failed = result['received'] > 0 and result['created'] + result['queued'] == 0
+    result['status'] = 'error' if all_failed else 'success'
+    if all_failed:
+        response_status = status.HTTP_400_BAD_REQUEST
+    elif write_behind:
+        response_status = status.HTTP_202_ACCEPTED
+    else:
+        response_status = status.HTTP_201_CREATED
+    
+    return Response(result, status=response_status)
+
+
+@api_view(['GET'])
+@authentication_classes([APIKeyAuthentication])
+@permission_classes([IsAuthenticated])
+def ingest_queue_status(request):
+    """
+    GET /api/v1/ingest/queue/
+    
+    Write-behind spool metrics: queue depth, lag of the oldest queued
+    record, and totals enqueued/drained/failed.
+    """
+    return Response({
+        'mode': get_ingest_mode(),
+        'queue': get_spool().stats(),
+        'timestamp': timezone.now().isoformat(),
+    })
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class DashboardConfig(AppConfig):
@@ -7,3 +8,8 @@ class DashboardConfig(AppConfig):
 
     def ready(self):
         import dashboard.signals
+
+        if getattr(settings, 'MODEL_WARM_ON_START', False):
+            # Load the model next to startup instead of on the first prediction
+            from dashboard.ml_utils import model_manager
+            model_manager.load_in_background()
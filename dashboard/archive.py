@@ -0,0 +1,220 @@
+"""
+Cold archive for LogEntry/Anomaly.
+
+``archive_logs`` moves logs older than a cutoff (with their anomalies) out
+of the main database into one SQLite file per month,
+``LOG_ARCHIVE_DIR/logs-YYYY-MM.sqlite3``. Each file has the same
+dashboard_logentry/dashboard_anomaly tables and indexes as the main
+database and is registered as an extra database alias on first use, so
+readers query it with the ORM:
+
+    LogEntry.objects.using(segment_alias(segment.month))
+
+ArchiveSegment rows catalogue the files (row counts and timestamp range),
+so a date range only opens the months it overlaps.
+
+Rows keep their primary keys. Each batch is first copied into its segment
+and then deleted from the main tables; a run that stops between the two
+leaves the batch in both places, and the next run copies it again
+(duplicates are ignored) and finishes the delete. Runs can therefore be
+interrupted at any point and simply started again.
+
+Rollups and counters are not touched: archived rows are still part of the
+history that charts and totals describe. Archived messages are not in the
+FTS5 index, so search over a segment falls back to LIKE.
+"""
+import threading
+from collections import defaultdict
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Sum
+
+from .models import LogEntry, Anomaly, ArchiveSegment
+
+
+SEGMENT_ALIAS_PREFIX = 'archive_'
+
+# Keeps DELETE ... IN (...) well under SQLite's bound-parameter limit
+_DELETE_CHUNK_SIZE = 500
+
+_registry_lock = threading.Lock()
+
+
+def archive_dir():
+    return Path(getattr(settings, 'LOG_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def month_of(value):
+    """First day (UTC) of the month containing ``value``"""
+    return value.astimezone(dt_timezone.utc).date().replace(day=1)
+
+
+def segment_path(month):
+    return archive_dir() / f'logs-{month:%Y-%m}.sqlite3'
+
+
+def _ensure_schema(alias):
+    segment = connections[alias]
+    existing = set(segment.introspection.table_names())
+    with segment.schema_editor() as editor:
+        for model in (LogEntry, Anomaly):
+            if model._meta.db_table not in existing:
+                editor.create_model(model)
+
+
+def segment_alias(month):
+    """Database alias for the segment holding ``month``, registering it if needed"""
+    alias = f'{SEGMENT_ALIAS_PREFIX}{month:%Y_%m}'
+    path = str(segment_path(month))
+    with _registry_lock:
+        current = connections.settings.get(alias)
+        if current is not None and current['NAME'] == path:
+            return alias
+        if current is not None:
+            _drop_alias(alias)
+
+        archive_dir().mkdir(parents=True, exist_ok=True)
+        connections.settings[alias] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'OPTIONS': {'timeout': 20},
+            'ATOMIC_REQUESTS': False,
+            'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+        }
+        _ensure_schema(alias)
+    return alias
+
+
+def _drop_alias(alias):
+    try:
+        connections[alias].close()
+        del connections[alias]
+    except AttributeError:
+        pass
+    connections.settings.pop(alias, None)
+
+
+def close_segments():
+    """Close and unregister every segment alias (e.g. after changing LOG_ARCHIVE_DIR)"""
+    with _registry_lock:
+        for alias in [alias for alias in connections.settings if alias.startswith(SEGMENT_ALIAS_PREFIX)]:
+            _drop_alias(alias)
+
+
+def segments_for_range(start=None, end=None):
+    """Non-empty segments that may hold logs in ``[start, end]``, newest first"""
+    segments = ArchiveSegment.objects.filter(log_count__gt=0)
+    if start:
+        segments = segments.filter(last_timestamp__gte=start)
+    if end:
+        segments = segments.filter(first_timestamp__lte=end)
+    return list(segments.order_by('-month'))
+
+
+def archive_aliases(start=None, end=None):
+    """Database aliases of the segments overlapping ``[start, end]``"""
+    return [segment_alias(segment.month) for segment in segments_for_range(start, end)]
+
+
+def get_log(log_id):
+    """LogEntry ``log_id`` from the main table or the archive; raises LogEntry.DoesNotExist"""
+    log = LogEntry.objects.filter(id=log_id).first()
+    if log is not None:
+        return log
+    for alias in archive_aliases():
+        log = LogEntry.objects.using(alias).filter(id=log_id).first()
+        if log is not None:
+            return log
+    raise LogEntry.DoesNotExist(f'LogEntry {log_id} not found')
+
+
+def _copy_to_segments(logs):
+    """Copy ``logs`` and their anomalies into their segments; returns logs grouped by month"""
+    by_month = defaultdict(list)
+    for log in logs:
+        by_month[month_of(log.timestamp)].append(log)
+
+    log_months = {log.id: month for month, month_logs in by_month.items() for log in month_logs}
+    anomalies = defaultdict(list)
+    for anomaly in Anomaly.objects.filter(log_entry_id__in=list(log_months)):
+        anomalies[log_months[anomaly.log_entry_id]].append(anomaly)
+
+    for month, month_logs in by_month.items():
+        alias = segment_alias(month)
+        with transaction.atomic(using=alias):
+            LogEntry.objects.using(alias).bulk_create(month_logs, ignore_conflicts=True)
+            Anomaly.objects.using(alias).bulk_create(anomalies[month], ignore_conflicts=True)
+    return by_month
+
+
+def raw_delete(model, column, ids):
+    """DELETE rows without loading them or sending signals; returns the row count"""
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(column)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), _DELETE_CHUNK_SIZE):
+            chunk = ids[start:start + _DELETE_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', chunk)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def archive_logs(cutoff, batch_size=None, max_batches=None):
+    """
+    Move logs with ``timestamp < cutoff`` and their anomalies to the archive.
+
+    Works oldest first in batches of ``batch_size``; ``max_batches`` stops
+    early so a run can be kept short. Returns
+    ``{'logs': moved, 'anomalies': moved, 'batches': n, 'remaining': bool}``.
+    """
+    batch_size = batch_size or getattr(settings, 'LOG_ARCHIVE_BATCH_SIZE', 5000)
+    totals = {'logs': 0, 'anomalies': 0, 'batches': 0, 'remaining': False}
+
+    while True:
+        logs = list(LogEntry.objects.filter(timestamp__lt=cutoff).order_by('timestamp', 'id')[:batch_size])
+        if not logs:
+            return totals
+        if max_batches is not None and totals['batches'] >= max_batches:
+            totals['remaining'] = True
+            return totals
+
+        by_month = _copy_to_segments(logs)
+
+        # Main-table deletes use raw SQL: the rows stay in the rollups and
+        # counters, so the delete signals must not fire
+        with transaction.atomic():
+            for month, month_logs in by_month.items():
+                ids = [log.id for log in month_logs]
+                anomaly_count = raw_delete(Anomaly, 'log_entry_id', ids)
+                log_count = raw_delete(LogEntry, 'id', ids)
+
+                segment, _ = ArchiveSegment.objects.select_for_update().get_or_create(month=month)
+                segment.log_count += log_count
+                segment.anomaly_count += anomaly_count
+                first = min(log.timestamp for log in month_logs)
+                last = max(log.timestamp for log in month_logs)
+                if segment.first_timestamp is None or first < segment.first_timestamp:
+                    segment.first_timestamp = first
+                if segment.last_timestamp is None or last > segment.last_timestamp:
+                    segment.last_timestamp = last
+                segment.save()
+
+                totals['logs'] += log_count
+                totals['anomalies'] += anomaly_count
+        totals['batches'] += 1
+
+
+def clear_archive():
+    """Delete every segment file and catalogue row; returns the number of archived logs removed"""
+    removed = ArchiveSegment.objects.aggregate(total=Sum('log_count'))['total'] or 0
+    close_segments()
+    for path in archive_dir().glob('logs-*.sqlite3*'):
+        path.unlink()
+    ArchiveSegment.objects.all().delete()
+    return removed
@@ -0,0 +1,167 @@
+"""
+Dynamic micro-batching for model inference.
+
+Callers ``submit`` single messages and get a ``concurrent.futures.Future``.
+One scheduler thread takes the oldest waiting message, keeps collecting
+until the batch holds ``max_batch_size`` messages or the oldest has waited
+``max_wait`` seconds, and runs a single ``predict_batch`` call for all of
+them. Under concurrent load many small requests become a few full
+batches, so throughput approaches that of one large batch; a lone request
+waits at most ``max_wait`` longer than it would on its own.
+
+With ``threads`` > 1 several schedulers take batches from the same queue,
+so that many batches are in flight at once; that is how one queue feeds
+a pool of worker processes (see ``inference_pool``).
+
+``stats()`` reports queue depth, a batch-size histogram and latency
+percentiles (submit to result, and per forward pass).
+"""
+import logging
+import math
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept for the percentiles
+LATENCY_WINDOW = 10000
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Nearest-rank percentiles of ``values``, plus the max"""
+    ordered = sorted(values)
+    result = {
+        f'p{point}': ordered[max(0, math.ceil(point / 100 * len(ordered)) - 1)] if ordered else 0.0
+        for point in points
+    }
+    result['max'] = ordered[-1] if ordered else 0.0
+    return result
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item requests into batched ``predict_batch`` calls"""
+
+    def __init__(self, predict_batch, max_batch_size=32, max_wait=0.005, name='micro-batcher', threads=1):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self.threads = threads
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = None
+        self._closed = False
+
+        self._batch_sizes = Counter()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._forward_times = deque(maxlen=LATENCY_WINDOW)
+        self._items = 0
+        self._batches = 0
+        self._errors = 0
+
+    def submit(self, item):
+        """Queue ``item``; the returned Future resolves to its prediction"""
+        if self._closed:
+            raise RuntimeError(f'{self.name} is closed')
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def submit_many(self, items):
+        return [self.submit(item) for item in items]
+
+    def map(self, items, timeout=None):
+        """Predictions for ``items``, in order (blocks until all are done)"""
+        return [future.result(timeout) for future in self.submit_many(items)]
+
+    def close(self, timeout=None):
+        """Finish the queued requests and stop the schedulers"""
+        self._closed = True
+        if self._workers is not None:
+            for _ in self._workers:
+                self._queue.put(None)
+            for thread in self._workers:
+                thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'items': self._items,
+                'batches': self._batches,
+                'errors': self._errors,
+                'mean_batch_size': self._items / self._batches if self._batches else 0.0,
+                'batch_sizes': dict(sorted(self._batch_sizes.items())),
+                'latency_ms': percentiles(list(self._latencies)),
+                'forward_ms': percentiles(list(self._forward_times)),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'threads': self.threads,
+            }
+
+    def _ensure_started(self):
+        if self._workers is not None:
+            return
+        with self._lock:
+            if self._workers is None:
+                workers = [
+                    threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True)
+                    for i in range(self.threads)
+                ]
+                for thread in workers:
+                    thread.start()
+                self._workers = workers
+
+    def _collect(self, first):
+        """``first`` plus whatever else arrives before the batch is full or the deadline passes"""
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # close(): put the sentinel back for a main loop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            items = [item for item, _, _ in batch]
+
+            started = time.monotonic()
+            try:
+                results = list(self.predict_batch(items))
+                if len(results) != len(items):
+                    raise ValueError(f'predict_batch returned {len(results)} results for {len(items)} items')
+            except Exception as e:
+                logger.exception('%s: batch of %d failed', self.name, len(items))
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._lock:
+                    self._errors += 1
+                continue
+
+            finished = time.monotonic()
+            for (_, future, enqueued), result in zip(batch, results):
+                future.set_result(result)
+            with self._lock:
+                self._items += len(batch)
+                self._batches += 1
+                self._batch_sizes[len(batch)] += 1
+                self._forward_times.append((finished - started) * 1000)
+                self._latencies.extend((finished - enqueued) * 1000 for _, _, enqueued in batch)
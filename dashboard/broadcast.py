@@ -0,0 +1,73 @@
+"""
+Single producer for the dashboard WebSocket feed.
+
+``DashboardConsumer`` connections do no work of their own: they join the
+``DASHBOARD_GROUP`` channel-layer group and relay what is sent to it. One
+publisher polls a ``ChangeFeed`` (see ``stream``) and sends every new
+anomaly and stats change to the group once, so the database and CPU cost
+is the same for one open tab or a hundred. The feed detects changes from
+the database, so a standalone publisher sees writes from every process.
+
+With a cross-process channel layer (Redis) the publisher runs as its own
+process: ``python manage.py publish_dashboard_events``. With the in-memory
+layer, which only reaches consumers in the same process, each server
+process starts one publisher task on its first WebSocket connection.
+"""
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.conf import settings
+
+from .stream import ChangeFeed
+
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_GROUP = 'dashboard'
+
+# ChangeFeed event -> consumer handler (``anomaly.created`` calls ``anomaly_created``)
+MESSAGE_TYPES = {
+    'anomaly': 'anomaly.created',
+    'stats': 'stats.changed',
+}
+
+_publisher_task = None
+
+
+def get_publish_interval():
+    return getattr(settings, 'DASHBOARD_STREAM_POLL_INTERVAL', 1.0)
+
+
+async def publish_changes(channel_layer, feed):
+    """Send what changed since the last call to the group; returns the number of messages"""
+    events = await database_sync_to_async(feed.poll)()
+    for event, event_id, payload in events:
+        await channel_layer.group_send(DASHBOARD_GROUP, {'type': MESSAGE_TYPES[event], 'data': payload})
+    return len(events)
+
+
+async def run_publisher(channel_layer, interval=None, once=False):
+    """Publish changes every ``interval`` seconds (one pass with ``once``)"""
+    interval = get_publish_interval() if interval is None else interval
+    feed = await database_sync_to_async(ChangeFeed)()
+    while True:
+        try:
+            await publish_changes(channel_layer, feed)
+        except Exception:
+            if once:
+                raise
+            logger.exception('Dashboard publisher pass failed')
+        if once:
+            return
+        await asyncio.sleep(interval)
+
+
+def ensure_local_publisher(channel_layer):
+    """Start this process's publisher task when the layer cannot reach other processes"""
+    global _publisher_task
+    if not isinstance(channel_layer, InMemoryChannelLayer):
+        return
+    if _publisher_task is None or _publisher_task.done():
+        _publisher_task = asyncio.get_running_loop().create_task(run_publisher(channel_layer))
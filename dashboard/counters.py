@@ -0,0 +1,123 @@
+"""
+Global log/anomaly counters.
+
+DataCounter rows hold running totals that are updated in the same
+transaction as the writes they count, so count views read a few rows
+instead of running ``COUNT(*)`` over LogEntry/Anomaly:
+
+    logs                        all log entries
+    anomalies                   all anomalies
+    anomalies_unacknowledged    anomalies with acknowledged=False
+    log_type:<type>             log entries per log_type (as stored)
+
+Updates are ``INSERT ... ON CONFLICT DO UPDATE`` increments, so concurrent
+writers never lose counts.
+"""
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import Count
+
+from .archive import archive_aliases
+from .models import LogEntry, Anomaly, DataCounter
+
+
+LOGS = 'logs'
+ANOMALIES = 'anomalies'
+UNACKNOWLEDGED = 'anomalies_unacknowledged'
+LOG_TYPE_PREFIX = 'log_type:'
+
+
+def increment(deltas):
+    """Add ``{name: delta}`` to the counters"""
+    params = [(name, delta) for name, delta in deltas.items() if delta]
+    if not params:
+        return
+
+    table = connection.ops.quote_name(DataCounter._meta.db_table)
+    name = connection.ops.quote_name('name')
+    value = connection.ops.quote_name('value')
+    sql = (
+        f'INSERT INTO {table} ({name}, {value}) VALUES (%s, %s) '
+        f'ON CONFLICT ({name}) DO UPDATE SET {value} = {table}.{value} + excluded.{value}'
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def count_logs(log_entries, sign=1):
+    """Count saved log entries (``sign=-1`` for deleted ones)"""
+    deltas = Counter()
+    for log_entry in log_entries:
+        deltas[LOGS] += sign
+        deltas[LOG_TYPE_PREFIX + (log_entry.log_type or '')] += sign
+    increment(deltas)
+
+
+def count_anomalies(anomalies, sign=1):
+    """Count saved anomalies (``sign=-1`` for deleted ones)"""
+    deltas = Counter()
+    for anomaly in anomalies:
+        deltas[ANOMALIES] += sign
+        if not anomaly.acknowledged:
+            deltas[UNACKNOWLEDGED] += sign
+    increment(deltas)
+
+
+def count_acknowledgement(anomaly):
+    """Adjust the unacknowledged count after ``anomaly`` was saved"""
+    previous = getattr(anomaly, '_loaded_acknowledged', None)
+    if previous is not None and previous != anomaly.acknowledged:
+        increment({UNACKNOWLEDGED: -1 if anomaly.acknowledged else 1})
+    anomaly._loaded_acknowledged = anomaly.acknowledged
+
+
+def get_counters():
+    """
+    Return the current totals:
+        {'total_logs', 'total_anomalies', 'unacknowledged_anomalies',
+         'log_types': {log_type: count}}
+    """
+    values = dict(DataCounter.objects.values_list('name', 'value'))
+    return {
+        'total_logs': values.get(LOGS, 0),
+        'total_anomalies': values.get(ANOMALIES, 0),
+        'unacknowledged_anomalies': values.get(UNACKNOWLEDGED, 0),
+        'log_types': {
+            name[len(LOG_TYPE_PREFIX):]: value
+            for name, value in values.items()
+            if name.startswith(LOG_TYPE_PREFIX) and value
+        },
+    }
+
+
+def log_type_count(counters, log_type):
+    """Count for ``log_type`` from ``get_counters()``, ignoring case"""
+    log_type = log_type.lower()
+    return sum(
+        count for name, count in counters['log_types'].items()
+        if name.lower() == log_type
+    )
+
+
+def compute_counter_values():
+    """Counter values computed from the raw tables and the archive (``{name: value}``)"""
+    values = Counter({LOGS: 0, ANOMALIES: 0, UNACKNOWLEDGED: 0})
+    for using in [DEFAULT_DB_ALIAS] + archive_aliases():
+        values[LOGS] += LogEntry.objects.using(using).count()
+        values[ANOMALIES] += Anomaly.objects.using(using).count()
+        values[UNACKNOWLEDGED] += Anomaly.objects.using(using).filter(acknowledged=False).count()
+        rows = LogEntry.objects.using(using).values('log_type').annotate(count=Count('id')).order_by()
+        for row in rows:
+            values[LOG_TYPE_PREFIX + (row['log_type'] or '')] += row['count']
+    return dict(values)
+
+
+def rebuild_counters():
+    """Recompute every counter from the raw tables; returns the values"""
+    values = compute_counter_values()
+    DataCounter.objects.all().delete()
+    DataCounter.objects.bulk_create([
+        DataCounter(name=name, value=value) for name, value in values.items()
+    ])
+    return values
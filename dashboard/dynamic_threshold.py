@@ -0,0 +1,115 @@
+"""
+Dynamic anomaly threshold for the scoring path.
+
+The Kafka worker (``api.kafka_worker``) scores logs with the model and
+flags those above the threshold. ``DynamicThreshold`` keeps the most
+recent ``window_size`` scores on each side of the current threshold and,
+every ``interval`` seconds, moves the threshold to the one with the best
+F1 on that window. Every distinct score in [0, 1] is a candidate, swept
+at once by ``thresholds.threshold_sweep`` (NumPy) rather than trying a
+few steps around the current value.
+
+The window is labelled by the threshold itself, which always scores a
+perfect F1 on scores it labelled, and every score between the highest
+normal and lowest abnormal one ties with it. Taking the sweep's lowest
+tie would ratchet the threshold down each interval on a stationary
+stream, so it only moves when some candidate strictly beats the current
+threshold's F1 (the window still holds labels from an earlier threshold,
+e.g. one reloaded from disk), and then to the best candidate closest to
+the current value.
+
+The threshold is pickled to ANOMALY_THRESHOLD_PATH after every update,
+the file model evaluation writes, so a restarted worker resumes from it.
+"""
+import logging
+import pickle
+import time
+from collections import deque
+
+import numpy as np
+from django.conf import settings
+
+from .thresholds import threshold_f1, threshold_sweep
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_threshold_settings():
+    return {
+        'path': getattr(settings, 'ANOMALY_THRESHOLD_PATH', '../output/university_logs/bert_threshold.pkl'),
+        'window_size': getattr(settings, 'ANOMALY_THRESHOLD_WINDOW_SIZE', 1000),
+        'interval': getattr(settings, 'ANOMALY_THRESHOLD_RECOMPUTE_INTERVAL', 300),
+    }
+
+
+def load_threshold(path, default):
+    """The pickled threshold at ``path``, or ``default`` when there is none"""
+    try:
+        with open(path, 'rb') as f:
+            return float(pickle.load(f))
+    except (OSError, pickle.PickleError, EOFError, TypeError, ValueError):
+        return default
+
+
+class DynamicThreshold:
+    """The current threshold, recomputed from a window of recent scores"""
+
+    def __init__(self, threshold, window_size=None, interval=None, path=None, clock=time.monotonic):
+        options = get_threshold_settings()
+        self.threshold = threshold
+        self.interval = options['interval'] if interval is None else interval
+        self.path = options['path'] if path is None else path
+        window_size = options['window_size'] if window_size is None else window_size
+        self.normal_scores = deque(maxlen=window_size)
+        self.abnormal_scores = deque(maxlen=window_size)
+        self.clock = clock
+        self.last_update = clock()
+
+    @classmethod
+    def load(cls, default, **kwargs):
+        """Start from the persisted threshold, or ``default`` when none was saved"""
+        path = kwargs.get('path') or get_threshold_settings()['path']
+        return cls(load_threshold(path, default), **kwargs)
+
+    def observe(self, scores):
+        """Add scores to the window; recomputes the threshold when ``interval`` has passed"""
+        for score in scores:
+            if score > self.threshold:
+                self.abnormal_scores.append(score)
+            else:
+                self.normal_scores.append(score)
+
+        now = self.clock()
+        if now - self.last_update >= self.interval:
+            self.last_update = now
+            self.update()
+
+    def update(self):
+        """Move to a strictly better-F1 threshold for the current window; returns True when it changed"""
+        if not self.normal_scores or not self.abnormal_scores:
+            return False
+
+        sweep = threshold_sweep(self.normal_scores, self.abnormal_scores)
+        if sweep['best'] is None:
+            return False
+        if sweep['best']['f1'] <= threshold_f1(self.normal_scores, self.abnormal_scores, self.threshold):
+            return False
+
+        tied = sweep['thresholds'][(sweep['f1'] == sweep['best']['f1']) & (sweep['tp'] > 0)]
+        best = float(tied[np.argmin(np.abs(tied - self.threshold))])
+
+        logger.info('Anomaly threshold moved from %.4f to %.4f', self.threshold, best)
+        self.threshold = best
+        self.persist()
+        return True
+
+    def persist(self):
+        """Pickle the threshold to ``path``; returns False when it cannot be written"""
+        try:
+            with open(self.path, 'wb') as f:
+                pickle.dump(self.threshold, f)
+            return True
+        except OSError as e:
+            logger.warning('Could not save the anomaly threshold to %s: %s', self.path, e)
+            return False
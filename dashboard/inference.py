@@ -0,0 +1,320 @@
+"""
+CPU inference backends for the log model.
+
+``ModelManager`` scores through one backend, picked with MODEL_BACKEND:
+
+    eager        the fp32 PyTorch model as trained; the reference
+    int8         dynamic int8 quantization of the Linear layers (weights
+                 quantized once at load, activations per batch)
+    torchscript  the traced, frozen graph written by ``export_model``
+    onnx         the same graph as ONNX, run by onnxruntime
+
+All of them take tokenized ``input_ids``/``attention_mask`` and return one
+score per message (sigmoid of the first logit), so they are
+interchangeable behind ``predict``. The exported graphs are written once
+with ``python manage.py export_model``, which also runs ``parity`` against
+eager fp32 on a held-out sample; ``python manage.py benchmark_inference``
+compares throughput and memory.
+
+torch, transformers and onnxruntime are imported when a model or backend
+is loaded, so the helpers here import without them.
+"""
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+
+
+BACKENDS = ('eager', 'int8', 'torchscript', 'onnx')
+EXPORT_FORMATS = ('torchscript', 'onnx')
+EXPORT_FILES = {'torchscript': 'bert.torchscript.pt', 'onnx': 'bert.onnx', 'weights': 'bert.weights.pt'}
+
+MAX_LENGTH = 512
+BATCH_SIZE = 32
+
+# Traced once at export; kept apart from the held-out parity sample
+TRACE_MESSAGES = [
+    'GET /index.html HTTP/1.1 200 5123',
+    'Failed password for invalid user admin from 203.0.113.45 port 52311 ssh2',
+    'Database query executed in 2.3 seconds',
+    'kernel: eth0: link up, 1000 Mbps, full duplex',
+]
+
+
+def get_backend_name():
+    return getattr(settings, 'MODEL_BACKEND', 'eager')
+
+
+def get_model_settings():
+    return {
+        'model_path': str(getattr(settings, 'MODEL_PATH', '../output/university_logs/bert/best_bert.pth')),
+        'vocab_path': str(getattr(settings, 'MODEL_VOCAB_PATH', '../output/university_logs/vocab.pkl')),
+        'tokenizer': str(getattr(settings, 'MODEL_TOKENIZER', 'bert-base-uncased')),
+    }
+
+
+def export_path(backend, export_dir=None):
+    export_dir = export_dir or getattr(settings, 'MODEL_EXPORT_DIR', 'model_exports')
+    return os.path.join(str(export_dir), EXPORT_FILES[backend])
+
+
+def load_tokenizer():
+    from transformers import BertTokenizer
+    return BertTokenizer.from_pretrained(get_model_settings()['tokenizer'])
+
+
+def load_fp32_model(mmap=False, export_dir=None):
+    """
+    The trained BERTModel in eval mode.
+
+    With ``mmap`` the parameters stay memory-mapped from the weights file
+    (``export_model --format weights``, or MODEL_PATH when there is none)
+    instead of being copied into process memory, so every process that
+    maps the file shares the same physical pages.
+    """
+    import pickle
+
+    import torch
+    from bert_pytorch.model.bert import BERTModel
+
+    paths = get_model_settings()
+    with open(paths['vocab_path'], "rb") as f:
+        vocab = pickle.load(f)
+    model = BERTModel(vocab_size=len(vocab))
+    if mmap:
+        weights = export_path('weights', export_dir)
+        path = weights if os.path.exists(weights) else paths['model_path']
+        state_dict = torch.load(path, map_location=torch.device('cpu'), mmap=True, weights_only=True)
+        # assign: use the mapped tensors as the parameters rather than copying into them
+        model.load_state_dict(state_dict, assign=True)
+    else:
+        model.load_state_dict(torch.load(paths['model_path'], map_location=torch.device('cpu')))
+    model.eval()
+    return model
+
+
+def score_module(model):
+    """``model`` wrapped so ``forward(input_ids, attention_mask)`` returns scores (traceable)"""
+    import torch
+
+    class ScoreHead(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+            return torch.sigmoid(outputs.logits[:, 0])
+
+    return ScoreHead(model).eval()
+
+
+class TorchBackend:
+    """eager, int8 and torchscript: a torch module returning scores"""
+    tensor_type = 'pt'
+
+    def __init__(self, name, module):
+        self.name = name
+        self.module = module
+
+    def predict(self, inputs):
+        import torch
+        with torch.no_grad():
+            return self.module(inputs['input_ids'], inputs['attention_mask']).tolist()
+
+
+class OnnxBackend:
+    tensor_type = 'np'
+    name = 'onnx'
+
+    def __init__(self, path):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def predict(self, inputs):
+        feeds = {'input_ids': inputs['input_ids'], 'attention_mask': inputs['attention_mask']}
+        return self.session.run(['scores'], feeds)[0].tolist()
+
+
+def load_backend(name, model=None, export_dir=None):
+    """
+    Build backend ``name``.
+
+    eager and int8 start from ``model`` (the fp32 model, loaded when not
+    given); torchscript and onnx only read their exported file.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}' (choose from {', '.join(BACKENDS)})")
+
+    if name in EXPORT_FORMATS:
+        path = export_path(name, export_dir)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'{path} not found; run: python manage.py export_model --format {name}')
+        if name == 'onnx':
+            return OnnxBackend(path)
+        import torch
+        return TorchBackend(name, torch.jit.load(path, map_location='cpu').eval())
+
+    import torch
+    model = load_fp32_model() if model is None else model
+    if name == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return TorchBackend(name, score_module(model))
+
+
+def tokenize(tokenizer, messages, tensor_type='pt'):
+    return tokenizer(
+        messages,
+        return_tensors=tensor_type,
+        padding=True,
+        truncation=True,
+        max_length=MAX_LENGTH
+    )
+
+
+def predict(backend, tokenizer, messages, batch_size=BATCH_SIZE):
+    """Scores for ``messages``, ``batch_size`` per forward pass"""
+    scores = []
+    for i in range(0, len(messages), batch_size):
+        inputs = tokenize(tokenizer, messages[i:i + batch_size], backend.tensor_type)
+        scores.extend(backend.predict(inputs))
+    return scores
+
+
+def export_model(model, tokenizer, formats=EXPORT_FORMATS, export_dir=None, opset=17):
+    """
+    Write the requested formats of the fp32 ``model``; returns {format: path}.
+
+    ``weights`` is the state dict as contiguous tensors in torch's zip
+    format, which ``load_fp32_model(mmap=True)`` can map; the graph
+    formats are traced once.
+    """
+    import torch
+
+    module = score_module(model)
+    inputs = tokenize(tokenizer, TRACE_MESSAGES)
+    args = (inputs['input_ids'], inputs['attention_mask'])
+    paths = {}
+    with torch.no_grad():
+        for name in formats:
+            path = export_path(name, export_dir)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            if name == 'weights':
+                state_dict = {key: tensor.contiguous() for key, tensor in model.state_dict().items()}
+                torch.save(state_dict, path)
+            elif name == 'torchscript':
+                traced = torch.jit.freeze(torch.jit.trace(module, args, strict=False))
+                traced.save(path)
+            elif name == 'onnx':
+                torch.onnx.export(
+                    module,
+                    args,
+                    path,
+                    input_names=['input_ids', 'attention_mask'],
+                    output_names=['scores'],
+                    dynamic_axes={
+                        'input_ids': {0: 'batch', 1: 'sequence'},
+                        'attention_mask': {0: 'batch', 1: 'sequence'},
+                        'scores': {0: 'batch'},
+                    },
+                    opset_version=opset,
+                )
+            else:
+                raise ValueError(f"Unknown export format '{name}'")
+            paths[name] = path
+    return paths
+
+
+def holdout_messages(count=200):
+    """Up to ``count`` recent log messages with distinct templates, none of them trace inputs"""
+    from .models import LogEntry
+    from .score_cache import normalize_message
+
+    seen = {normalize_message(message) for message in TRACE_MESSAGES}
+    messages = []
+    for message in LogEntry.objects.order_by('-id').values_list('log_message', flat=True)[:count * 50].iterator():
+        template = normalize_message(message)
+        if template not in seen:
+            seen.add(template)
+            messages.append(message)
+            if len(messages) == count:
+                break
+    return messages
+
+
+def parity(reference, candidate, tolerance=0.01, threshold=0.5):
+    """Compare ``candidate`` scores with the eager fp32 ``reference`` scores"""
+    reference = np.asarray(reference, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    if reference.shape != candidate.shape:
+        raise ValueError(f'{len(candidate)} scores to compare with {len(reference)}')
+    diff = np.abs(candidate - reference)
+    max_diff = float(diff.max()) if diff.size else 0.0
+    return {
+        'messages': int(diff.size),
+        'max_abs_diff': max_diff,
+        'mean_abs_diff': float(diff.mean()) if diff.size else 0.0,
+        # Messages that land on the other side of the anomaly threshold
+        'flipped': int(np.count_nonzero((reference > threshold) != (candidate > threshold))),
+        'ok': max_diff <= tolerance,
+    }
+
+
+def rss_mb():
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def benchmark_backend(name, messages, batch_size=BATCH_SIZE, repeat=3, export_dir=None):
+    """
+    Load backend ``name`` and score ``messages`` ``repeat`` times.
+
+    Meant to run in a fresh process per backend (see ``benchmark_inference``)
+    so the memory figures are not mixed with another backend's.
+    """
+    baseline = rss_mb()
+    started = time.perf_counter()
+    tokenizer = load_tokenizer()
+    backend = load_backend(name, export_dir=export_dir)
+    load_seconds = time.perf_counter() - started
+    loaded = rss_mb()
+
+    predict(backend, tokenizer, messages[:batch_size], batch_size)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        scores = predict(backend, tokenizer, messages, batch_size)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    return {
+        'backend': name,
+        'load_seconds': load_seconds,
+        'messages_per_second': len(messages) / best if best else 0.0,
+        'model_rss_mb': loaded - baseline,
+        'rss_mb': rss_mb(),
+        'scores': scores,
+    }
+
+
+def _init_benchmark_worker():
+    import django
+    django.setup()
+
+
+def _run_benchmark(args):
+    try:
+        return benchmark_backend(*args)
+    except Exception as e:
+        return {'backend': args[0], 'error': f'{type(e).__name__}: {e}'}
+
+
+def benchmark_in_subprocess(name, messages, batch_size=BATCH_SIZE, repeat=3, export_dir=None):
+    """``benchmark_backend`` in a new process; load errors come back as ``{'error': ...}``"""
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, initializer=_init_benchmark_worker) as pool:
+        return pool.apply(_run_benchmark, ((name, messages, batch_size, repeat, export_dir),))
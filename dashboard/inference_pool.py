@@ -0,0 +1,142 @@
+"""
+Multi-process model inference.
+
+One process scores one batch at a time on however many cores torch's
+intra-op threads reach, and the GIL keeps tokenization serial.
+``InferencePool`` runs ``workers`` processes instead, each with its own
+tokenizer and fp32 model, and ``threads_per_worker`` intra-op threads
+(``workers * threads_per_worker`` should not exceed the cores).
+
+The weights are loaded with ``load_fp32_model(mmap=True)``: every worker
+maps the same file, read-only, so the weights occupy physical memory once
+(in the page cache) instead of once per worker. Run ``python manage.py
+export_model --format weights`` first when MODEL_PATH is not in torch's
+zip format.
+
+``ModelManager`` uses a pool when MODEL_INFERENCE_WORKERS > 0. Its
+micro-batcher then runs one scheduler thread per worker, so batches from
+the shared queue go to whichever worker is free.
+"""
+import multiprocessing
+import os
+import time
+
+from . import inference
+from .batching import MicroBatcher
+
+
+_worker = {}
+
+
+def default_threads(workers):
+    """Intra-op threads per worker that keep the pool within the machine's cores"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(threads, export_dir):
+    import django
+    django.setup()
+
+    # An exception here would make the pool restart the worker forever;
+    # keep it and raise it from the first task instead
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+
+        _worker['tokenizer'] = inference.load_tokenizer()
+        model = inference.load_fp32_model(mmap=True, export_dir=export_dir)
+        _worker['backend'] = inference.TorchBackend('eager', inference.score_module(model))
+    except Exception as e:
+        _worker['error'] = e
+
+
+def _score(messages):
+    if 'error' in _worker:
+        raise _worker['error']
+    return inference.predict(_worker['backend'], _worker['tokenizer'], messages)
+
+
+def _worker_memory(delay):
+    """This worker's resident and proportional (shared pages split between users) memory in MB"""
+    import psutil
+    # Held briefly so concurrent calls spread over the workers
+    time.sleep(delay)
+    memory = psutil.Process().memory_full_info()
+    return os.getpid(), memory.rss / (1024 * 1024), getattr(memory, 'pss', memory.rss) / (1024 * 1024)
+
+
+class InferencePool:
+    """``workers`` processes scoring batches with a shared, memory-mapped model"""
+
+    def __init__(self, workers, threads_per_worker=None, export_dir=None):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or default_threads(workers)
+        context = multiprocessing.get_context('spawn')
+        self._pool = context.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(self.threads_per_worker, export_dir),
+        )
+        try:
+            # Fails here, not on the first request, when a worker cannot load
+            self._pool.map(_score, [[]] * workers, chunksize=1)
+        except Exception:
+            self.close()
+            raise
+
+    def predict_batch(self, messages):
+        """Scores for one batch, computed by whichever worker is free (blocks)"""
+        return self._pool.apply(_score, (list(messages),))
+
+    def memory(self):
+        """
+        Resident and proportional memory per worker, in MB.
+
+        Weights shared through the mapped file count fully in every
+        worker's RSS but only once across the workers' PSS.
+        """
+        samples = {}
+        for _ in range(5):
+            for pid, rss, pss in self._pool.map(_worker_memory, [0.2] * self.workers, chunksize=1):
+                samples[pid] = {'rss_mb': rss, 'pss_mb': pss}
+            if len(samples) == self.workers:
+                break
+        return samples
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+
+def benchmark_scaling(workers, messages, batch_size=inference.BATCH_SIZE, repeat=3, threads_per_worker=None,
+                      export_dir=None):
+    """
+    Throughput of a ``workers`` pool fed by a micro-batcher, as ModelManager uses it.
+
+    All ``messages`` are queued at once; returns messages per second (best
+    of ``repeat``) and the workers' summed RSS and PSS.
+    """
+    pool = InferencePool(workers, threads_per_worker, export_dir)
+    batcher = MicroBatcher(pool.predict_batch, max_batch_size=batch_size, threads=workers, name='scaling-benchmark')
+    try:
+        batcher.map(messages[:batch_size * workers])  # warm-up
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            batcher.map(messages)
+            timings.append(time.perf_counter() - started)
+        memory = pool.memory()
+    finally:
+        batcher.close()
+        pool.close()
+
+    best = min(timings)
+    return {
+        'workers': workers,
+        'threads_per_worker': pool.threads_per_worker,
+        'messages_per_second': len(messages) / best if best else 0.0,
+        'mean_batch_size': batcher.stats()['mean_batch_size'],
+        'rss_mb': sum(sample['rss_mb'] for sample in memory.values()),
+        'pss_mb': sum(sample['pss_mb'] for sample in memory.values()),
+    }
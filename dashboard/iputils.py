@@ -0,0 +1,56 @@
+"""
+Packed IP addresses and CIDR range filters.
+
+Addresses are stored as 16 bytes in network order, with IPv4 mapped into
+IPv6 (``::ffff:a.b.c.d``), so IPv4 and IPv6 share one column and every
+CIDR block is a contiguous byte range. A subnet filter is then a
+``BETWEEN low AND high`` index range scan instead of a string match.
+"""
+import ipaddress
+
+from django.db.models import Q
+
+
+class InvalidCIDR(ValueError):
+    """The CIDR block could not be parsed."""
+
+
+def _to_ipv6(address):
+    if address.version == 4:
+        return ipaddress.IPv6Address(b'\x00' * 10 + b'\xff\xff' + address.packed)
+    return address
+
+
+def pack_ip(value):
+    """16-byte packed form of an IPv4/IPv6 address string, or None"""
+    if not value:
+        return None
+    try:
+        address = ipaddress.ip_address(str(value).strip())
+    except ValueError:
+        return None
+    return _to_ipv6(address).packed
+
+
+def unpack_ip(packed):
+    """Address string for a value from ``pack_ip``"""
+    address = ipaddress.IPv6Address(bytes(packed))
+    return str(address.ipv4_mapped or address)
+
+
+def cidr_range(cidr):
+    """Return the ``(low, high)`` packed bounds of a CIDR block (or single address)"""
+    try:
+        network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+    except ValueError:
+        raise InvalidCIDR(f'Invalid CIDR block: {cidr}')
+    return (
+        _to_ipv6(network.network_address).packed,
+        _to_ipv6(network.broadcast_address).packed,
+    )
+
+
+def cidr_q(cidr, field='ip_numeric'):
+    """Q object selecting rows whose packed ``field`` lies inside ``cidr``"""
+    low, high = cidr_range(cidr)
+    return Q(**{f'{field}__gte': low, f'{field}__lte': high})
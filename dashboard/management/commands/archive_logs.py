@@ -0,0 +1,57 @@
+"""
+Django management command to move old logs into the cold archive
+Usage: python manage.py archive_logs [--older-than-days 90] [--max-batches N]
+
+Safe to interrupt and re-run. Schedule it (e.g. nightly from cron) to keep
+the main LogEntry table small.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from dashboard.archive import archive_dir, archive_logs
+from dashboard.utils import invalidate_log_caches
+
+
+class Command(BaseCommand):
+    help = 'Move logs older than LOG_ARCHIVE_AFTER_DAYS into monthly archive databases'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=settings.LOG_ARCHIVE_AFTER_DAYS,
+            help='Archive logs with a timestamp older than this many days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.LOG_ARCHIVE_BATCH_SIZE,
+            help='Logs moved per transaction',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches (the next run continues)',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        self.stdout.write(f'📦 Archiving logs older than {cutoff:%Y-%m-%d %H:%M} UTC to {archive_dir()}...')
+        start = time.perf_counter()
+
+        result = archive_logs(cutoff, batch_size=options['batch_size'], max_batches=options['max_batches'])
+        if result['logs']:
+            invalidate_log_caches()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Archived {result['logs']:,} logs and {result['anomalies']:,} anomalies "
+            f"in {result['batches']} batches ({elapsed:.2f}s)"
+        ))
+        if result['remaining']:
+            self.stdout.write(self.style.WARNING('⏸️  More logs are due; run the command again to continue'))
@@ -0,0 +1,135 @@
+"""
+Django management command to benchmark the model inference backends
+Usage: python manage.py benchmark_inference [--backends eager,int8,onnx] [--messages 2000]
+       python manage.py benchmark_inference --scaling 1,2,4,8
+
+Each backend runs in its own fresh process, so resident memory is not
+shared between them. Reports load time, messages per second, memory and
+the score difference from eager fp32.
+
+--scaling instead measures the multi-process worker pool (see
+dashboard.inference_pool) at each worker count: throughput, speedup over
+the first count, and the workers' summed RSS and PSS. PSS splits shared
+pages between the processes mapping them, so with shared weights it grows
+much more slowly than RSS.
+"""
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import inference
+from dashboard.inference_pool import benchmark_scaling
+from dashboard.models import LogEntry
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and memory of the model inference backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends',
+            default=','.join(inference.BACKENDS),
+            help='Comma-separated backends to run',
+        )
+        parser.add_argument('--messages', type=int, default=2000, help='Messages scored per run')
+        parser.add_argument('--batch-size', type=int, default=inference.BATCH_SIZE, help='Messages per forward pass')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per backend (best is reported)')
+        parser.add_argument('--export-dir', help='Where the exported graphs are (default: MODEL_EXPORT_DIR)')
+        parser.add_argument(
+            '--scaling',
+            metavar='COUNTS',
+            help='Benchmark the worker pool at these comma-separated worker counts (e.g. 1,2,4,8)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            help='Intra-op threads per pool worker (default: cores / workers)',
+        )
+
+    def handle(self, *args, **options):
+        if options['scaling']:
+            try:
+                counts = [int(count) for count in options['scaling'].split(',')]
+            except ValueError:
+                raise CommandError('--scaling takes comma-separated worker counts')
+            self.benchmark_scaling(counts, self.load_messages(options['messages']), options)
+            return
+
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = set(backends) - set(inference.BACKENDS)
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(sorted(unknown))}")
+        # eager first: it is the reference for the others' scores
+        backends.sort(key=lambda name: name != 'eager')
+
+        messages = self.load_messages(options['messages'])
+
+        self.stdout.write(self.style.SUCCESS('=== Inference Backend Benchmark ==='))
+        self.stdout.write(
+            f"Messages: {len(messages):,}  Batch size: {options['batch_size']}  Runs: {options['repeat']}"
+        )
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'backend':<13}{'load s':>8}{'msg/s':>10}{'model MB':>10}{'RSS MB':>9}{'max |Δ|':>11}{'flipped':>9}"
+        )
+
+        reference = None
+        for name in backends:
+            # A new process per backend: nothing loaded by the previous one counts
+            result = inference.benchmark_in_subprocess(
+                name, messages, options['batch_size'], options['repeat'], options['export_dir'],
+            )
+
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f"{name:<13}{result['error']}"))
+                continue
+
+            if name == 'eager':
+                reference = result['scores']
+            if reference is not None:
+                check = inference.parity(reference, result['scores'])
+                diff = f"{check['max_abs_diff']:>11.6f}{check['flipped']:>9}"
+            else:
+                diff = f"{'-':>11}{'-':>9}"
+            self.stdout.write(
+                f"{name:<13}{result['load_seconds']:>8.2f}{result['messages_per_second']:>10.1f}"
+                f"{result['model_rss_mb']:>10.1f}{result['rss_mb']:>9.1f}{diff}"
+            )
+
+        if reference is None:
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING(
+                'No eager fp32 scores to compare with: add eager to --backends, or see its error above'
+            ))
+
+    def load_messages(self, count):
+        """``count`` recent log messages (repeated if there are fewer)"""
+        messages = list(
+            LogEntry.objects.order_by('-id').values_list('log_message', flat=True)[:count]
+        ) or inference.TRACE_MESSAGES
+        return list(islice(cycle(messages), count))
+
+    def benchmark_scaling(self, counts, messages, options):
+        self.stdout.write(self.style.SUCCESS('=== Inference Worker Pool Scaling ==='))
+        self.stdout.write(f"Messages: {len(messages):,}  Batch size: {options['batch_size']}  Runs: {options['repeat']}")
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'workers':>8}{'threads':>9}{'msg/s':>10}{'speedup':>9}{'batch':>7}{'RSS MB':>10}{'PSS MB':>10}"
+        )
+
+        base = None
+        for workers in counts:
+            try:
+                result = benchmark_scaling(
+                    workers, messages, options['batch_size'], options['repeat'], options['threads'],
+                    options['export_dir'],
+                )
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{workers:>8}  {type(e).__name__}: {e}'))
+                continue
+            base = base or result['messages_per_second']
+            self.stdout.write(
+                f"{workers:>8}{result['threads_per_worker']:>9}{result['messages_per_second']:>10.1f}"
+                f"{result['messages_per_second'] / base:>8.2f}x{result['mean_batch_size']:>7.1f}"
+                f"{result['rss_mb']:>10.1f}{result['pss_mb']:>10.1f}"
+            )
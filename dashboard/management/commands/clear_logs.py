@@ -1,13 +1,19 @@
 """
 Django management command to clear log data while preserving user accounts
-Usage: python manage.py clear_logs
+Usage: python manage.py clear_logs [--before DATE] [--after DATE] [--source SOURCE] [--host-ip IP]
+
+Without filters everything is removed, including the cold archive. With
+filters only matching rows in the main tables are deleted.
 """
-from django.core.management.base import BaseCommand
-from dashboard.models import LogEntry, Anomaly
+from django.core.management.base import BaseCommand, CommandError
+from dashboard.archive import clear_archive
+from dashboard.models import Anomaly, LogRollup, DataCounter, ArchiveSegment
+from dashboard.purge import DEFAULT_CHUNK_SIZE, purge_logs, purge_queryset
+from dashboard.utils import parse_filter_datetime
 from authentication.models import AdminUser
 
 class Command(BaseCommand):
-    help = 'Clear all LogEntry and Anomaly records while preserving user accounts'
+    help = 'Clear LogEntry and Anomaly records (all, or by time range/source) while preserving user accounts'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -15,41 +21,96 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip confirmation prompt',
         )
+        parser.add_argument(
+            '--after',
+            help='Only delete logs with a timestamp at or after this date/datetime',
+        )
+        parser.add_argument(
+            '--before',
+            help='Only delete logs with a timestamp before this date/datetime',
+        )
+        parser.add_argument(
+            '--source',
+            help='Only delete logs from this source',
+        )
+        parser.add_argument(
+            '--host-ip',
+            help='Only delete logs from this host',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Logs deleted per transaction',
+        )
 
     def handle(self, *args, **options):
+        filters = {
+            'start': self.parse_date(options['after'], '--after'),
+            'end': self.parse_date(options['before'], '--before'),
+            'source': options['source'],
+            'host_ip': options['host_ip'],
+        }
+        partial = any(filters.values())
+
         # Count records
-        log_count = LogEntry.objects.count()
-        anomaly_count = Anomaly.objects.count()
+        log_count = purge_queryset(**filters).count()
+        anomaly_count = Anomaly.objects.filter(log_entry__in=purge_queryset(**filters)).count()
+        archived_count = 0 if partial else sum(ArchiveSegment.objects.values_list('log_count', flat=True))
         user_count = AdminUser.objects.count()
-        
+
         self.stdout.write(self.style.WARNING('📊 Current Database Status:'))
-        self.stdout.write(f'  - LogEntry records: {log_count}')
-        self.stdout.write(f'  - Anomaly records: {anomaly_count}')
+        self.stdout.write(f'  - LogEntry records{" matching filters" if partial else ""}: {log_count}')
+        self.stdout.write(f'  - Anomaly records{" matching filters" if partial else ""}: {anomaly_count}')
+        if not partial:
+            self.stdout.write(f'  - Archived LogEntry records: {archived_count}')
         self.stdout.write(f'  - User accounts: {user_count} (will be preserved)')
         self.stdout.write('')
-        
-        if log_count == 0 and anomaly_count == 0:
-            self.stdout.write(self.style.SUCCESS('✅ Database is already clean!'))
+
+        if log_count == 0 and anomaly_count == 0 and archived_count == 0:
+            self.stdout.write(self.style.SUCCESS('✅ Nothing to delete!' if partial else '✅ Database is already clean!'))
             return
-        
+
         # Confirmation
         if not options['yes']:
-            self.stdout.write(self.style.WARNING('⚠️  This will DELETE all log and anomaly records!'))
+            target = 'matching' if partial else 'all'
+            self.stdout.write(self.style.WARNING(f'⚠️  This will DELETE {target} log and anomaly records!'))
             confirm = input('Are you sure you want to continue? (yes/no): ')
             if confirm.lower() != 'yes':
                 self.stdout.write(self.style.ERROR('❌ Operation cancelled'))
                 return
-        
-        # Delete records
+
+        # Delete records in chunks; a full clear resets the aggregates instead
+        # of decrementing them
         self.stdout.write('🗑️  Deleting records...')
-        
-        deleted_anomalies = Anomaly.objects.all().delete()[0]
-        deleted_logs = LogEntry.objects.all().delete()[0]
-        
+
+        def report(logs, anomalies):
+            self.stdout.write(f'  - {logs}/{log_count} logs, {anomalies} anomalies deleted')
+
+        deleted = purge_logs(
+            chunk_size=options['chunk_size'], update_aggregates=partial, progress=report, **filters
+        )
+        deleted_archived = 0
+        if not partial:
+            LogRollup.objects.all().delete()
+            DataCounter.objects.all().delete()
+            deleted_archived = clear_archive()
+
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS('✅ Database cleared successfully!'))
-        self.stdout.write(f'  - Deleted {deleted_logs} LogEntry records')
-        self.stdout.write(f'  - Deleted {deleted_anomalies} Anomaly records')
+        self.stdout.write(f"  - Deleted {deleted['logs']} LogEntry records")
+        self.stdout.write(f"  - Deleted {deleted['anomalies']} Anomaly records")
+        if not partial:
+            self.stdout.write(f'  - Deleted {deleted_archived} archived LogEntry records')
         self.stdout.write(f'  - Preserved {user_count} user account(s)')
-        self.stdout.write('')
-        self.stdout.write(self.style.SUCCESS('🎯 Ready for fresh demo data!'))
+        if not partial:
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS('🎯 Ready for fresh demo data!'))
+
+    def parse_date(self, value, option):
+        if value is None:
+            return None
+        parsed = parse_filter_datetime(value)
+        if parsed is None:
+            raise CommandError(f'{option} expects a date or datetime, e.g. 2024-01-31 or 2024-01-31T12:00')
+        return parsed
@@ -0,0 +1,82 @@
+"""
+Django management command to export the log model for the faster inference backends
+Usage: python manage.py export_model [--format all] [--output-dir model_exports]
+
+Traces the fp32 model once, writes the graphs, then checks each export
+against eager fp32 on a held-out sample of recent log messages. Select
+the export with MODEL_BACKEND=torchscript or MODEL_BACKEND=onnx.
+``--format weights`` writes the memory-mappable weights the worker pool
+(MODEL_INFERENCE_WORKERS) shares between its processes.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import inference
+
+
+class Command(BaseCommand):
+    help = 'Export the log model to TorchScript/ONNX/mmap weights and check parity with fp32'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=inference.EXPORT_FORMATS + ('weights', 'all'),
+            default='all',
+            help='Format to write',
+        )
+        parser.add_argument('--output-dir', help='Directory for the exports (default: MODEL_EXPORT_DIR)')
+        parser.add_argument('--opset', type=int, default=17, help='ONNX opset version')
+        parser.add_argument(
+            '--parity-sample',
+            type=int,
+            default=200,
+            help='Held-out messages to compare against fp32 (0 skips the check)',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.01,
+            help='Largest score difference from fp32 that passes',
+        )
+
+    def handle(self, *args, **options):
+        formats = inference.EXPORT_FORMATS + ('weights',) if options['format'] == 'all' else (options['format'],)
+        export_dir = options['output_dir']
+
+        try:
+            tokenizer = inference.load_tokenizer()
+            model = inference.load_fp32_model()
+            paths = inference.export_model(model, tokenizer, formats, export_dir, opset=options['opset'])
+        except ImportError as e:
+            raise CommandError(f'Model dependencies are missing: {e}')
+        except FileNotFoundError as e:
+            raise CommandError(f'Model files not found: {e}')
+
+        for name, path in paths.items():
+            self.stdout.write(self.style.SUCCESS(f'✅ {name}: {path}'))
+
+        if options['parity_sample']:
+            if not self.check_parity(model, tokenizer, paths, export_dir, options):
+                raise CommandError('Exported scores differ from fp32 beyond the tolerance')
+
+    def check_parity(self, model, tokenizer, paths, export_dir, options):
+        messages = inference.holdout_messages(options['parity_sample'])
+        if not messages:
+            self.stdout.write(self.style.WARNING('⚠️ No log messages to check parity with; skipped'))
+            return True
+
+        reference = inference.predict(inference.load_backend('eager', model), tokenizer, messages)
+        self.stdout.write('')
+        self.stdout.write(f'Parity with fp32 on {len(messages)} held-out messages (tolerance {options["tolerance"]}):')
+        passed = True
+        for name in paths:
+            if name == 'weights':
+                continue  # the same tensors as fp32
+            backend = inference.load_backend(name, export_dir=export_dir)
+            result = inference.parity(reference, inference.predict(backend, tokenizer, messages), options['tolerance'])
+            line = (
+                f"  {name:<12} max |Δ| {result['max_abs_diff']:.6f}  mean |Δ| {result['mean_abs_diff']:.6f}  "
+                f"flipped {result['flipped']}"
+            )
+            self.stdout.write(self.style.SUCCESS(f'✅{line}') if result['ok'] else self.style.ERROR(f'❌{line}'))
+            passed = passed and result['ok']
+        return passed
@@ -0,0 +1,117 @@
+"""
+Django management command to generate a large synthetic dataset for scale testing
+Usage: python manage.py generate_synthetic_data --logs 10000000 --workers 4 [--seed 42]
+
+The same seed, --end and options always produce the same rows, so large
+fixtures for benchmarks can be rebuilt on demand. --end defaults to now,
+so the window moves between runs; the command prints the --end it used to
+rebuild the same dataset later. Use clear_logs first for an empty database.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.synthetic import DEFAULT_CONFIG, build_config, generate, parse_weights
+from dashboard.utils import parse_filter_datetime
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate realistic LogEntry/Anomaly/Alert/SystemMetric rows for scale testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logs', type=int, default=DEFAULT_CONFIG['logs'], help='Log entries to generate')
+        parser.add_argument('--metrics', type=int, help='SystemMetric samples to generate (default: logs / 20)')
+        parser.add_argument('--days', type=int, default=DEFAULT_CONFIG['days'], help='Days of history to cover')
+        parser.add_argument('--end', help='End of the generated window (default: now; pass it with --seed to reproduce a dataset)')
+        parser.add_argument('--hosts', type=int, default=DEFAULT_CONFIG['hosts'], help='Distinct host addresses')
+        parser.add_argument(
+            '--host-skew', type=float, default=DEFAULT_CONFIG['host_skew'],
+            help='Zipf exponent of the host distribution (0 = uniform)',
+        )
+        parser.add_argument('--sources', help='Source weights, e.g. "apache:4,linux:3,firewall:2"')
+        parser.add_argument('--log-types', help='Log type weights, e.g. "INFO:70,WARNING:15,ERROR:10,DEBUG:5"')
+        parser.add_argument(
+            '--peak-hour', type=int, default=DEFAULT_CONFIG['peak_hour'], help='UTC hour of peak traffic',
+        )
+        parser.add_argument(
+            '--diurnal-amplitude', type=float, default=DEFAULT_CONFIG['diurnal_amplitude'],
+            help='Strength of the daily traffic curve (0 = flat, 1 = silent at night)',
+        )
+        parser.add_argument(
+            '--weekend-factor', type=float, default=DEFAULT_CONFIG['weekend_factor'],
+            help='Weekend traffic relative to weekdays',
+        )
+        parser.add_argument(
+            '--anomaly-rate', type=float, default=DEFAULT_CONFIG['anomaly_rate'],
+            help='Share of normal logs flagged as anomalies',
+        )
+        parser.add_argument(
+            '--score-alpha', type=float, default=DEFAULT_CONFIG['score_alpha'],
+            help='Beta distribution alpha for anomaly scores above the threshold',
+        )
+        parser.add_argument(
+            '--score-beta', type=float, default=DEFAULT_CONFIG['score_beta'],
+            help='Beta distribution beta for anomaly scores above the threshold',
+        )
+        parser.add_argument('--bursts', type=int, default=DEFAULT_CONFIG['bursts'], help='Anomaly bursts (one alert each)')
+        parser.add_argument(
+            '--burst-share', type=float, default=DEFAULT_CONFIG['burst_share'],
+            help='Share of all logs that belong to bursts',
+        )
+        parser.add_argument('--schools', type=int, default=DEFAULT_CONFIG['schools'], help='Schools reporting metrics')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_CONFIG['batch_size'], help='Rows inserted per transaction',
+        )
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes')
+        parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG['seed'], help='Random seed (reproducible only together with a fixed --end)')
+
+    def handle(self, *args, **options):
+        try:
+            config = build_config(
+                logs=options['logs'], metrics=options['metrics'], days=options['days'],
+                end=self.parse_end(options['end']), hosts=options['hosts'], host_skew=options['host_skew'],
+                sources=parse_weights(options['sources']) if options['sources'] else None,
+                log_types=parse_weights(options['log_types']) if options['log_types'] else None,
+                peak_hour=options['peak_hour'], diurnal_amplitude=options['diurnal_amplitude'],
+                weekend_factor=options['weekend_factor'], anomaly_rate=options['anomaly_rate'],
+                score_alpha=options['score_alpha'], score_beta=options['score_beta'],
+                bursts=options['bursts'], burst_share=options['burst_share'], schools=options['schools'],
+                batch_size=options['batch_size'], seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        if config['logs'] < 0 or config['metrics'] < 0 or config['days'] < 1 or config['hosts'] < 1:
+            raise CommandError('--logs/--metrics must be >= 0 and --days/--hosts >= 1')
+
+        self.stdout.write(
+            f"🏭 Generating {config['logs']:,} logs and {config['metrics']:,} metrics over {config['days']} days "
+            f"with {options['workers']} worker(s), seed {config['seed']}, --end {config['end'].isoformat()}..."
+        )
+
+        def report(totals, elapsed):
+            rows = totals['logs'] + totals['anomalies'] + totals['metrics']
+            self.stdout.write(
+                f"  - {totals['logs']:,}/{config['logs']:,} logs, {totals['anomalies']:,} anomalies, "
+                f"{totals['metrics']:,}/{config['metrics']:,} metrics ({rows / elapsed if elapsed else 0:,.0f} rows/s)"
+            )
+
+        start = time.perf_counter()
+        totals = generate(config, workers=options['workers'], progress=report)
+        elapsed = time.perf_counter() - start
+
+        rows = sum(totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Wrote {rows:,} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
+        self.stdout.write(f"  - LogEntry: {totals['logs']:,}")
+        self.stdout.write(f"  - Anomaly: {totals['anomalies']:,}")
+        self.stdout.write(f"  - Alert: {totals['alerts']:,}")
+        self.stdout.write(f"  - SystemMetric: {totals['metrics']:,}")
+
+    def parse_end(self, value):
+        if value is None:
+            return None
+        parsed = parse_filter_datetime(value)
+        if parsed is None:
+            raise CommandError('--end expects a date or datetime, e.g. 2024-01-31 or 2024-01-31T12:00')
+        return parsed
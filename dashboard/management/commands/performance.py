@@ -4,6 +4,7 @@ from django.db import connection
 from django.utils import timezone
 from datetime import timedelta
 from dashboard.models import LogEntry, Anomaly
+from dashboard.counters import get_counters
 
 
 class Command(BaseCommand):
@@ -49,8 +50,9 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('=== Performance Analysis ==='))
         
         # Database stats
-        total_logs = LogEntry.objects.count()
-        total_anomalies = Anomaly.objects.count()
+        counters = get_counters()
+        total_logs = counters['total_logs']
+        total_anomalies = counters['total_anomalies']
         
         self.stdout.write(f"📊 Database Records:")
         self.stdout.write(f"   • Log Entries: {total_logs:,}")
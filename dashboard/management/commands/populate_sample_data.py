@@ -2,7 +2,9 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 import random
-from dashboard.models import LogEntry, Anomaly, SystemStatus, PlatformSettings
+from dashboard.archive import clear_archive
+from dashboard.purge import purge_logs
+from dashboard.models import LogEntry, Anomaly, SystemStatus, PlatformSettings, LogRollup, DataCounter
 from authentication.models import AdminUser
 
 
@@ -24,8 +26,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         if options['clear']:
             self.stdout.write('Clearing existing data...')
-            LogEntry.objects.all().delete()
-            Anomaly.objects.all().delete()
+            purge_logs(update_aggregates=False)
+            LogRollup.objects.all().delete()
+            DataCounter.objects.all().delete()
+            clear_archive()
             SystemStatus.objects.all().delete()
             PlatformSettings.objects.all().delete()
 
@@ -0,0 +1,46 @@
+"""
+Django management command to publish dashboard changes to WebSocket subscribers
+Usage: python manage.py publish_dashboard_events [--once] [--interval 1.0]
+
+Run exactly one of these per deployment when CHANNEL_LAYERS uses Redis;
+every connected dashboard receives each anomaly from it once.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.broadcast import run_publisher
+
+
+class Command(BaseCommand):
+    help = 'Publish new anomalies and stats changes to the dashboard channel-layer group'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Publish pending changes once, then exit',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=getattr(settings, 'DASHBOARD_STREAM_POLL_INTERVAL', 1.0),
+            help='Seconds between checks for changes',
+        )
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            raise CommandError('CHANNEL_LAYERS is not configured')
+        if isinstance(channel_layer, InMemoryChannelLayer):
+            self.stdout.write(self.style.WARNING(
+                '⚠️  The in-memory channel layer does not reach other processes; '
+                'set CHANNEL_REDIS_URL so the web server receives these messages'
+            ))
+
+        self.stdout.write(f'📡 Publishing dashboard events every {options["interval"]}s...')
+        try:
+            async_to_sync(run_publisher)(channel_layer, interval=options['interval'], once=options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('✅ Publisher stopped'))
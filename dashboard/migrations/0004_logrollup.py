@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_add_performance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('log_type', models.CharField(blank=True, max_length=50)),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('host_ip', models.CharField(max_length=45)),
+                ('log_count', models.IntegerField(default=0)),
+                ('anomaly_count', models.IntegerField(default=0)),
+                ('anomaly_score_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'verbose_name_plural': 'Log Rollups',
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'bucket', 'log_type', 'source', 'host_ip'), name='dashboard_logrollup_unique_key')],
+            },
+        ),
+    ]
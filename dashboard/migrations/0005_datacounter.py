@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def seed_counters(apps, schema_editor):
+    """Start the counters from the existing rows"""
+    LogEntry = apps.get_model('dashboard', 'LogEntry')
+    Anomaly = apps.get_model('dashboard', 'Anomaly')
+    DataCounter = apps.get_model('dashboard', 'DataCounter')
+
+    values = {
+        'logs': LogEntry.objects.count(),
+        'anomalies': Anomaly.objects.count(),
+        'anomalies_unacknowledged': Anomaly.objects.filter(acknowledged=False).count(),
+    }
+    for row in LogEntry.objects.values('log_type').annotate(count=Count('id')).order_by():
+        values['log_type:' + (row['log_type'] or '')] = row['count']
+
+    DataCounter.objects.bulk_create([
+        DataCounter(name=name, value=value) for name, value in values.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_logrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Data Counters',
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
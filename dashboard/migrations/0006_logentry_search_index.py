@@ -0,0 +1,102 @@
+from django.db import DatabaseError, migrations
+
+
+# External-content FTS5 tables over dashboard_logentry, kept in sync by
+# triggers so every insert path (including bulk_create) is indexed.
+# SQLite only, and only when it has FTS5 and the trigram tokenizer (SQLite
+# 3.34+); otherwise nothing is created and dashboard.search falls back to
+# LIKE queries. After upgrading SQLite, migrate back to 0005 and forward
+# again to build the index.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE dashboard_logentry_fts USING fts5(
+        log_message,
+        content='dashboard_logentry', content_rowid='id',
+        tokenize='unicode61'
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE dashboard_logentry_trigram USING fts5(
+        host_ip, source,
+        content='dashboard_logentry', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER dashboard_logentry_search_ai AFTER INSERT ON dashboard_logentry BEGIN
+        INSERT INTO dashboard_logentry_fts(rowid, log_message) VALUES (new.id, new.log_message);
+        INSERT INTO dashboard_logentry_trigram(rowid, host_ip, source) VALUES (new.id, new.host_ip, new.source);
+    END
+    """,
+    """
+    CREATE TRIGGER dashboard_logentry_search_ad AFTER DELETE ON dashboard_logentry BEGIN
+        INSERT INTO dashboard_logentry_fts(dashboard_logentry_fts, rowid, log_message)
+            VALUES ('delete', old.id, old.log_message);
+        INSERT INTO dashboard_logentry_trigram(dashboard_logentry_trigram, rowid, host_ip, source)
+            VALUES ('delete', old.id, old.host_ip, old.source);
+    END
+    """,
+    """
+    CREATE TRIGGER dashboard_logentry_search_au_message AFTER UPDATE OF log_message ON dashboard_logentry BEGIN
+        INSERT INTO dashboard_logentry_fts(dashboard_logentry_fts, rowid, log_message)
+            VALUES ('delete', old.id, old.log_message);
+        INSERT INTO dashboard_logentry_fts(rowid, log_message) VALUES (new.id, new.log_message);
+    END
+    """,
+    """
+    CREATE TRIGGER dashboard_logentry_search_au_host AFTER UPDATE OF host_ip, source ON dashboard_logentry BEGIN
+        INSERT INTO dashboard_logentry_trigram(dashboard_logentry_trigram, rowid, host_ip, source)
+            VALUES ('delete', old.id, old.host_ip, old.source);
+        INSERT INTO dashboard_logentry_trigram(rowid, host_ip, source) VALUES (new.id, new.host_ip, new.source);
+    END
+    """,
+    "INSERT INTO dashboard_logentry_fts(dashboard_logentry_fts) VALUES ('rebuild')",
+    "INSERT INTO dashboard_logentry_trigram(dashboard_logentry_trigram) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS dashboard_logentry_search_ai",
+    "DROP TRIGGER IF EXISTS dashboard_logentry_search_ad",
+    "DROP TRIGGER IF EXISTS dashboard_logentry_search_au_message",
+    "DROP TRIGGER IF EXISTS dashboard_logentry_search_au_host",
+    "DROP TABLE IF EXISTS dashboard_logentry_fts",
+    "DROP TABLE IF EXISTS dashboard_logentry_trigram",
+]
+
+
+def fts5_trigram_available(connection):
+    """Whether this SQLite build can create FTS5 tables with the trigram tokenizer"""
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_trigram_probe USING fts5(x, tokenize='trigram')")
+        except DatabaseError:
+            return False
+        cursor.execute("DROP TABLE temp.fts5_trigram_probe")
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    if not fts5_trigram_available(schema_editor.connection):
+        return
+    for sql in FORWARD_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in REVERSE_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0005_datacounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:42
+
+from django.db import migrations, models
+
+from dashboard.iputils import pack_ip
+
+
+def backfill_ip_numeric(apps, schema_editor):
+    """Pack host_ip for existing log entries and rollups, in batches"""
+    for model_name in ('LogEntry', 'LogRollup'):
+        model = apps.get_model('dashboard', model_name)
+        last_id = 0
+        while True:
+            batch = list(
+                model.objects.filter(id__gt=last_id).order_by('id').only('id', 'host_ip')[:5000]
+            )
+            if not batch:
+                break
+            for row in batch:
+                row.ip_numeric = pack_ip(row.host_ip)
+            model.objects.bulk_update(batch, ['ip_numeric'])
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_logentry_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='logentry',
+            name='ip_numeric',
+            field=models.BinaryField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='logrollup',
+            name='ip_numeric',
+            field=models.BinaryField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['ip_numeric', 'timestamp'], name='dashboard_l_ip_num_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logrollup',
+            index=models.Index(fields=['resolution', 'ip_numeric', 'bucket'], name='dashboard_r_ip_num_idx'),
+        ),
+        migrations.RunPython(backfill_ip_numeric, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.5 on 2026-10-17 03:50
+
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from dashboard.iputils import pack_ip
+
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+
+def truncate(value, resolution):
+    value = value.astimezone(dt_timezone.utc)
+    if resolution == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build the rollups from the logs written before LogRollup existed
+
+    0004 created the table empty, and only writes made after it are counted
+    incrementally, so every rollup is recomputed here from the historical
+    models, one week of logs at a time. Minute buckets older than
+    LOG_ROLLUP_MINUTE_RETENTION_DAYS are not written. Logs already moved
+    to archive segments are not read; rebuild_aggregates counts those.
+    """
+    LogEntry = apps.get_model('dashboard', 'LogEntry')
+    Anomaly = apps.get_model('dashboard', 'Anomaly')
+    LogRollup = apps.get_model('dashboard', 'LogRollup')
+
+    LogRollup.objects.all().delete()
+    first = LogEntry.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    last = LogEntry.objects.order_by('-timestamp').values_list('timestamp', flat=True).first()
+    if first is None:
+        return
+
+    days = getattr(settings, 'LOG_ROLLUP_MINUTE_RETENTION_DAYS', 7)
+    oldest_minute = truncate(timezone.now() - timedelta(days=days), 'hour')
+
+    # Windows start on a day boundary, so no bucket spans two windows
+    window_start = truncate(first, 'day')
+    while window_start <= last:
+        window_end = window_start + timedelta(days=7)
+        deltas = defaultdict(lambda: [0, 0, 0.0])
+
+        logs = LogEntry.objects.filter(
+            timestamp__gte=window_start, timestamp__lt=window_end
+        ).annotate(
+            minute=TruncMinute('timestamp', tzinfo=dt_timezone.utc)
+        ).values('minute', 'log_type', 'source', 'host_ip').annotate(count=Count('id')).order_by()
+        for row in logs:
+            for resolution in RESOLUTIONS:
+                key = (resolution, truncate(row['minute'], resolution),
+                       row['log_type'] or '', row['source'] or '', row['host_ip'] or '')
+                deltas[key][0] += row['count']
+
+        anomalies = Anomaly.objects.filter(
+            log_entry__timestamp__gte=window_start, log_entry__timestamp__lt=window_end
+        ).annotate(
+            minute=TruncMinute('log_entry__timestamp', tzinfo=dt_timezone.utc)
+        ).values(
+            'minute', 'log_entry__log_type', 'log_entry__source', 'log_entry__host_ip'
+        ).annotate(count=Count('id'), score_sum=Sum('anomaly_score')).order_by()
+        for row in anomalies:
+            for resolution in RESOLUTIONS:
+                key = (resolution, truncate(row['minute'], resolution),
+                       row['log_entry__log_type'] or '', row['log_entry__source'] or '',
+                       row['log_entry__host_ip'] or '')
+                deltas[key][1] += row['count']
+                deltas[key][2] += row['score_sum'] or 0.0
+
+        LogRollup.objects.bulk_create([
+            LogRollup(
+                resolution=resolution, bucket=bucket, log_type=log_type, source=source,
+                host_ip=host_ip, ip_numeric=pack_ip(host_ip),
+                log_count=log_count, anomaly_count=anomaly_count, anomaly_score_sum=score_sum,
+            )
+            for (resolution, bucket, log_type, source, host_ip), (log_count, anomaly_count, score_sum)
+            in deltas.items()
+            if resolution != 'minute' or bucket >= oldest_minute
+        ], batch_size=5000)
+        window_start = window_end
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_archivesegment'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
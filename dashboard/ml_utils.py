@@ -1,109 +1,224 @@
-import torch
-import pickle
+import atexit
+import os
 import threading
-from transformers import BertTokenizer
-from bert_pytorch.model.bert import BERTModel
+import time
+from django.conf import settings
+
+from . import inference
+from .batching import MicroBatcher
+from .inference_pool import InferencePool
+from .score_cache import ScoreCache
+
+
+# Load states (ModelManager.state)
+UNLOADED = 'unloaded'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
 
 
 class ModelManager:
-    """Singleton class to manage ML model loading and inference"""
+    """
+    Singleton class to manage ML model loading and inference
+
+    Nothing is loaded at construction: the first prediction (or
+    ``ensure_loaded``) loads the tokenizer and backend, and
+    ``load_in_background`` starts that early without blocking. Callers
+    that must not wait can check ``is_ready()`` first.
+    """
     _instance = None
     _lock = threading.Lock()
-    _model = None
-    _tokenizer = None
-    _vocab_size = None
     
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
                 if cls._instance is None:
-                    cls._instance = super().__new__(cls)
+                    instance = super().__new__(cls)
+                    instance._reset()
+                    cls._instance = instance
         return cls._instance
     
-    def __init__(self):
-        if self._model is None:
+    def _reset(self):
+        self._model = None
+        self._backend = None
+        self._tokenizer = None
+        self._pool = None
+        self._batcher = None
+        self._score_cache = None
+        self._load_lock = threading.Lock()
+        self._load_done = threading.Event()
+        self.state = UNLOADED
+        self.load_error = None
+        self.load_seconds = None
+    
+    def is_ready(self):
+        return self.state == READY
+    
+    def status(self):
+        """Readiness for health checks: state, backend, load time and error"""
+        return {
+            'state': self.state,
+            'backend': inference.get_backend_name(),
+            'workers': self.inference_workers(),
+            'load_seconds': self.load_seconds,
+            'error': str(self.load_error) if self.load_error else None,
+        }
+    
+    def ensure_loaded(self, timeout=None):
+        """Load now if nobody has started to (or wait for the load in progress); True when ready"""
+        if self.state == UNLOADED:
             self._load_model()
+        if self.state == LOADING:
+            self._load_done.wait(timeout)
+        return self.is_ready()
+    
+    def inference_workers(self):
+        """Worker processes for scoring (0: score in this process)"""
+        return getattr(settings, 'MODEL_INFERENCE_WORKERS', 0)
+    
+    def load_in_background(self):
+        """Start loading in a daemon thread and return at once"""
+        if self.state == UNLOADED:
+            threading.Thread(target=self._load_model, name='model-loader', daemon=True).start()
     
     def _load_model(self):
         """Load model and tokenizer once"""
+        with self._load_lock:
+            if self.state != UNLOADED:
+                return
+            self.state = LOADING
+        
+        backend = inference.get_backend_name()
+        workers = self.inference_workers()
+        started = time.monotonic()
         try:
-            # Model paths
-            MODEL_PATH = "../output/university_logs/bert/best_bert.pth"
-            VOCAB_PATH = "../output/university_logs/vocab.pkl"
-            
-            # Initialize BERT tokenizer
-            self._tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-            
-            # Load vocab
-            with open(VOCAB_PATH, "rb") as f:
-                vocab = pickle.load(f)
-            self._vocab_size = len(vocab)
-            
-            # Initialize BERT model
-            self._model = BERTModel(vocab_size=self._vocab_size)
-            
-            # Load trained weights
-            state_dict = torch.load(MODEL_PATH, map_location=torch.device('cpu'))
-            self._model.load_state_dict(state_dict)
-            self._model.eval()
+            if workers:
+                # Each worker loads its own tokenizer and maps the shared fp32 weights
+                backend = f'eager x{workers} workers'
+                self._pool = InferencePool(workers, getattr(settings, 'MODEL_INFERENCE_THREADS', None))
+            else:
+                self._tokenizer = inference.load_tokenizer()
+                
+                if backend in inference.EXPORT_FORMATS:
+                    # Exported graphs carry their own weights
+                    self._backend = inference.load_backend(backend)
+                else:
+                    self._model = inference.load_fp32_model()
+                    self._backend = inference.load_backend(backend, self._model)
+                    if backend != 'eager':
+                        # The quantized copy replaces it
+                        self._model = None
             
-            print("✅ ML Model loaded successfully")
+            self.load_seconds = time.monotonic() - started
+            self.state = READY
+            print(f"✅ ML Model loaded successfully ({backend} backend, {self.load_seconds:.1f}s)")
             
         except Exception as e:
-            print(f"❌ ML Model Load Error: {str(e)}")
+            print(f"❌ ML Model Load Error ({backend} backend): {str(e)}")
+            self.load_error = e
             self._model = None
+            self._backend = None
             self._tokenizer = None
+            self.state = FAILED
+        finally:
+            self._load_done.set()
     
     def get_model_components(self):
         """Get model and tokenizer"""
         return self._model, self._tokenizer
     
     def is_loaded(self):
-        """Check if model is loaded"""
-        return self._model is not None and self._tokenizer is not None
+        """Check if model is loaded (does not start loading)"""
+        return self.is_ready()
+    
+    def get_batcher(self):
+        """Shared micro-batcher that coalesces concurrent requests into forward passes"""
+        if self._batcher is None:
+            with self._lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(
+                        self._forward,
+                        max_batch_size=getattr(settings, 'MODEL_BATCH_MAX_SIZE', 32),
+                        max_wait=getattr(settings, 'MODEL_BATCH_MAX_WAIT_MS', 5) / 1000,
+                        name='model-batcher',
+                        # One scheduler per worker process keeps them all busy
+                        threads=max(1, self.inference_workers()),
+                    )
+        return self._batcher
+    
+    def batching_enabled(self):
+        return getattr(settings, 'MODEL_BATCHING_ENABLED', True)
+    
+    def submit(self, message):
+        """Queue one message for batched inference; returns a Future for its score"""
+        return self.get_batcher().submit(message)
+    
+    def batching_stats(self):
+        """Queue depth, batch-size histogram and latency percentiles"""
+        return self.get_batcher().stats()
+    
+    def get_score_cache(self):
+        """Template-keyed score cache in front of the model (None when disabled)"""
+        if self._score_cache is None and getattr(settings, 'MODEL_SCORE_CACHE_ENABLED', True):
+            with self._lock:
+                if self._score_cache is None:
+                    path = getattr(settings, 'MODEL_SCORE_CACHE_PATH', None)
+                    cache = ScoreCache(
+                        max_size=getattr(settings, 'MODEL_SCORE_CACHE_SIZE', 100000),
+                        path=path,
+                        model_key=self._model_key(),
+                        save_interval=getattr(settings, 'MODEL_SCORE_CACHE_SAVE_INTERVAL', 300),
+                    )
+                    if path:
+                        atexit.register(cache.save)
+                    self._score_cache = cache
+        return self._score_cache
+    
+    def _model_key(self):
+        """Identifies the weights, so a persisted score cache is dropped when they change"""
+        try:
+            path = inference.get_model_settings()['model_path']
+            return f'{os.path.abspath(path)}:{os.path.getmtime(path)}:{inference.get_backend_name()}'
+        except OSError:
+            return None
+    
+    def cache_stats(self):
+        cache = self.get_score_cache()
+        return cache.stats() if cache is not None else None
     
     def predict_batch(self, messages):
         """Predict anomaly scores for a batch of messages"""
-        if not self.is_loaded():
+        # The first call loads the model (or waits for a background load)
+        if not self.ensure_loaded():
             return [0.5] * len(messages)  # Default scores
         
         try:
-            scores = []
-            
-            # Process messages in batches for better performance
-            batch_size = 32
-            for i in range(0, len(messages), batch_size):
-                batch = messages[i:i + batch_size]
-                
-                # Tokenize batch
-                inputs = self._tokenizer(
-                    batch,
-                    return_tensors="pt",
-                    padding=True,
-                    truncation=True,
-                    max_length=512
-                )
-                
-                with torch.no_grad():
-                    outputs = self._model(
-                        input_ids=inputs['input_ids'],
-                        attention_mask=inputs['attention_mask']
-                    )
-                    
-                    # Convert model output to anomaly scores
-                    batch_scores = torch.sigmoid(outputs.logits[:, 0]).tolist()
-                    scores.extend(batch_scores)
-            
-            return scores
-            
+            cache = self.get_score_cache()
+            if cache is not None:
+                # Only templates not seen before reach the model
+                return cache.score(messages, self._predict_uncached)
+            return self._predict_uncached(messages)
         except Exception as e:
             print(f"Prediction error: {str(e)}")
-            return [0.5] * len(messages)  # Default scores
+            return [0.5] * len(messages)  # Default scores, never cached
+    
+    def _predict_uncached(self, messages):
+        if self.batching_enabled():
+            # Joins forward passes with concurrent callers
+            return self.get_batcher().map(messages)
+        return self._forward(messages)
+    
+    def _forward(self, messages):
+        """Run the backend over ``messages`` (chunks of 32 per forward pass)"""
+        if self._pool is not None:
+            return self._pool.predict_batch(messages)
+        return inference.predict(self._backend, self._tokenizer, messages)
     
     def predict_single(self, message):
         """Predict anomaly score for a single message"""
+        # Same path as any other caller: score cache, then the shared batcher
         return self.predict_batch([message])[0]
 
 
-# Global instance
+# Global instance; importing this module loads nothing
 model_manager = ModelManager()
@@ -1,11 +1,14 @@
 from django.db import models
 from django.utils import timezone
 
+from .iputils import pack_ip
+
 
 class LogEntry(models.Model):
     """Model for storing log entries from Kafka"""
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     host_ip = models.CharField(max_length=45, db_index=True)  # IPv6 compatible
+    ip_numeric = models.BinaryField(max_length=16, null=True, blank=True, editable=False)  # Packed host_ip (see iputils)
     log_message = models.TextField()
     source = models.CharField(max_length=100, blank=True, db_index=True)
     log_type = models.CharField(max_length=50, blank=True, db_index=True)
@@ -19,10 +22,18 @@ class LogEntry(models.Model):
             models.Index(fields=['host_ip', 'timestamp']),
             models.Index(fields=['source', 'timestamp']),
             models.Index(fields=['log_type', 'timestamp']),
+            models.Index(fields=['ip_numeric', 'timestamp'], name='dashboard_l_ip_num_ts_idx'),
         ]
     
     def __str__(self):
         return f"{self.timestamp} - {self.host_ip}"
+    
+    def save(self, *args, **kwargs):
+        self.ip_numeric = pack_ip(self.host_ip)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'host_ip' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'ip_numeric'}
+        super().save(*args, **kwargs)
 
 
 class Anomaly(models.Model):
@@ -45,6 +56,14 @@ class Anomaly(models.Model):
     
     def __str__(self):
         return f"Anomaly {self.id} - Score: {self.anomaly_score}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored value so saves can tell when it is acknowledged
+        if 'acknowledged' in field_names:
+            instance._loaded_acknowledged = instance.acknowledged
+        return instance
 
 
 class SystemStatus(models.Model):
@@ -74,3 +93,79 @@ class PlatformSettings(models.Model):
     
     def __str__(self):
         return f"Settings updated at {self.updated_at}"
+
+
+class LogRollup(models.Model):
+    """Pre-aggregated log and anomaly counts per time bucket.
+
+    Maintained incrementally at ingestion time (see dashboard.rollups) at
+    minute, hour and day resolution so charts never rescan LogEntry.
+    """
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()  # Start of the bucket (UTC)
+    log_type = models.CharField(max_length=50, blank=True)
+    source = models.CharField(max_length=100, blank=True)
+    host_ip = models.CharField(max_length=45)
+    ip_numeric = models.BinaryField(max_length=16, null=True, blank=True, editable=False)
+    log_count = models.IntegerField(default=0)
+    anomaly_count = models.IntegerField(default=0)
+    anomaly_score_sum = models.FloatField(default=0.0)
+    
+    class Meta:
+        verbose_name_plural = 'Log Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['resolution', 'bucket', 'log_type', 'source', 'host_ip'],
+                name='dashboard_logrollup_unique_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'ip_numeric', 'bucket'], name='dashboard_r_ip_num_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.resolution} {self.bucket} - {self.host_ip}: {self.log_count}"
+
+
+class DataCounter(models.Model):
+    """Running totals kept in step with LogEntry/Anomaly writes.
+
+    Maintained transactionally by dashboard.counters so count views read a
+    handful of rows instead of scanning the log tables.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name_plural = 'Data Counters'
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class ArchiveSegment(models.Model):
+    """One month of LogEntry/Anomaly rows moved to cold storage.
+
+    Each segment is a separate SQLite file written by dashboard.archive;
+    this row is its catalogue entry, used to pick the segments a date
+    range needs without opening every file.
+    """
+    month = models.DateField(unique=True)  # First day of the month (UTC)
+    log_count = models.IntegerField(default=0)
+    anomaly_count = models.IntegerField(default=0)
+    first_timestamp = models.DateTimeField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-month']
+        verbose_name_plural = 'Archive Segments'
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.log_count} logs"
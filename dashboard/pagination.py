@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for newest-first lists.
+
+Pages are ordered by ``(<field> DESC, id DESC)`` and a cursor records the
+key of the row at the edge of the current page. The next page is the rows
+strictly after that key, so every page is one indexed range scan of
+``page_size + 1`` rows no matter how deep it is; there is no ``COUNT(*)``
+and no ``OFFSET``. Callers supply an estimated total if they want one.
+
+The "after the key" test is ``field < v OR (field = v AND id < pk)``,
+which no index can seek on by itself, so it is ANDed with the redundant
+bound ``field <= v``: the planner starts the scan at ``v`` on the
+``field`` index and only checks the OR on the rows it reads.
+
+Several querysets (e.g. the main table and cold archive segments) can be
+paginated as one list: each contributes its own ``page_size + 1`` rows
+and the results are merged.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    """The cursor could not be decoded."""
+
+
+def encode_cursor(value, pk, direction):
+    """Opaque cursor for the row ``(value, pk)``; direction is 'next' or 'prev'"""
+    payload = json.dumps({'v': value.isoformat(), 'id': pk, 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(value, pk, direction)`` for a cursor from ``encode_cursor``"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = parse_datetime(payload['v'])
+        pk = int(payload['id'])
+        direction = payload['d']
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor('Invalid cursor')
+    if value is None or direction not in ('next', 'prev'):
+        raise InvalidCursor('Invalid cursor')
+    return value, pk, direction
+
+
+class CursorPage:
+    """One page of results; iterable like a Django ``Page``"""
+
+    def __init__(self, items, field, has_next, has_previous, estimated_total=None):
+        self.object_list = items
+        self.field = field
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+        self.estimated_total = estimated_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    def _cursor(self, item, direction):
+        return encode_cursor(getattr(item, self.field), item.pk, direction)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page or not self.object_list:
+            return None
+        return self._cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page or not self.object_list:
+            return None
+        return self._cursor(self.object_list[0], 'prev')
+
+
+def _fetch(querysets, field, condition, descending, limit):
+    """First ``limit`` rows across ``querysets`` in key order"""
+    ordering = (f'-{field}', '-pk') if descending else (field, 'pk')
+    rows = []
+    for queryset in querysets:
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        rows.extend(queryset.order_by(*ordering)[:limit])
+    if len(querysets) == 1:
+        return rows
+
+    rows.sort(key=lambda row: (getattr(row, field), row.pk), reverse=descending)
+    # A row can briefly exist in two sources (e.g. mid-archive); keep one
+    seen = set()
+    unique = []
+    for row in rows:
+        if row.pk not in seen:
+            seen.add(row.pk)
+            unique.append(row)
+    return unique[:limit]
+
+
+def paginate_by_cursor(queryset, field, cursor=None, page_size=50, estimated_total=None):
+    """
+    Return a ``CursorPage`` of ``queryset`` ordered newest first by ``field``.
+
+    ``queryset`` may also be a list of querysets, paginated as one.
+    ``cursor`` is a value from ``next_cursor``/``previous_cursor`` (or None
+    for the first page). Raises ``InvalidCursor`` for malformed cursors.
+    """
+    page_size = max(1, page_size)
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+
+    if not cursor:
+        rows = _fetch(querysets, field, None, True, page_size + 1)
+        return CursorPage(rows[:page_size], field, len(rows) > page_size, False, estimated_total)
+
+    value, pk, direction = decode_cursor(cursor)
+    if direction == 'next':
+        after = Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+        rows = _fetch(querysets, field, after, True, page_size + 1)
+        return CursorPage(rows[:page_size], field, len(rows) > page_size, True, estimated_total)
+
+    before = Q(**{f'{field}__gte': value}) & (Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+    rows = _fetch(querysets, field, before, False, page_size + 1)
+    has_previous = len(rows) > page_size
+    rows = rows[:page_size]
+    rows.reverse()
+    return CursorPage(rows, field, True, has_previous, estimated_total)
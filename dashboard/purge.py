@@ -0,0 +1,98 @@
+"""
+Bulk purge of LogEntry/Anomaly rows.
+
+``QuerySet.delete()`` loads every row to run cascades and sends
+post_delete for each one (updating rollups, counters and the cache
+version row by row). ``purge_logs`` instead walks the matching logs in
+primary-key chunks and deletes each chunk with raw SQL, anomalies first,
+in its own short transaction. Rollups and counters are adjusted once per
+chunk; rollup rows left empty are deleted at the end, also in id chunks,
+and the caches are invalidated once.
+"""
+from django.db import transaction
+
+from .archive import raw_delete
+from .counters import count_anomalies, count_logs
+from .models import LogEntry, Anomaly, LogRollup
+from .rollups import record_anomalies, record_logs
+from .utils import invalidate_log_caches
+
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def purge_queryset(start=None, end=None, source=None, host_ip=None):
+    """LogEntry rows matched by the purge filters (timestamps are ``[start, end)``)"""
+    logs = LogEntry.objects.all()
+    if start:
+        logs = logs.filter(timestamp__gte=start)
+    if end:
+        logs = logs.filter(timestamp__lt=end)
+    if source:
+        logs = logs.filter(source=source)
+    if host_ip:
+        logs = logs.filter(host_ip=host_ip)
+    return logs
+
+
+def delete_empty_rollups(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Delete rollup rows whose counts reached zero, ``chunk_size`` ids per transaction"""
+    deleted = 0
+    last_id = 0
+    empty = LogRollup.objects.filter(log_count=0, anomaly_count=0)
+    while True:
+        ids = list(empty.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        last_id = ids[-1]
+        with transaction.atomic():
+            deleted += raw_delete(LogRollup, 'id', ids)
+
+
+def purge_logs(start=None, end=None, source=None, host_ip=None,
+               chunk_size=DEFAULT_CHUNK_SIZE, update_aggregates=True, progress=None):
+    """
+    Delete matching logs and their anomalies in primary-key chunks.
+
+    With ``update_aggregates`` the rollups and counters are decremented
+    for each chunk; callers that reset those tables themselves (a full
+    clear) pass False. ``progress(logs, anomalies)`` is called with the
+    running totals after every chunk. Returns ``{'logs': n, 'anomalies': n}``.
+    """
+    logs = purge_queryset(start, end, source, host_ip)
+    totals = {'logs': 0, 'anomalies': 0}
+    last_id = 0
+
+    while True:
+        ids = list(logs.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        with transaction.atomic():
+            if update_aggregates:
+                entries = list(LogEntry.objects.filter(id__in=ids).only(
+                    'timestamp', 'log_type', 'source', 'host_ip'
+                ))
+                entries_by_id = {entry.id: entry for entry in entries}
+                anomalies = list(Anomaly.objects.filter(log_entry_id__in=ids).only(
+                    'log_entry', 'anomaly_score', 'acknowledged'
+                ))
+                for anomaly in anomalies:
+                    anomaly.log_entry = entries_by_id[anomaly.log_entry_id]
+                record_anomalies(anomalies, sign=-1)
+                count_anomalies(anomalies, sign=-1)
+                record_logs(entries, sign=-1)
+                count_logs(entries, sign=-1)
+
+            totals['anomalies'] += raw_delete(Anomaly, 'log_entry_id', ids)
+            totals['logs'] += raw_delete(LogEntry, 'id', ids)
+
+        if progress:
+            progress(totals['logs'], totals['anomalies'])
+
+    if update_aggregates and totals['logs']:
+        delete_empty_rollups(chunk_size)
+    if totals['logs']:
+        invalidate_log_caches()
+    return totals
@@ -0,0 +1,228 @@
+"""
+Multi-resolution rollups of LogEntry/Anomaly counts.
+
+LogRollup holds one row per (resolution, bucket, log_type, source,
+host_ip) with the number of logs, the number of anomalies and the sum of
+their scores. Writers call ``record_logs`` / ``record_anomalies`` in the
+same transaction as the raw insert; each call folds its rows into deltas
+in Python and applies them with one ``INSERT ... ON CONFLICT DO UPDATE``
+per distinct key, so concurrent writers never lose increments.
+
+Readers use ``rollup_queryset`` over a time window. The window is widened
+to whole buckets of the chosen resolution.
+
+Minute buckets are only kept for LOG_ROLLUP_MINUTE_RETENTION_DAYS:
+``prune_minute_rollups`` (run by ``apply_retention``) deletes older ones,
+and windows starting before that use hour buckets.
+"""
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .archive import archive_aliases
+from .iputils import pack_ip
+from .models import LogEntry, Anomaly, ArchiveSegment, LogRollup
+
+
+RESOLUTIONS = ('minute', 'hour', 'day')
+
+# Largest window each resolution serves before readers step up to the next
+MAX_SPAN = {
+    'minute': timedelta(hours=6),
+    'hour': timedelta(days=14),
+}
+
+_KEY_COLUMNS = ('resolution', 'bucket', 'log_type', 'source', 'host_ip')
+_VALUE_COLUMNS = ('log_count', 'anomaly_count', 'anomaly_score_sum')
+
+
+def _as_utc(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc)
+
+
+def truncate(value, resolution):
+    """Start of the UTC bucket containing ``value``"""
+    value = _as_utc(value)
+    if resolution == 'minute':
+        return value.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f'Unknown rollup resolution: {resolution}')
+
+
+def minute_cutoff(now=None):
+    """Oldest minute bucket kept, on an hour boundary"""
+    days = getattr(settings, 'LOG_ROLLUP_MINUTE_RETENTION_DAYS', 7)
+    return truncate((now or timezone.now()) - timedelta(days=days), 'hour')
+
+
+def choose_resolution(start, end):
+    """Finest resolution that keeps the bucket count for [start, end] small"""
+    span = end - start
+    if span <= MAX_SPAN['minute'] and _as_utc(start) >= minute_cutoff():
+        return 'minute'
+    if span <= MAX_SPAN['hour']:
+        return 'hour'
+    return 'day'
+
+
+def rollup_queryset(start, end, resolution=None):
+    """LogRollup rows for the buckets overlapping [start, end]"""
+    resolution = resolution or choose_resolution(start, end)
+    return LogRollup.objects.filter(
+        resolution=resolution,
+        bucket__gte=truncate(start, resolution),
+        bucket__lte=end,
+    )
+
+
+def _dimensions(log_entry):
+    return (log_entry.log_type or '', log_entry.source or '', log_entry.host_ip or '')
+
+
+def _add_deltas(deltas, log_entry, logs=0, anomalies=0, score_sum=0.0):
+    timestamp = _as_utc(log_entry.timestamp)
+    dimensions = _dimensions(log_entry)
+    for resolution in RESOLUTIONS:
+        values = deltas[(resolution, truncate(timestamp, resolution)) + dimensions]
+        values[0] += logs
+        values[1] += anomalies
+        values[2] += score_sum
+
+
+def apply_deltas(deltas):
+    """Add ``{key: [log_count, anomaly_count, score_sum]}`` to the rollups"""
+    if not deltas:
+        return
+
+    table = connection.ops.quote_name(LogRollup._meta.db_table)
+    quote = connection.ops.quote_name
+    columns = _KEY_COLUMNS + ('ip_numeric',) + _VALUE_COLUMNS
+    updates = ', '.join(
+        f'{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}'
+        for column in _VALUE_COLUMNS
+    )
+    sql = (
+        f'INSERT INTO {table} ({", ".join(quote(c) for c in columns)}) '
+        f'VALUES ({", ".join(["%s"] * len(columns))}) '
+        f'ON CONFLICT ({", ".join(quote(c) for c in _KEY_COLUMNS)}) DO UPDATE SET {updates}'
+    )
+
+    adapt = connection.ops.adapt_datetimefield_value
+    params = [
+        (resolution, adapt(bucket), log_type, source, host_ip, pack_ip(host_ip), *values)
+        for (resolution, bucket, log_type, source, host_ip), values in deltas.items()
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def record_logs(log_entries, sign=1):
+    """Count saved log entries into every resolution (``sign=-1`` removes them)"""
+    deltas = defaultdict(lambda: [0, 0, 0.0])
+    for log_entry in log_entries:
+        _add_deltas(deltas, log_entry, logs=sign)
+    apply_deltas(deltas)
+
+
+def record_anomalies(anomalies, sign=1):
+    """Count anomalies against their log entry's buckets (``sign=-1`` removes them)"""
+    deltas = defaultdict(lambda: [0, 0, 0.0])
+    for anomaly in anomalies:
+        _add_deltas(
+            deltas, anomaly.log_entry,
+            anomalies=sign, score_sum=sign * (anomaly.anomaly_score or 0.0)
+        )
+    apply_deltas(deltas)
+
+
+def prune_minute_rollups(cutoff=None, batch_size=5000):
+    """Delete one batch of minute buckets older than ``cutoff``; returns the count"""
+    cutoff = cutoff or minute_cutoff()
+    ids = list(
+        LogRollup.objects.filter(resolution='minute', bucket__lt=cutoff)
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    return LogRollup.objects.filter(id__in=ids).delete()[0]
+
+
+def rebuild_rollups(batch_days=1):
+    """
+    Recompute every rollup from LogEntry/Anomaly, archive included.
+
+    Works one window of ``batch_days`` at a time: minute buckets are
+    aggregated in the database and folded into hour and day buckets in
+    Python; minute buckets past their retention are not written. Returns
+    the number of rollup rows written.
+    """
+    LogRollup.objects.all().delete()
+    oldest_minute = minute_cutoff()
+
+    first = LogEntry.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+    last = LogEntry.objects.order_by('-timestamp').values_list('timestamp', flat=True).first()
+    archived = ArchiveSegment.objects.filter(log_count__gt=0).aggregate(
+        first=Min('first_timestamp'), last=Max('last_timestamp')
+    )
+    if archived['first'] is not None:
+        first = min(first, archived['first']) if first else archived['first']
+        last = max(last, archived['last']) if last else archived['last']
+    if first is None:
+        return 0
+
+    written = 0
+    window_start = truncate(first, 'day')
+    window = timedelta(days=batch_days)
+    while window_start <= last:
+        window_end = window_start + window
+        deltas = defaultdict(lambda: [0, 0, 0.0])
+
+        for using in [DEFAULT_DB_ALIAS] + archive_aliases(window_start, window_end):
+            logs = LogEntry.objects.using(using).filter(
+                timestamp__gte=window_start, timestamp__lt=window_end
+            ).annotate(
+                minute=TruncMinute('timestamp', tzinfo=dt_timezone.utc)
+            ).values('minute', 'log_type', 'source', 'host_ip').annotate(count=Count('id')).order_by()
+            for row in logs:
+                for resolution in RESOLUTIONS:
+                    key = (resolution, truncate(row['minute'], resolution),
+                           row['log_type'] or '', row['source'] or '', row['host_ip'] or '')
+                    deltas[key][0] += row['count']
+
+            anomalies = Anomaly.objects.using(using).filter(
+                log_entry__timestamp__gte=window_start, log_entry__timestamp__lt=window_end
+            ).annotate(
+                minute=TruncMinute('log_entry__timestamp', tzinfo=dt_timezone.utc)
+            ).values(
+                'minute', 'log_entry__log_type', 'log_entry__source', 'log_entry__host_ip'
+            ).annotate(count=Count('id'), score_sum=Sum('anomaly_score')).order_by()
+            for row in anomalies:
+                for resolution in RESOLUTIONS:
+                    key = (resolution, truncate(row['minute'], resolution),
+                           row['log_entry__log_type'] or '', row['log_entry__source'] or '',
+                           row['log_entry__host_ip'] or '')
+                    deltas[key][1] += row['count']
+                    deltas[key][2] += row['score_sum'] or 0.0
+
+        deltas = {
+            key: values for key, values in deltas.items()
+            if key[0] != 'minute' or key[1] >= oldest_minute
+        }
+        apply_deltas(deltas)
+        written += len(deltas)
+        window_start = window_end
+
+    return written
@@ -3,5 +3,6 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/dashboard/$', consumers.DashboardConsumer.as_asgi()),
-    re_path(r'ws/anomalies/$', consumers.AnomalyConsumer.as_asgi()),
-] 
\ No newline at end of file
+    # Older clients connect here; same feed
+    re_path(r'ws/anomalies/$', consumers.DashboardConsumer.as_asgi()),
+]
@@ -0,0 +1,199 @@
+"""
+Template-keyed cache of model scores.
+
+Most log lines are one of a few hundred templates with different numbers,
+addresses or paths filled in. ``normalize_message`` masks those parts::
+
+    sshd[4121]: Failed password for root from 10.1.2.3 port 52231 ssh2
+    sshd[<NUM>]: Failed password for root from <IP> port <NUM> ssh2
+
+and ``ScoreCache`` keeps one score per template in a bounded LRU, so only
+the first message of each template reaches the model. Within one
+``score`` call a template that is not cached yet is scored once, however
+many messages share it.
+
+With a ``path`` the cache is written to a JSON file (atomically, at most
+every ``save_interval`` seconds and on exit) and loaded again on start,
+so a restarted server does not begin cold. Entries are tagged with a
+model key and dropped when the model changes.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+# Order matters: addresses and paths contain digits, hex ids would
+# otherwise be split into numbers and words
+_MASKS = [
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b'), '<IP>'),
+    (re.compile(r'\b[0-9a-fA-F]{8}-(?:[0-9a-fA-F]{4}-){3}[0-9a-fA-F]{12}\b'), '<HEX>'),
+    (re.compile(r'(?:[A-Za-z]:\\|(?<![\w<>])/)[^\s"\'\]\[(),;]*'), '<PATH>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b|\b(?=[0-9a-fA-F]*\d)(?=[0-9a-fA-F]*[a-fA-F])[0-9a-fA-F]{6,}\b'), '<HEX>'),
+    # Not digits inside words (ssh2, eth0), which are part of the template
+    (re.compile(r'(?<![A-Za-z_])\d+(?:\.\d+)?'), '<NUM>'),
+]
+_WHITESPACE_RE = re.compile(r'\s+')
+
+FILE_FORMAT = 1
+
+
+def normalize_message(message):
+    """The message's template: IPs, UUIDs/hex ids, paths and numbers masked"""
+    for pattern, placeholder in _MASKS:
+        message = pattern.sub(placeholder, message)
+    return _WHITESPACE_RE.sub(' ', message).strip()
+
+
+class ScoreCache:
+    """Bounded LRU of template -> score, with hit-rate metrics and optional persistence"""
+
+    def __init__(self, max_size=100000, path=None, model_key=None, save_interval=300):
+        self.max_size = max_size
+        self.path = path
+        self.model_key = model_key
+        self.save_interval = save_interval
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, template):
+        with self._lock:
+            score = self._entries.get(template)
+            if score is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(template)
+            self.hits += 1
+            return score
+
+    def put(self, template, score):
+        with self._lock:
+            self._put(template, score)
+
+    def _put(self, template, score):
+        self._entries[template] = score
+        self._entries.move_to_end(template)
+        self._dirty = True
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def score(self, messages, predict_batch):
+        """
+        Scores for ``messages``, in order.
+
+        Messages whose template is not cached are passed to
+        ``predict_batch`` (one message per template); its exceptions
+        propagate and nothing is cached for that call.
+        """
+        templates = [normalize_message(message) for message in messages]
+        scores = [None] * len(messages)
+        missing = {}  # template -> (representative message, indexes)
+
+        with self._lock:
+            for index, template in enumerate(templates):
+                score = self._entries.get(template)
+                if score is not None:
+                    self._entries.move_to_end(template)
+                    self.hits += 1
+                    scores[index] = score
+                    continue
+                self.misses += 1
+                missing.setdefault(template, (messages[index], []))[1].append(index)
+
+        if missing:
+            predicted = list(predict_batch([message for message, _ in missing.values()]))
+            with self._lock:
+                for (template, (_, indexes)), score in zip(missing.items(), predicted):
+                    self._put(template, score)
+                    for index in indexes:
+                        scores[index] = score
+
+        self.maybe_save()
+        return scores
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    # Persistence
+
+    def load(self):
+        """Read entries from ``path``; a missing file, bad file or other model starts empty"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning('Ignoring score cache %s: %s', self.path, e)
+            return 0
+
+        if not isinstance(data, dict) or data.get('format') != FILE_FORMAT or data.get('model') != self.model_key:
+            logger.info('Score cache %s is for another model; starting empty', self.path)
+            return 0
+
+        with self._lock:
+            # Saved least recently used first, so the newest survive a smaller max_size
+            for template, score in data.get('entries', []):
+                self._put(template, score)
+            self._dirty = False
+            return len(self._entries)
+
+    def save(self):
+        """Write the entries to ``path`` (temp file + rename, so readers never see half a file)"""
+        if not self.path:
+            return False
+        with self._lock:
+            data = {'format': FILE_FORMAT, 'model': self.model_key, 'entries': list(self._entries.items())}
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.score-cache-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logger.exception('Could not save score cache to %s', self.path)
+            os.unlink(tmp_path)
+            return False
+        return True
+
+    def maybe_save(self):
+        if self.path and self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            return self.save()
+        return False
@@ -0,0 +1,308 @@
+"""
+Full-text and substring search over LogEntry.
+
+On SQLite, migration 0006 creates two external-content FTS5 tables that
+triggers keep in step with dashboard_logentry:
+
+    dashboard_logentry_fts       log_message, unicode61 tokens (ranked search)
+    dashboard_logentry_trigram   host_ip and source, trigram tokens (substrings)
+
+Query syntax for message search:
+
+    disk error          both words (AND is implicit)
+    "disk full"         exact phrase
+    auth*               prefix
+    ssh OR sshd         either
+    error NOT timeout   exclude (also written error -timeout)
+    (a OR b) c          grouping
+
+Other databases (and cold archive segments, which carry no index) fall
+back to ``icontains`` filters with the same semantics but no ranking.
+"""
+import html
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import LogEntry
+
+
+FTS_TABLE = 'dashboard_logentry_fts'
+TRIGRAM_TABLE = 'dashboard_logentry_trigram'
+
+# Trigram indexes cannot match substrings shorter than this
+MIN_TRIGRAM_LENGTH = 3
+
+# Match counts stop here; a broad query is shown as "1000+" instead of
+# counting every match on every page
+MATCH_COUNT_LIMIT = 1000
+
+_SNIPPET_START = '\x02'
+_SNIPPET_END = '\x03'
+
+_TOKEN_RE = re.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+
+
+class SearchQueryError(ValueError):
+    """The search query could not be parsed."""
+
+
+def _tokenize(query):
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        token = match.group()
+        if token.startswith('"'):
+            text = token.strip('"').strip()
+            if text:
+                tokens.append(('phrase', text))
+        elif token in ('(', ')'):
+            tokens.append((token, token))
+        elif token in ('AND', 'OR', 'NOT'):
+            tokens.append((token, token))
+        elif token.startswith('-') and len(token) > 1:
+            tokens.append(('-', '-'))
+            tokens.extend(_tokenize(token[1:]))
+        else:
+            tokens.append(('word', token))
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing a small AST of tuples:
+
+    ('term', text, prefix) | ('and', [nodes]) | ('or', [nodes]) | ('not', node, node)
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise SearchQueryError('Enter at least one search term')
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise SearchQueryError(f'Unexpected "{self.tokens[self.pos][1]}"')
+        return node
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            nodes.append(self.parse_and())
+        return nodes[0] if len(nodes) == 1 else ('or', nodes)
+
+    def parse_and(self):
+        include = []
+        exclude = []
+        while self.peek() not in (None, 'OR', ')'):
+            kind = self.peek()
+            if kind == 'AND':
+                self.take()
+                continue
+            if kind in ('NOT', '-'):
+                self.take()
+                if not include:
+                    raise SearchQueryError('NOT needs a search term before it')
+                exclude.append(self.parse_primary())
+                continue
+            include.append(self.parse_primary())
+
+        if not include:
+            raise SearchQueryError('Expected a search term')
+        node = include[0] if len(include) == 1 else ('and', include)
+        if exclude:
+            node = ('not', node, exclude[0] if len(exclude) == 1 else ('or', exclude))
+        return node
+
+    def parse_primary(self):
+        kind = self.peek()
+        if kind is None:
+            raise SearchQueryError('Expected a search term')
+        kind, text = self.take()
+        if kind == '(':
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise SearchQueryError('Missing closing parenthesis')
+            self.take()
+            return node
+        if kind == 'phrase':
+            return ('term', text, False)
+        if kind == 'word':
+            prefix = text.endswith('*')
+            text = text.rstrip('*')
+            if not text:
+                raise SearchQueryError('Prefix search needs at least one character')
+            return ('term', text, prefix)
+        raise SearchQueryError(f'Unexpected "{text}"')
+
+
+def parse_search_query(query):
+    """Parse ``query`` into an AST; raises ``SearchQueryError``"""
+    return _Parser(_tokenize(query or '')).parse()
+
+
+def _fts_quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def to_fts_expression(node):
+    """Render a parsed query as an FTS5 MATCH expression"""
+    kind = node[0]
+    if kind == 'term':
+        return _fts_quote(node[1]) + (' *' if node[2] else '')
+    if kind == 'and':
+        return '(' + ' AND '.join(to_fts_expression(child) for child in node[1]) + ')'
+    if kind == 'or':
+        return '(' + ' OR '.join(to_fts_expression(child) for child in node[1]) + ')'
+    return f'({to_fts_expression(node[1])} NOT {to_fts_expression(node[2])})'
+
+
+def to_q(node, field='log_message'):
+    """Render a parsed query as a Q object of ``icontains`` lookups"""
+    kind = node[0]
+    if kind == 'term':
+        return Q(**{f'{field}__icontains': node[1]})
+    if kind in ('and', 'or'):
+        q = to_q(node[1][0], field)
+        for child in node[1][1:]:
+            q = q & to_q(child, field) if kind == 'and' else q | to_q(child, field)
+        return q
+    return to_q(node[1], field) & ~to_q(node[2], field)
+
+
+def query_terms(node):
+    """Positive terms of a parsed query (for highlighting)"""
+    kind = node[0]
+    if kind == 'term':
+        return [node[1]]
+    if kind == 'not':
+        return query_terms(node[1])
+    return [term for child in node[1] for term in query_terms(child)]
+
+
+_index_available = {}
+
+
+def search_index_available(using=DEFAULT_DB_ALIAS):
+    """Whether the FTS5 tables exist on the ``using`` database"""
+    database = connections[using]
+    if database.vendor != 'sqlite':
+        return False
+    available = _index_available.get(database.settings_dict['NAME'])
+    if available is None:
+        with database.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s)",
+                [FTS_TABLE, TRIGRAM_TABLE]
+            )
+            available = cursor.fetchone()[0] == 2
+        _index_available[database.settings_dict['NAME']] = available
+    return available
+
+
+def filter_by_message(queryset, query):
+    """Restrict a LogEntry queryset to rows whose message matches ``query``"""
+    node = parse_search_query(query)
+    if not search_index_available(queryset.db):
+        return queryset.filter(to_q(node))
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        [to_fts_expression(node)]
+    ))
+
+
+def filter_by_substring(queryset, field, value):
+    """Case-insensitive substring filter on ``host_ip`` or ``source``"""
+    if field not in ('host_ip', 'source'):
+        raise ValueError(f'No substring index for {field}')
+    if len(value) < MIN_TRIGRAM_LENGTH or not search_index_available(queryset.db):
+        return queryset.filter(**{f'{field}__icontains': value})
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH %s',
+        [f'{field} : {_fts_quote(value)}']
+    ))
+
+
+def count_message_matches(query, limit=MATCH_COUNT_LIMIT):
+    """
+    Number of messages matching ``query`` (index only, ignores other
+    filters), counted up to ``limit + 1``: more than ``limit`` means "at
+    least that many".
+    """
+    return filter_by_message(LogEntry.objects.all(), query)[:limit + 1].count()
+
+
+def highlight_terms(text, terms, length=200):
+    """HTML-escaped excerpt of ``text`` with ``terms`` wrapped in <mark>"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    start = max(0, min(positions) - length // 4) if positions else 0
+    excerpt = text[start:start + length]
+
+    escaped = html.escape(excerpt)
+    if terms:
+        pattern = re.compile('|'.join(re.escape(html.escape(term)) for term in terms), re.IGNORECASE)
+        escaped = pattern.sub(lambda match: f'<mark>{match.group()}</mark>', escaped)
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + length < len(text) else ''
+    return prefix + escaped + suffix
+
+
+def _render_snippet(snippet):
+    escaped = html.escape(snippet)
+    return escaped.replace(_SNIPPET_START, '<mark>').replace(_SNIPPET_END, '</mark>')
+
+
+def search_logs(query, queryset=None, limit=50):
+    """
+    Ranked message search.
+
+    Returns up to ``limit`` dicts ``{'log': LogEntry, 'rank': float|None,
+    'snippet': html}``, best match first. ``queryset`` restricts the rows
+    searched (e.g. the log_details filters). Raises ``SearchQueryError``.
+    """
+    node = parse_search_query(query)
+    queryset = LogEntry.objects.all() if queryset is None else queryset
+
+    if not search_index_available():
+        terms = query_terms(node)
+        logs = queryset.filter(to_q(node)).order_by('-timestamp', '-id')[:limit]
+        return [
+            {'log': log, 'rank': None, 'snippet': highlight_terms(log.log_message, terms)}
+            for log in logs
+        ]
+
+    where = ''
+    where_params = []
+    if queryset.query.where:
+        subquery, where_params = queryset.order_by().values('id').query.sql_with_params()
+        where = f'AND rowid IN ({subquery}) '
+    sql = (
+        f'SELECT rowid, bm25({FTS_TABLE}), '
+        f"snippet({FTS_TABLE}, 0, %s, %s, '…', 24) "
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s {where}'
+        f'ORDER BY bm25({FTS_TABLE}) LIMIT %s'
+    )
+    params = [_SNIPPET_START, _SNIPPET_END, to_fts_expression(node), *where_params, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    logs = LogEntry.objects.in_bulk([row[0] for row in rows])
+    return [
+        {'log': logs[log_id], 'rank': rank, 'snippet': _render_snippet(snippet)}
+        for log_id, rank, snippet in rows
+        if log_id in logs
+    ]
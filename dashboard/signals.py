@@ -1,41 +1,52 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.cache import cache
 from .models import LogEntry, Anomaly
+from .counters import count_logs, count_anomalies, count_acknowledgement
+from .rollups import record_logs, record_anomalies
 from .utils import invalidate_log_caches
 
 
+# Each handler bumps the cache data version at most once per transaction,
+# so bulk writes inside transaction.atomic() do not cause invalidation storms.
+# Rollups and counters are updated here for single-object saves and deletes;
+# bulk_create callers (api.ingestion) record them explicitly.
+
+
 @receiver(post_save, sender=LogEntry)
-def invalidate_caches_on_log_save(sender, **kwargs):
-    """Invalidate relevant caches when a new log entry is saved"""
-    invalidate_log_caches()
+def invalidate_caches_on_log_save(sender, instance, created, **kwargs):
+    """Update rollups and invalidate caches when a new log entry is saved"""
+    if created:
+        record_logs([instance])
+        count_logs([instance])
+    invalidate_log_caches(using=kwargs.get('using'))
 
 
 @receiver(post_delete, sender=LogEntry)
-def invalidate_caches_on_log_delete(sender, **kwargs):
-    """Invalidate relevant caches when a log entry is deleted"""
-    invalidate_log_caches()
+def invalidate_caches_on_log_delete(sender, instance, **kwargs):
+    """Update rollups and invalidate caches when a log entry is deleted"""
+    record_logs([instance], sign=-1)
+    count_logs([instance], sign=-1)
+    invalidate_log_caches(using=kwargs.get('using'))
 
 
 @receiver(post_save, sender=Anomaly)
-def invalidate_caches_on_anomaly_save(sender, **kwargs):
-    """Invalidate relevant caches when a new anomaly is saved"""
-    # Clear anomaly-specific caches
-    cache_keys = [
-        'recent_anomalies_10',
-        'recent_anomalies_5',
-        'system_metrics',
-    ]
-    cache.delete_many(cache_keys)
+def invalidate_caches_on_anomaly_save(sender, instance, created, **kwargs):
+    """Update rollups and invalidate caches when a new anomaly is saved"""
+    if created:
+        record_anomalies([instance])
+        count_anomalies([instance])
+        instance._loaded_acknowledged = instance.acknowledged
+    else:
+        count_acknowledgement(instance)
+    invalidate_log_caches(using=kwargs.get('using'))
 
 
 @receiver(post_delete, sender=Anomaly)
-def invalidate_caches_on_anomaly_delete(sender, **kwargs):
-    """Invalidate relevant caches when an anomaly is deleted"""
-    # Clear anomaly-specific caches
-    cache_keys = [
-        'recent_anomalies_10',
-        'recent_anomalies_5',
-        'system_metrics',
-    ]
-    cache.delete_many(cache_keys)
+def invalidate_caches_on_anomaly_delete(sender, instance, **kwargs):
+    """Update rollups and invalidate caches when an anomaly is deleted"""
+    count_anomalies([instance], sign=-1)
+    try:
+        record_anomalies([instance], sign=-1)
+    except LogEntry.DoesNotExist:
+        pass
+    invalidate_log_caches(using=kwargs.get('using'))
@@ -0,0 +1,283 @@
+"""
+Live updates for the overview page.
+
+``ChangeFeed`` turns data changes into events; ``event_stream`` sends
+them as Server-Sent Events while the connection is open. Changes are
+detected from the database, not the per-process cache, so writes from
+other processes (the spool drainer, the Kafka worker, other web workers)
+are seen too: each tick reads the log/anomaly counters (see
+``counters``) and the newest anomaly id, two indexed lookups. When either
+moves it sends:
+
+    event: anomaly   one per new anomaly, ``id`` is the anomaly id
+    event: stats     totals and deltas since the last stats event, only
+                     when they changed
+
+Anomaly ids are the event ids, so a browser that reconnects with
+``Last-Event-ID`` receives exactly the anomalies it missed.
+
+Under a sync (WSGI) server every open stream holds a worker thread for up
+to DASHBOARD_STREAM_MAX_SECONDS, after which the browser reconnects on its
+own. Under ASGI the view streams ``async_event_stream`` instead, which
+waits with ``asyncio.sleep`` and polls in ``sync_to_async``: Django
+would otherwise drain a sync iterator to the end before sending any of
+it. At most DASHBOARD_STREAM_MAX_CLIENTS streams are open per process;
+further clients get a 503 and the page falls back to polling, so streams
+cannot take every worker.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .counters import ANOMALIES, LOGS
+from .models import Anomaly, DataCounter
+
+
+# Anomalies sent per change; the feed only shows the newest ones anyway
+MAX_ANOMALIES_PER_EVENT = 50
+
+
+def get_stream_settings():
+    return {
+        'poll_interval': getattr(settings, 'DASHBOARD_STREAM_POLL_INTERVAL', 1.0),
+        'max_seconds': getattr(settings, 'DASHBOARD_STREAM_MAX_SECONDS', 300),
+        'heartbeat': getattr(settings, 'DASHBOARD_STREAM_HEARTBEAT', 15),
+        'retry_ms': getattr(settings, 'DASHBOARD_STREAM_RETRY_MS', 2000),
+        'max_clients': getattr(settings, 'DASHBOARD_STREAM_MAX_CLIENTS', 4),
+    }
+
+
+def format_event(data, event=None, event_id=None):
+    """One SSE frame; ``data`` is sent as JSON"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def latest_anomaly_id():
+    return Anomaly.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def new_anomalies(after_id, limit=MAX_ANOMALIES_PER_EVENT):
+    """The newest ``limit`` anomalies with ``id > after_id``, oldest first"""
+    anomalies = list(
+        Anomaly.objects.filter(id__gt=after_id).select_related('log_entry').order_by('-id')[:limit]
+    )
+    anomalies.reverse()
+    return anomalies
+
+
+def anomaly_payload(anomaly):
+    log_entry = anomaly.log_entry
+    message = log_entry.log_message
+    item = {
+        'id': anomaly.id,
+        'log_entry_id': log_entry.id,
+        'timestamp': log_entry.timestamp,
+        'host_ip': log_entry.host_ip,
+        'log_message': message[:100] + '...' if len(message) > 100 else message,
+        'anomaly_score': anomaly.anomaly_score,
+    }
+    return {
+        'id': anomaly.id,
+        'log_entry_id': log_entry.id,
+        'timestamp': log_entry.timestamp.isoformat(),
+        'host_ip': log_entry.host_ip,
+        'anomaly_score': anomaly.anomaly_score,
+        'html': render_to_string('dashboard/partials/anomaly_feed_rows.html', {'recent_anomalies': [item]}),
+    }
+
+
+def stats_payload():
+    """Log and anomaly totals read from the counters (not the per-process cache)"""
+    values = dict(DataCounter.objects.filter(name__in=(LOGS, ANOMALIES)).values_list('name', 'value'))
+    return {'total_logs': values.get(LOGS, 0), 'total_anomalies': values.get(ANOMALIES, 0)}
+
+
+class ChangeFeed:
+    """
+    What changed since the last ``poll``: new anomalies and stats.
+
+    Shared by the SSE stream and the WebSocket publisher (``broadcast``).
+    ``poll`` reads the totals and the newest anomaly id; anything else is
+    only queried when one of them moved.
+    """
+
+    def __init__(self, last_id=None):
+        # None starts from the newest anomaly (nothing is replayed)
+        self.last_id = latest_anomaly_id() if last_id is None else last_id
+        self.state = None
+        self.stats = None
+
+    def poll(self):
+        """List of ``(event, event_id, payload)``, empty when nothing changed"""
+        latest = stats_payload()
+        state = (latest, latest_anomaly_id())
+        if state == self.state:
+            return []
+        self.state = state
+
+        events = []
+        for anomaly in new_anomalies(self.last_id):
+            self.last_id = anomaly.id
+            events.append(('anomaly', anomaly.id, anomaly_payload(anomaly)))
+
+        if latest != self.stats:
+            delta = {key: value - (self.stats or latest)[key] for key, value in latest.items()}
+            events.append(('stats', None, {**latest, 'delta': delta}))
+            self.stats = latest
+        return events
+
+
+class StreamLimit:
+    """Count of open streams in this process, capped at ``max_clients``"""
+
+    def __init__(self):
+        self.open = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, max_clients):
+        with self.lock:
+            if max_clients and self.open >= max_clients:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.open -= 1
+
+
+stream_limit = StreamLimit()
+
+
+class LimitedStream:
+    """
+    A stream holding one ``stream_limit`` slot until it is closed.
+
+    The server calls ``close`` when the response ends or the client goes
+    away, also when the generator never started.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.stream)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.stream.close()
+            stream_limit.release()
+
+
+class AsyncLimitedStream(LimitedStream):
+    """
+    ``LimitedStream`` for an async generator.
+
+    The ASGI handler does not call ``close`` when the client disconnects,
+    but it does close the iterator, so the slot is released from there too.
+    """
+
+    async def __aiter__(self):
+        try:
+            async for frame in self.stream:
+                yield frame
+        finally:
+            await self.stream.aclose()
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            stream_limit.release()
+
+
+def open_event_stream(last_id=None, asynchronous=False):
+    """
+    ``event_stream(last_id)`` holding a slot, or None when DASHBOARD_STREAM_MAX_CLIENTS are open
+
+    ``asynchronous`` gives ``async_event_stream`` for ASGI requests.
+    """
+    if not stream_limit.acquire(get_stream_settings()['max_clients']):
+        return None
+    if asynchronous:
+        return AsyncLimitedStream(async_event_stream(last_id))
+    return LimitedStream(event_stream(last_id))
+
+
+def stream_options(**overrides):
+    """``get_stream_settings`` with the non-None ``overrides`` applied"""
+    options = get_stream_settings()
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return options
+
+
+def event_stream(last_id=None, poll_interval=None, max_seconds=None, heartbeat=None, retry_ms=None):
+    """
+    Yield SSE frames for anomalies after ``last_id`` and stats changes.
+
+    ``last_id`` None starts from the newest anomaly (nothing is replayed).
+    Arguments left as None come from ``get_stream_settings``.
+    """
+    options = stream_options(
+        poll_interval=poll_interval, max_seconds=max_seconds, heartbeat=heartbeat, retry_ms=retry_ms,
+    )
+
+    feed = ChangeFeed(last_id)
+    yield f'retry: {options["retry_ms"]}\n\n'
+
+    started = last_beat = time.monotonic()
+    while True:
+        events = feed.poll()
+        for event, event_id, payload in events:
+            yield format_event(payload, event=event, event_id=event_id)
+        if events:
+            last_beat = time.monotonic()
+
+        now = time.monotonic()
+        if now - started >= options['max_seconds']:
+            return
+        if now - last_beat >= options['heartbeat']:
+            # Comment frame: keeps proxies from timing out and surfaces
+            # closed connections to the server
+            yield ': keepalive\n\n'
+            last_beat = now
+        time.sleep(options['poll_interval'])
+
+
+async def async_event_stream(last_id=None, poll_interval=None, max_seconds=None, heartbeat=None, retry_ms=None):
+    """``event_stream`` for ASGI: the same frames, without blocking the event loop"""
+    options = stream_options(
+        poll_interval=poll_interval, max_seconds=max_seconds, heartbeat=heartbeat, retry_ms=retry_ms,
+    )
+
+    feed = await sync_to_async(ChangeFeed)(last_id)
+    yield f'retry: {options["retry_ms"]}\n\n'
+
+    started = last_beat = time.monotonic()
+    while True:
+        events = await sync_to_async(feed.poll)()
+        for event, event_id, payload in events:
+            yield format_event(payload, event=event, event_id=event_id)
+        if events:
+            last_beat = time.monotonic()
+
+        now = time.monotonic()
+        if now - started >= options['max_seconds']:
+            return
+        if now - last_beat >= options['heartbeat']:
+            yield ': keepalive\n\n'
+            last_beat = now
+        await asyncio.sleep(options['poll_interval'])
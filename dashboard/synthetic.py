@@ -0,0 +1,420 @@
+"""
+High-volume synthetic data for scale testing.
+
+``generate`` writes LogEntry/Anomaly/Alert/SystemMetric rows that look like
+production traffic:
+
+* hosts follow a Zipf-like skew (a few noisy hosts, a long tail)
+* sources and log types follow configurable weights
+* timestamps follow a diurnal curve peaking at ``peak_hour`` with quieter
+  weekends
+* anomaly bursts: short windows where one host/source floods errors with
+  high scores; each burst also produces an Alert
+* SystemMetric samples per school whose values follow the same daily load
+
+Work is split into fixed-size shards, each generated from its own seed,
+so the output for a given seed does not depend on the number of workers.
+Shards are written with ``bulk_create`` in batches of ``batch_size``, one
+transaction per batch, and can run in parallel worker processes. On
+SQLite the writes still serialize on the database lock, but generation
+in one worker overlaps with inserts in another.
+"""
+import math
+import multiprocessing
+import random
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from api.models import Alert, SystemMetric
+
+from .counters import count_anomalies, count_logs
+from .iputils import pack_ip
+from .models import LogEntry, Anomaly
+from .rollups import record_anomalies, record_logs
+from .utils import invalidate_log_caches
+
+
+SHARD_SIZE = 50000
+
+DEFAULT_CONFIG = {
+    'logs': 1000000,
+    'metrics': None,            # defaults to logs // 20
+    'days': 30,
+    'end': None,                # defaults to now
+    'hosts': 500,
+    'host_skew': 1.1,
+    'sources': {'apache': 4, 'linux': 3, 'firewall': 2, 'database': 1, 'application': 2},
+    'log_types': {'INFO': 70, 'WARNING': 15, 'ERROR': 10, 'DEBUG': 5},
+    'peak_hour': 14,
+    'diurnal_amplitude': 0.6,
+    'weekend_factor': 0.5,
+    'anomaly_rate': 0.02,
+    'threshold': 0.5,
+    'score_alpha': 2.0,
+    'score_beta': 5.0,
+    'bursts': 20,
+    'burst_share': 0.01,
+    'burst_anomaly_rate': 0.8,
+    'schools': 10,
+    'batch_size': 5000,
+    'seed': 42,
+}
+
+MESSAGES = {
+    'apache': [
+        'GET /index.html HTTP/1.1 {status} {size}',
+        'POST /api/v1/login HTTP/1.1 {status} {size}',
+        'GET /api/v1/users/{n} HTTP/1.1 {status} {size}',
+        'GET /static/app.js HTTP/1.1 {status} {size}',
+    ],
+    'linux': [
+        'sshd[{pid}]: Accepted publickey for deploy from {ip} port {port} ssh2',
+        'sshd[{pid}]: Failed password for invalid user admin from {ip} port {port} ssh2',
+        'CRON[{pid}]: (root) CMD (run-parts /etc/cron.hourly)',
+        'kernel: eth0: link up, 1000 Mbps, full duplex',
+        'systemd[1]: Started Session {n} of user deploy.',
+    ],
+    'firewall': [
+        'DROP IN=eth0 SRC={ip} DST=10.0.0.1 PROTO=TCP DPT={port}',
+        'ACCEPT IN=eth0 SRC={ip} DST=10.0.0.1 PROTO=TCP DPT=443',
+        'Blocked suspicious traffic from {ip}',
+    ],
+    'database': [
+        'Database query executed in {seconds} seconds',
+        'Connection pool at {percent}% capacity',
+        'Slow query detected - execution time {seconds}s',
+    ],
+    'application': [
+        'Request {n} processed in {ms} ms',
+        'Cache miss for key user:{n}',
+        'Application error: NullPointerException in UserService',
+        'JWT token expired for user {n}',
+    ],
+}
+DEFAULT_MESSAGES = ['Event {n} from {ip}', 'Service heartbeat {n}']
+
+METRIC_TYPES = [
+    # metric_type, unit, idle value, value added at peak load, noise
+    ('cpu', 'percent', 15.0, 55.0, 8.0),
+    ('memory', 'percent', 40.0, 35.0, 5.0),
+    ('processing_time', 'seconds', 0.05, 0.4, 0.05),
+    ('queue_depth', 'count', 2.0, 150.0, 20.0),
+]
+
+
+def build_config(**overrides):
+    """DEFAULT_CONFIG with ``overrides`` applied (None values are ignored)"""
+    config = dict(DEFAULT_CONFIG)
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    if config['metrics'] is None:
+        config['metrics'] = config['logs'] // 20
+    if config['end'] is None:
+        config['end'] = timezone.now()
+    return config
+
+
+def parse_weights(value):
+    """Parse ``'apache:4,linux:3'`` into ``{'apache': 4.0, 'linux': 3.0}`` (weight defaults to 1)"""
+    weights = {}
+    for item in value.split(','):
+        name, _, weight = item.strip().partition(':')
+        if not name:
+            continue
+        weights[name] = float(weight) if weight else 1.0
+        if weights[name] < 0:
+            raise ValueError(f'Negative weight for {name}')
+    if not weights or not sum(weights.values()):
+        raise ValueError(f'No usable weights in {value!r}')
+    return weights
+
+
+def _cumulative(weights):
+    total = 0.0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def build_hosts(count, skew, seed):
+    """``count`` private addresses and Zipf-like cumulative weights"""
+    rng = random.Random(seed)
+    hosts = set()
+    while len(hosts) < count:
+        hosts.add(f'{rng.choice(["10.0", "10.1", "192.168", "172.16"])}.{rng.randint(0, 255)}.{rng.randint(1, 254)}')
+    hosts = sorted(hosts)
+    rng.shuffle(hosts)
+    return hosts, _cumulative(1 / (rank + 1) ** skew for rank in range(count))
+
+
+def window(config):
+    """``(start, end)`` covered by the generated data"""
+    end = config['end']
+    return end - timedelta(days=config['days']), end
+
+
+def day_weights(config):
+    """Relative traffic per day in the window (weekends scaled by ``weekend_factor``)"""
+    start, _ = window(config)
+    return [
+        config['weekend_factor'] if (start + timedelta(days=day)).weekday() >= 5 else 1.0
+        for day in range(config['days'])
+    ]
+
+
+def hour_weights(config):
+    """Relative traffic per hour of day, a cosine peaking at ``peak_hour``"""
+    return [
+        max(0.0, 1 + config['diurnal_amplitude'] * math.cos(2 * math.pi * (hour - config['peak_hour']) / 24))
+        for hour in range(24)
+    ]
+
+
+def build_bursts(config, hosts):
+    """Burst windows: dicts with start, end, host, source and school_id"""
+    rng = random.Random(f'{config["seed"]}-bursts')
+    start, end = window(config)
+    span = (end - start).total_seconds()
+    sources = list(config['sources'])
+    bursts = []
+    for _ in range(config['bursts']):
+        burst_start = start + timedelta(seconds=rng.uniform(0, span - 1800))
+        bursts.append({
+            'start': burst_start,
+            'end': burst_start + timedelta(minutes=rng.randint(2, 30)),
+            'host': rng.choice(hosts[:max(1, len(hosts) // 10)] if rng.random() < 0.5 else hosts),
+            'source': rng.choice(sources),
+            'school_id': f'school-{rng.randint(1, config["schools"]):03d}',
+        })
+    return bursts
+
+
+def plan_tasks(config):
+    """Shards to generate: ``(kind, index, rows)`` tuples"""
+    tasks = []
+    for kind in ('logs', 'metrics'):
+        total = config[kind]
+        for index, offset in enumerate(range(0, total, SHARD_SIZE)):
+            tasks.append((kind, index, min(SHARD_SIZE, total - offset)))
+    return tasks
+
+
+class _Sampler:
+    """Per-process state shared by every shard of one run"""
+
+    def __init__(self, config):
+        self.config = config
+        self.start, self.end = window(config)
+        self.hosts, self.host_weights = build_hosts(config['hosts'], config['host_skew'], config['seed'])
+        self.packed_hosts = {host: pack_ip(host) for host in self.hosts}
+        self.sources = list(config['sources'])
+        self.source_weights = _cumulative(config['sources'].values())
+        self.log_types = list(config['log_types'])
+        self.log_type_weights = _cumulative(config['log_types'].values())
+        self.day_weights = _cumulative(day_weights(config))
+        self.hours = hour_weights(config)
+        self.hour_weights = _cumulative(self.hours)
+        self.peak = max(self.hours) or 1.0
+        self.bursts = build_bursts(config, self.hosts)
+
+    def timestamps(self, rng, count):
+        """``count`` timestamps following the daily and weekly pattern"""
+        days = rng.choices(range(self.config['days']), cum_weights=self.day_weights, k=count)
+        hours = rng.choices(range(24), cum_weights=self.hour_weights, k=count)
+        base = self.start.replace(hour=0, minute=0, second=0, microsecond=0)
+        values = []
+        for day, hour in zip(days, hours):
+            value = base + timedelta(days=day, hours=hour, seconds=rng.random() * 3600)
+            if value < self.start:
+                value += timedelta(days=1)
+            elif value >= self.end:
+                value -= timedelta(days=1)
+            values.append(value)
+        return values
+
+    def message(self, rng, source):
+        template = rng.choice(MESSAGES.get(source, DEFAULT_MESSAGES))
+        return template.format(
+            status=rng.choice([200, 200, 200, 201, 301, 404, 500]), size=rng.randint(100, 50000),
+            n=rng.randint(1, 100000), pid=rng.randint(100, 32000), port=rng.randint(1024, 65535),
+            ip=f'203.0.113.{rng.randint(1, 254)}', seconds=round(rng.uniform(0.01, 20), 2),
+            percent=rng.randint(10, 100), ms=rng.randint(1, 3000),
+        )
+
+    def score(self, rng, alpha, beta):
+        threshold = self.config['threshold']
+        return round(threshold + (1 - threshold) * rng.betavariate(alpha, beta), 4)
+
+    def log_batch(self, rng, count):
+        """Unsaved ``(log_entries, [(log_index, score)])`` for ``count`` logs"""
+        config = self.config
+        hosts = rng.choices(self.hosts, cum_weights=self.host_weights, k=count)
+        sources = rng.choices(self.sources, cum_weights=self.source_weights, k=count)
+        log_types = rng.choices(self.log_types, cum_weights=self.log_type_weights, k=count)
+        timestamps = self.timestamps(rng, count)
+
+        entries = []
+        scores = []
+        for i in range(count):
+            host, source, log_type, timestamp = hosts[i], sources[i], log_types[i], timestamps[i]
+            if self.bursts and rng.random() < config['burst_share']:
+                burst = rng.choice(self.bursts)
+                host, source = burst['host'], burst['source']
+                log_type = 'ERROR' if rng.random() < 0.6 else 'WARNING'
+                timestamp = burst['start'] + (burst['end'] - burst['start']) * rng.random()
+                if rng.random() < config['burst_anomaly_rate']:
+                    scores.append((i, self.score(rng, config['score_beta'], config['score_alpha'])))
+            elif rng.random() < config['anomaly_rate']:
+                scores.append((i, self.score(rng, config['score_alpha'], config['score_beta'])))
+
+            entries.append(LogEntry(
+                timestamp=timestamp, host_ip=host, ip_numeric=self.packed_hosts[host],
+                log_type=log_type, source=source, log_message=self.message(rng, source),
+            ))
+        return entries, scores
+
+    def metric_batch(self, rng, count):
+        """Unsaved SystemMetric samples whose values follow the daily load"""
+        span = (self.end - self.start).total_seconds()
+        samples = []
+        for _ in range(count):
+            timestamp = self.start + timedelta(seconds=rng.random() * span)
+            load = self.hours[timestamp.astimezone(dt_timezone.utc).hour] / self.peak
+            metric_type, unit, idle, peak, noise = rng.choice(METRIC_TYPES)
+            samples.append(SystemMetric(
+                timestamp=timestamp,
+                school_id=f'school-{rng.randint(1, self.config["schools"]):03d}',
+                metric_type=metric_type, unit=unit,
+                value=round(max(0.0, idle + peak * load + rng.gauss(0, noise)), 3),
+            ))
+        return samples
+
+
+_sampler = None
+_worker_config = None
+
+
+def _get_sampler(config):
+    global _sampler
+    if _sampler is None or _sampler.config is not config:
+        _sampler = _Sampler(config)
+    return _sampler
+
+
+def _write_logs(entries, scores, config):
+    with transaction.atomic():
+        LogEntry.objects.bulk_create(entries)
+        anomalies = [
+            Anomaly(
+                log_entry=entries[index], anomaly_score=score,
+                threshold=config['threshold'], is_anomaly=True,
+            )
+            for index, score in scores
+        ]
+        Anomaly.objects.bulk_create(anomalies)
+        # detected_at is auto_now_add, so bulk_create stamped the wall clock;
+        # use the seeded log time so the rows are reproducible
+        for anomaly in anomalies:
+            anomaly.detected_at = anomaly.log_entry.timestamp
+        Anomaly.objects.bulk_update(anomalies, ['detected_at'])
+        # bulk_create does not send post_save
+        record_logs(entries)
+        record_anomalies(anomalies)
+        count_logs(entries)
+        count_anomalies(anomalies)
+    return len(anomalies)
+
+
+def run_task(config, task):
+    """Generate and write one shard; returns ``{'logs', 'anomalies', 'metrics'}``"""
+    kind, index, rows = task
+    sampler = _get_sampler(config)
+    rng = random.Random(f'{config["seed"]}-{kind}-{index}')
+    result = {'logs': 0, 'anomalies': 0, 'metrics': 0}
+
+    for offset in range(0, rows, config['batch_size']):
+        count = min(config['batch_size'], rows - offset)
+        if kind == 'logs':
+            entries, scores = sampler.log_batch(rng, count)
+            result['anomalies'] += _write_logs(entries, scores, config)
+            result['logs'] += count
+        else:
+            with transaction.atomic():
+                SystemMetric.objects.bulk_create(sampler.metric_batch(rng, count))
+            result['metrics'] += count
+    return result
+
+
+def _init_worker(config):
+    global _worker_config
+    import django
+    django.setup()
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor == 'sqlite':
+        # Take the write lock at BEGIN: a deferred transaction that has to
+        # upgrade its lock fails at once instead of waiting for the timeout
+        connection.settings_dict['OPTIONS'] = {
+            **connection.settings_dict['OPTIONS'], 'transaction_mode': 'IMMEDIATE',
+        }
+    _worker_config = config
+
+
+def _run_worker_task(task):
+    return run_task(_worker_config, task)
+
+
+def create_alerts(config):
+    """One Alert per anomaly burst; returns the number created"""
+    sampler = _get_sampler(config)
+    rng = random.Random(f'{config["seed"]}-alerts')
+    expected_logs = config['logs'] * config['burst_share'] / max(1, len(sampler.bursts))
+    alerts = []
+    for burst in sampler.bursts:
+        score = sampler.score(rng, config['score_beta'], config['score_alpha'])
+        level = 'critical' if score >= 0.9 else 'high' if score >= 0.8 else 'medium' if score >= 0.65 else 'low'
+        resolved = burst['end'] < config['end'] - timedelta(days=1) and rng.random() < 0.7
+        alerts.append(Alert(
+            timestamp=burst['end'], school_id=burst['school_id'], alert_level=level,
+            anomaly_score=score, affected_systems=[burst['host']],
+            summary=f'Burst of {burst["source"]} errors from {burst["host"]}',
+            log_count=round(expected_logs * config['burst_anomaly_rate']),
+            status='resolved' if resolved else 'new',
+        ))
+    Alert.objects.bulk_create(alerts)
+    return len(alerts)
+
+
+def generate(config, workers=1, progress=None):
+    """
+    Write the synthetic dataset described by ``config`` (see ``build_config``).
+
+    ``progress(totals, elapsed)`` is called after every shard with the
+    running ``{'logs', 'anomalies', 'metrics', 'alerts'}`` totals. Returns
+    the final totals.
+    """
+    totals = {'logs': 0, 'anomalies': 0, 'metrics': 0, 'alerts': create_alerts(config)}
+    tasks = plan_tasks(config)
+    started = time.monotonic()
+
+    def add(result):
+        for key, value in result.items():
+            totals[key] += value
+        if progress:
+            progress(totals, time.monotonic() - started)
+
+    if workers <= 1:
+        for task in tasks:
+            add(run_task(config, task))
+    else:
+        # Children must not share the parent's database connections
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+            for result in pool.imap_unordered(_run_worker_task, tasks):
+                add(result)
+
+    invalidate_log_caches()
+    return totals
@@ -1,3 +1,1298 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from unittest.mock import Mock, patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .archive import _copy_to_segments, archive_logs, close_segments, segment_alias
+from .batching import MicroBatcher, percentiles
+from .counters import get_counters, rebuild_counters
+from .inference import holdout_messages, load_backend, parity
+from .inference_pool import default_threads
+from .iputils import InvalidCIDR, cidr_q, cidr_range, pack_ip, unpack_ip
+from .ml_utils import FAILED, LOADING, READY, UNLOADED, ModelManager
+from .models import LogEntry, Anomaly, ArchiveSegment, LogRollup
+from .purge import purge_logs
+from .pagination import InvalidCursor, paginate_by_cursor
+from .stream import event_stream, format_event
+from .search import SearchQueryError, count_message_matches, filter_by_message, parse_search_query, search_index_available
+from .rollups import RESOLUTIONS, choose_resolution, rebuild_rollups, truncate
+from .score_cache import ScoreCache, normalize_message
+from .synthetic import build_config, generate, parse_weights
+from .dynamic_threshold import DynamicThreshold
+from .thresholds import find_best_threshold, threshold_sweep
+from .utils import (
+    get_data_version, get_cached_log_stats, get_cached_hourly_chart_data,
+    get_cached_log_distributions, get_cached_system_metrics, get_optimized_filtered_logs,
+    parse_filter_datetime
+)
+
+
+class CacheVersionTests(TestCase):
+    """Test generation-based invalidation of dashboard caches"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_transaction_bumps_version_once(self):
+        """Test that many writes in one transaction bump the version once"""
+        version = get_data_version()
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for i in range(20):
+                    log = LogEntry.objects.create(host_ip='10.0.0.1', log_message=f'log {i}')
+                    Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(get_data_version(), version + 1)
+
+    def test_cached_stats_refresh_after_write(self):
+        """Test that cached aggregates are recomputed after new data commits"""
+        self.assertEqual(get_cached_log_stats()['total_logs'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LogEntry.objects.create(host_ip='10.0.0.1', log_message='new', log_type='ERROR')
+
+        self.assertEqual(get_cached_log_stats()['total_logs'], 1)
+
+    def test_any_hours_variant_is_invalidated(self):
+        """Test that non-standard hours values do not serve stale data"""
+        self.assertEqual(get_cached_hourly_chart_data(hours=3), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LogEntry.objects.create(
+                host_ip='10.0.0.1', log_message='new', log_type='error',
+                timestamp=timezone.now()
+            )
+
+        data = get_cached_hourly_chart_data(hours=3)
+        self.assertEqual(sum(item['total_logs'] for item in data), 1)
+
+
+class LogRollupTests(TestCase):
+    """Test the minute/hour/day rollups maintained at ingestion time"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_saves_update_every_resolution(self):
+        """Test that a saved log and anomaly are counted at each resolution"""
+        timestamp = timezone.now().replace(minute=30, second=15)
+        log = LogEntry.objects.create(
+            host_ip='10.0.0.1', log_message='x', log_type='ERROR', source='apache', timestamp=timestamp
+        )
+        LogEntry.objects.create(
+            host_ip='10.0.0.1', log_message='y', log_type='ERROR', source='apache',
+            timestamp=timestamp + timedelta(seconds=20)
+        )
+        Anomaly.objects.create(log_entry=log, anomaly_score=0.8)
+
+        for resolution in RESOLUTIONS:
+            rollup = LogRollup.objects.get(resolution=resolution)
+            self.assertEqual(rollup.bucket, truncate(timestamp, resolution))
+            self.assertEqual(rollup.log_count, 2)
+            self.assertEqual(rollup.anomaly_count, 1)
+            self.assertAlmostEqual(rollup.anomaly_score_sum, 0.8)
+
+    def test_delete_decrements(self):
+        """Test that deleting a log removes it and its anomalies from the rollups"""
+        log = LogEntry.objects.create(host_ip='10.0.0.1', log_message='x', log_type='INFO')
+        Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        log.delete()
+
+        rollup = LogRollup.objects.get(resolution='hour')
+        self.assertEqual((rollup.log_count, rollup.anomaly_count), (0, 0))
+
+    def test_charts_read_rollups(self):
+        """Test that chart helpers are served from the rollups"""
+        now = timezone.now()
+        for i, log_type in enumerate(['ERROR', 'ERROR', 'INFO']):
+            LogEntry.objects.create(
+                host_ip=f'10.0.0.{i}', log_message='x', log_type=log_type,
+                source='linux', timestamp=now - timedelta(minutes=i)
+            )
+
+        hourly = get_cached_hourly_chart_data(hours=3)
+        self.assertEqual(sum(item['error_logs'] for item in hourly), 2)
+
+        # Charts no longer look at LogEntry rows
+        LogEntry.objects.all().update(log_type='DEBUG')
+        cache.clear()
+        distributions = get_cached_log_distributions(hours=24)
+        self.assertEqual(distributions['log_type_distribution'][0], {'log_type': 'ERROR', 'count': 2})
+        self.assertEqual(get_cached_system_metrics()['total_logs_24h'], 3)
+
+    def test_rebuild_matches_incremental(self):
+        """Test that rebuild_rollups reproduces the incrementally kept rollups"""
+        now = timezone.now()
+        for i in range(30):
+            log = LogEntry.objects.create(
+                host_ip=f'10.0.0.{i % 3}', log_message='x', log_type=['INFO', 'ERROR'][i % 2],
+                source='apache', timestamp=now - timedelta(hours=i * 5)
+            )
+            if i % 4 == 0:
+                Anomaly.objects.create(log_entry=log, anomaly_score=0.75)
+
+        fields = ('resolution', 'bucket', 'log_type', 'source', 'host_ip', 'log_count', 'anomaly_count')
+        incremental = sorted(LogRollup.objects.values_list(*fields))
+
+        rebuild_rollups()
+
+        self.assertEqual(sorted(LogRollup.objects.values_list(*fields)), incremental)
+
+    def test_backfill_migration_matches_incremental(self):
+        """Test that migration 0009 rebuilds the rollups from the historical models"""
+        from importlib import import_module
+        from django.db import connection
+        from django.db.migrations.loader import MigrationLoader
+        migration = import_module('dashboard.migrations.0009_backfill_logrollups')
+
+        now = timezone.now()
+        for i in range(30):
+            log = LogEntry.objects.create(
+                host_ip=f'10.0.0.{i % 3}', log_message='x', log_type=['INFO', 'ERROR'][i % 2],
+                source='apache', timestamp=now - timedelta(hours=i * 5)
+            )
+            if i % 4 == 0:
+                Anomaly.objects.create(log_entry=log, anomaly_score=0.75)
+
+        fields = ('resolution', 'bucket', 'log_type', 'source', 'host_ip', 'ip_numeric',
+                  'log_count', 'anomaly_count', 'anomaly_score_sum')
+        incremental = sorted(LogRollup.objects.values_list(*fields))
+
+        state = MigrationLoader(connection).project_state(('dashboard', '0009_backfill_logrollups'))
+        migration.backfill_rollups(state.apps, None)
+
+        self.assertEqual(sorted(LogRollup.objects.values_list(*fields)), incremental)
+
+    def test_minute_buckets_expire(self):
+        """Test that minute buckets past their retention are pruned and old windows read hour buckets"""
+        from api.retention import apply_retention
+
+        now = timezone.now()
+        old = now - timedelta(days=10)
+        LogEntry.objects.create(host_ip='10.0.0.1', log_message='old', log_type='INFO', timestamp=old)
+        LogEntry.objects.create(host_ip='10.0.0.1', log_message='new', log_type='INFO', timestamp=now)
+
+        with override_settings(LOG_ROLLUP_MINUTE_RETENTION_DAYS=7):
+            self.assertEqual(apply_retention(now=now)['log_minute_deleted'], 1)
+            self.assertEqual(choose_resolution(old, old + timedelta(hours=1)), 'hour')
+            self.assertEqual(choose_resolution(now - timedelta(hours=1), now), 'minute')
+
+            rebuild_rollups()
+
+        self.assertEqual(
+            list(LogRollup.objects.filter(resolution='minute').values_list('bucket', flat=True)),
+            [truncate(now, 'minute')]
+        )
+        self.assertEqual(LogRollup.objects.filter(resolution='hour').count(), 2)
+
+
+class DataCounterTests(TestCase):
+    """Test the transactionally maintained global counters"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_follow_writes(self):
+        """Test that creates, acknowledgements and deletes update the counters"""
+        log = LogEntry.objects.create(host_ip='10.0.0.1', log_message='x', log_type='ERROR')
+        LogEntry.objects.create(host_ip='10.0.0.1', log_message='y', log_type='info')
+        anomaly = Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        counters = get_counters()
+        self.assertEqual(counters['total_logs'], 2)
+        self.assertEqual(counters['total_anomalies'], 1)
+        self.assertEqual(counters['unacknowledged_anomalies'], 1)
+        self.assertEqual(counters['log_types'], {'ERROR': 1, 'info': 1})
+
+        anomaly = Anomaly.objects.get(id=anomaly.id)
+        anomaly.acknowledged = True
+        anomaly.save()
+        anomaly.save()
+        self.assertEqual(get_counters()['unacknowledged_anomalies'], 0)
+
+        log.delete()
+        counters = get_counters()
+        self.assertEqual((counters['total_logs'], counters['total_anomalies']), (1, 0))
+        self.assertEqual(counters['unacknowledged_anomalies'], 0)
+
+    def test_stats_read_counters(self):
+        """Test that log stats come from the counters without scanning LogEntry"""
+        LogEntry.objects.create(host_ip='10.0.0.1', log_message='x', log_type='ERROR')
+        LogEntry.objects.create(host_ip='10.0.0.1', log_message='y', log_type='error')
+
+        with self.assertNumQueries(1):
+            stats = get_cached_log_stats()
+        self.assertEqual(stats['total_logs'], 2)
+        self.assertEqual(stats['error_count'], 2)
+
+    def test_rebuild_matches_incremental(self):
+        """Test that rebuild_counters reproduces the incrementally kept values"""
+        for i in range(10):
+            log = LogEntry.objects.create(host_ip='10.0.0.1', log_message='x', log_type=['INFO', 'ERROR'][i % 2])
+            if i % 3 == 0:
+                Anomaly.objects.create(log_entry=log, anomaly_score=0.7, acknowledged=i == 0)
+
+        incremental = get_counters()
+        rebuild_counters()
+        self.assertEqual(get_counters(), incremental)
+
+
+class CursorPaginationTests(TestCase):
+    """Test keyset pagination of the log list and anomaly feed"""
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now().replace(microsecond=0)
+        # Pairs of logs share a timestamp so the id tie-breaker is exercised
+        self.logs = [
+            LogEntry.objects.create(
+                host_ip=f'10.0.0.{i % 2}', log_message=f'log {i}', log_type='INFO',
+                timestamp=now - timedelta(seconds=i // 2)
+            )
+            for i in range(7)
+        ]
+
+    def test_pages_walk_forward_and_back(self):
+        """Test that next/prev cursors visit every row exactly once"""
+        queryset = LogEntry.objects.all()
+        expected = list(queryset.order_by('-timestamp', '-id'))
+
+        seen = []
+        page = paginate_by_cursor(queryset, 'timestamp', page_size=3)
+        pages = [page]
+        seen.extend(page)
+        while page.has_next():
+            page = paginate_by_cursor(queryset, 'timestamp', cursor=page.next_cursor, page_size=3)
+            pages.append(page)
+            seen.extend(page)
+        self.assertEqual(seen, expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 1])
+
+        back = paginate_by_cursor(queryset, 'timestamp', cursor=pages[-1].previous_cursor, page_size=3)
+        self.assertEqual(list(back), list(pages[1]))
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_cursor_query_seeks_on_the_index(self):
+        """Test that later pages start an index range scan at the cursor instead of filtering every row"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        first = paginate_by_cursor(LogEntry.objects.all(), 'timestamp', page_size=3)
+        with CaptureQueriesContext(connection) as queries:
+            paginate_by_cursor(LogEntry.objects.all(), 'timestamp', cursor=first.next_cursor, page_size=3)
+        sql = queries[0]['sql']
+        self.assertIn('"timestamp" <= ', sql)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('SEARCH', plan)
+        self.assertIn('timestamp<', plan)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected"""
+        with self.assertRaises(InvalidCursor):
+            paginate_by_cursor(LogEntry.objects.all(), 'timestamp', cursor='not-a-cursor')
+
+    def test_anomaly_feed_cursor(self):
+        """Test the anomaly feed API returns cursors and an estimated total"""
+        for log in self.logs:
+            Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        response = self.client.get(reverse('dashboard:api_anomaly_feed'), {'per_page': 5})
+        data = response.json()
+        self.assertEqual(len(data['anomalies']), 5)
+        self.assertEqual(data['estimated_total'], 7)
+        self.assertTrue(data['has_next'])
+
+        data = self.client.get(reverse('dashboard:api_anomaly_feed'), {'per_page': 5, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(len(data['anomalies']), 2)
+        self.assertFalse(data['has_next'])
+        self.assertTrue(data['has_previous'])
+
+        response = self.client.get(reverse('dashboard:api_anomaly_feed'), {'cursor': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_log_details_filters_and_estimate(self):
+        """Test log_details applies filters and shows an estimated total"""
+        from authentication.models import AdminUser
+        user = AdminUser.objects.create_user(username='admin', password='pw')
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('dashboard:log_details'), {'host_ip': '10.0.0.1'})
+
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        self.assertTrue(all(log.host_ip == '10.0.0.1' for log in page))
+        self.assertEqual(page.estimated_total, 3)
+        self.assertEqual(response.context['total_logs'], 3)
+
+
+class LogSearchTests(TestCase):
+    """Test FTS5 message search and trigram host/source filters"""
+
+    def setUp(self):
+        cache.clear()
+        messages = [
+            ('192.168.1.10', 'sshd', 'Failed password for root from 203.0.113.45'),
+            ('192.168.1.11', 'sshd', 'Accepted password for deploy'),
+            ('10.0.0.5', 'apache', 'GET /index.html HTTP/1.1 200 <script>'),
+            ('10.0.0.6', 'apache', 'Authentication failure for admin'),
+        ]
+        self.logs = [
+            LogEntry.objects.create(host_ip=host, source=source, log_message=message, log_type='INFO')
+            for host, source, message in messages
+        ]
+
+    def search_ids(self, query):
+        return {log.id for log in filter_by_message(LogEntry.objects.all(), query)}
+
+    def test_query_syntax(self):
+        """Test words, phrases, prefixes, OR and exclusion"""
+        self.assertTrue(search_index_available())
+        self.assertEqual(self.search_ids('password'), {self.logs[0].id, self.logs[1].id})
+        self.assertEqual(self.search_ids('"failed password"'), {self.logs[0].id})
+        self.assertEqual(self.search_ids('auth*'), {self.logs[3].id})
+        self.assertEqual(self.search_ids('deploy OR admin'), {self.logs[1].id, self.logs[3].id})
+        self.assertEqual(self.search_ids('password -root'), {self.logs[1].id})
+        self.assertEqual(self.search_ids('(failed OR failure) NOT admin'), {self.logs[0].id})
+
+    def test_invalid_query(self):
+        """Test that malformed queries raise SearchQueryError"""
+        for query in ['', 'NOT root', '(password', 'password OR']:
+            with self.assertRaises(SearchQueryError):
+                parse_search_query(query)
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test that the triggers keep the index in sync"""
+        log = self.logs[2]
+        log.log_message = 'kernel panic'
+        log.save()
+        self.assertEqual(self.search_ids('panic'), {log.id})
+        self.assertEqual(self.search_ids('script'), set())
+
+        log.delete()
+        self.assertEqual(self.search_ids('panic'), set())
+
+    def test_substring_filters(self):
+        """Test trigram host_ip/source filters and the short-value fallback"""
+        logs = get_optimized_filtered_logs(host_ip='168.1.1')
+        self.assertEqual({log.id for log in logs}, {self.logs[0].id, self.logs[1].id})
+        logs = get_optimized_filtered_logs(source='PACH')
+        self.assertEqual({log.id for log in logs}, {self.logs[2].id, self.logs[3].id})
+        logs = get_optimized_filtered_logs(host_ip='.5')
+        self.assertEqual({log.id for log in logs}, {self.logs[2].id})
+
+    def test_search_api(self):
+        """Test the ranked JSON search API with escaped snippets"""
+        from authentication.models import AdminUser
+        self.client.force_login(AdminUser.objects.create_user(username='admin', password='pw'))
+
+        response = self.client.get(reverse('dashboard:api_log_search'), {'q': 'password', 'source': 'ssh'})
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertIn('<mark>password</mark>', data['results'][0]['snippet'])
+
+        data = self.client.get(reverse('dashboard:api_log_search'), {'q': 'index'}).json()
+        self.assertIn('&lt;script&gt;', data['results'][0]['snippet'])
+
+        response = self.client.get(reverse('dashboard:api_log_search'), {'q': '(oops'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('dashboard:log_details'), {'q': '"failed password"'})
+        self.assertEqual([log.id for log in response.context['page_obj']], [self.logs[0].id])
+        self.assertContains(response, '<mark>Failed password</mark>')
+
+
+    def test_match_count_is_capped(self):
+        """Test that broad searches stop counting at the limit and show "N+" """
+        from authentication.models import AdminUser
+        self.client.force_login(AdminUser.objects.create_user(username='admin', password='pw'))
+
+        self.assertEqual(count_message_matches('password', limit=1), 2)
+        self.assertEqual(count_message_matches('deploy', limit=1), 1)
+
+        with patch('dashboard.views.MATCH_COUNT_LIMIT', 1):
+            response = self.client.get(reverse('dashboard:log_details'), {'q': 'password'})
+        self.assertTrue(response.context['total_logs_capped'])
+        self.assertContains(response, '~1+ total entries')
+
+        response = self.client.get(reverse('dashboard:log_details'), {'q': 'password'})
+        self.assertFalse(response.context['total_logs_capped'])
+        self.assertEqual(response.context['total_logs'], 2)
+
+    def test_index_skipped_without_trigram_support(self):
+        """Test that migration 0006 creates nothing when SQLite lacks FTS5 trigram support"""
+        from importlib import import_module
+        from django.db import connection
+        migration = import_module('dashboard.migrations.0006_logentry_search_index')
+
+        self.assertTrue(migration.fts5_trigram_available(connection))
+        editor = Mock(connection=connection)
+        with patch.object(migration, 'fts5_trigram_available', return_value=False):
+            migration.create_search_index(None, editor)
+        editor.execute.assert_not_called()
+
+
+class IPRangeTests(TestCase):
+    """Test packed IP columns and CIDR range filters"""
+
+    def setUp(self):
+        cache.clear()
+        hosts = ['10.0.0.5', '10.0.1.7', '10.1.0.1', '192.168.1.10', '2001:db8::1', 'web-01']
+        self.logs = {
+            host: LogEntry.objects.create(host_ip=host, log_message=f'from {host}', log_type='INFO')
+            for host in hosts
+        }
+
+    def filtered_hosts(self, cidr):
+        return {log.host_ip for log in LogEntry.objects.filter(cidr_q(cidr))}
+
+    def test_pack_ip(self):
+        """Test IPv4 is mapped into IPv6 and non-addresses are left empty"""
+        self.assertEqual(pack_ip('10.0.0.5'), pack_ip('::ffff:10.0.0.5'))
+        self.assertEqual(len(pack_ip('2001:db8::1')), 16)
+        self.assertEqual(unpack_ip(pack_ip('10.0.0.5')), '10.0.0.5')
+        self.assertIsNone(pack_ip('web-01'))
+        self.assertIsNone(self.logs['web-01'].ip_numeric)
+        self.assertEqual(bytes(self.logs['10.0.0.5'].ip_numeric), pack_ip('10.0.0.5'))
+
+    def test_cidr_filters(self):
+        """Test CIDR blocks select exactly their addresses"""
+        self.assertEqual(self.filtered_hosts('10.0.0.0/16'), {'10.0.0.5', '10.0.1.7'})
+        self.assertEqual(self.filtered_hosts('10.0.0.0/8'), {'10.0.0.5', '10.0.1.7', '10.1.0.1'})
+        self.assertEqual(self.filtered_hosts('192.168.1.10'), {'192.168.1.10'})
+        self.assertEqual(self.filtered_hosts('2001:db8::/32'), {'2001:db8::1'})
+        with self.assertRaises(InvalidCIDR):
+            cidr_range('10.0.0.0/33')
+
+    def test_host_change_repacks(self):
+        """Test that saving a new host_ip updates ip_numeric"""
+        log = self.logs['10.1.0.1']
+        log.host_ip = '172.16.0.1'
+        log.save(update_fields=['host_ip'])
+        self.assertEqual(self.filtered_hosts('172.16.0.0/12'), {'172.16.0.1'})
+
+    def test_views_accept_cidr(self):
+        """Test log_details, the anomaly feed and analytics filter by subnet"""
+        from authentication.models import AdminUser
+        self.client.force_login(AdminUser.objects.create_user(username='admin', password='pw'))
+        for log in self.logs.values():
+            Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        response = self.client.get(reverse('dashboard:log_details'), {'cidr': '10.0.0.0/16'})
+        self.assertEqual({log.host_ip for log in response.context['page_obj']}, {'10.0.0.5', '10.0.1.7'})
+        self.assertEqual(response.context['page_obj'].estimated_total, 2)
+
+        response = self.client.get(reverse('dashboard:log_details'), {'cidr': 'nope'})
+        self.assertEqual(response.context['cidr_error'], 'Invalid CIDR block: nope')
+        self.assertEqual(len(response.context['page_obj']), 6)
+
+        data = self.client.get(reverse('dashboard:api_anomaly_feed'), {'cidr': '10.0.0.0/8'}).json()
+        self.assertEqual(len(data['anomalies']), 3)
+        self.assertEqual(data['estimated_total'], 3)
+        response = self.client.get(reverse('dashboard:api_anomaly_feed'), {'cidr': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('analytics:analytics_dashboard'), {'cidr': '10.0.0.0/16'})
+        self.assertEqual({source['host_ip'] for source in response.context['top_sources']}, {'10.0.0.5', '10.0.1.7'})
+        self.assertContains(response, 'value="10.0.0.0/16"')
+        response = self.client.get(reverse('analytics:analytics_dashboard'), {'cidr': 'nope'})
+        self.assertContains(response, 'Invalid CIDR block: nope')
+        self.assertContains(response, 'value="nope"')
+
+
+class LogArchiveTests(TestCase):
+    """Test moving old logs to the monthly cold archive"""
+
+    # Segments are extra database aliases: '__all__' picks up the ones
+    # registered below, so their writes are rolled back with each test
+    databases = '__all__'
+    months = [date(2024, 1, 1), date(2024, 2, 1)]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.archive_dir = tempfile.TemporaryDirectory()
+        cls.archive_settings = override_settings(LOG_ARCHIVE_DIR=Path(cls.archive_dir.name))
+        cls.archive_settings.enable()
+        for month in cls.months:
+            segment_alias(month)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        close_segments()
+        cls.archive_settings.disable()
+        cls.archive_dir.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        timestamps = ['2024-02-25T10:00:00Z', '2024-02-05T10:00:00Z', '2024-01-20T10:00:00Z', '2024-01-10T10:00:00Z']
+        self.old_logs = [
+            LogEntry.objects.create(
+                host_ip='10.0.0.1', log_message=f'old {i}', log_type='ERROR', timestamp=timestamp
+            )
+            for i, timestamp in enumerate(timestamps)
+        ]
+        for log in self.old_logs:
+            log.refresh_from_db()
+        self.new_log = LogEntry.objects.create(host_ip='10.0.0.2', log_message='new', log_type='INFO')
+        self.anomaly = Anomaly.objects.create(log_entry=self.old_logs[0], anomaly_score=0.9)
+        self.cutoff = parse_filter_datetime('2024-06-01')
+
+    def test_archive_moves_old_rows(self):
+        """Test old logs and their anomalies leave the main table but stay counted"""
+        before = get_counters()
+        result = archive_logs(self.cutoff, batch_size=3)
+
+        self.assertEqual(result['logs'], 4)
+        self.assertEqual(result['anomalies'], 1)
+        self.assertEqual(list(LogEntry.objects.all()), [self.new_log])
+        self.assertFalse(Anomaly.objects.exists())
+        self.assertEqual(
+            list(ArchiveSegment.objects.values_list('month', 'log_count', 'anomaly_count')),
+            [(date(2024, 2, 1), 2, 1), (date(2024, 1, 1), 2, 0)]
+        )
+        self.assertEqual(archive_logs(self.cutoff)['logs'], 0)
+
+        self.assertEqual(get_counters(), before)
+        rebuild_counters()
+        self.assertEqual(get_counters(), before)
+
+    def test_interrupted_batch_resumes(self):
+        """Test rows copied but not yet deleted are finished by the next run"""
+        _copy_to_segments(self.old_logs[:2])
+        archive_logs(self.cutoff)
+
+        self.assertEqual(LogEntry.objects.count(), 1)
+        self.assertEqual(sum(ArchiveSegment.objects.values_list('log_count', flat=True)), 4)
+        self.assertEqual(sum(ArchiveSegment.objects.values_list('anomaly_count', flat=True)), 1)
+
+    def test_max_batches(self):
+        """Test a run can stop early and a later run continues"""
+        result = archive_logs(self.cutoff, batch_size=1, max_batches=2)
+        self.assertEqual(result['logs'], 2)
+        self.assertTrue(result['remaining'])
+        self.assertEqual(archive_logs(self.cutoff, batch_size=1)['logs'], 2)
+
+    def test_reads_reach_archive(self):
+        """Test log_details and api_log_detail find archived rows"""
+        from authentication.models import AdminUser
+        self.client.force_login(AdminUser.objects.create_user(username='admin', password='pw'))
+        archive_logs(self.cutoff)
+
+        response = self.client.get(reverse('dashboard:log_details'))
+        self.assertEqual([log.id for log in response.context['page_obj']], [self.new_log.id])
+
+        response = self.client.get(reverse('dashboard:log_details'), {'date_from': '2024-01-15T00:00', 'log_type': 'ERROR'})
+        self.assertEqual(
+            [log.id for log in response.context['page_obj']],
+            [log.id for log in self.old_logs[:3]]
+        )
+
+        # An end date alone reaches back through every archived month before it
+        response = self.client.get(reverse('dashboard:log_details'), {'date_to': '2024-02-10T00:00'})
+        self.assertEqual(
+            [log.id for log in response.context['page_obj']],
+            [log.id for log in self.old_logs[1:]]
+        )
+
+        data = self.client.get(reverse('dashboard:api_log_detail', args=[self.old_logs[0].id])).json()
+        self.assertEqual(data['log']['log_message'], 'old 0')
+        self.assertEqual(len(data['anomalies']), 1)
+
+    def test_rebuild_rollups_includes_archive(self):
+        """Test rebuilding rollups still counts archived logs"""
+        archive_logs(self.cutoff)
+        rebuild_rollups(batch_days=30)
+        total = LogRollup.objects.filter(resolution='day').aggregate(total=Sum('log_count'))['total']
+        self.assertEqual(total, 5)
+
+
+class PurgeTests(TestCase):
+    """Test chunked bulk deletes of logs and anomalies"""
+
+    def setUp(self):
+        cache.clear()
+        now = timezone.now()
+        for i in range(20):
+            log = LogEntry.objects.create(
+                host_ip=f'10.0.0.{i % 2}', log_message='x', log_type=['INFO', 'ERROR'][i % 2],
+                source=['apache', 'linux'][i % 2], timestamp=now - timedelta(hours=i)
+            )
+            if i % 3 == 0:
+                Anomaly.objects.create(log_entry=log, anomaly_score=0.6, acknowledged=i == 0)
+
+    def assert_aggregates_match_rebuild(self):
+        fields = ('resolution', 'bucket', 'log_type', 'source', 'host_ip', 'log_count', 'anomaly_count')
+        rollups = sorted(LogRollup.objects.values_list(*fields))
+        counters = get_counters()
+        rebuild_rollups()
+        rebuild_counters()
+        self.assertEqual(rollups, sorted(LogRollup.objects.values_list(*fields)))
+        self.assertEqual(counters, get_counters())
+
+    def test_filtered_purge_keeps_aggregates_exact(self):
+        """Test that a per-source purge deletes in chunks and decrements rollups and counters"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        calls = []
+        with CaptureQueriesContext(connection) as queries:
+            deleted = purge_logs(source='linux', chunk_size=3, progress=lambda *totals: calls.append(totals))
+        rollup_deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE FROM "dashboard_logrollup"')]
+        self.assertGreater(len(rollup_deletes), 1)
+        # Emptied rollups go in id chunks, not one DELETE ... WHERE over the table
+        self.assertTrue(all(' IN (' in sql and sql.count(',') <= 2 for sql in rollup_deletes))
+
+        self.assertEqual(deleted, {'logs': 10, 'anomalies': 3})
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(calls[-1], (10, 3))
+        self.assertFalse(LogEntry.objects.filter(source='linux').exists())
+        self.assertEqual(LogEntry.objects.count(), 10)
+        self.assertEqual(get_counters()['total_logs'], 10)
+        self.assertFalse(LogRollup.objects.filter(source='linux').exists())
+        self.assert_aggregates_match_rebuild()
+
+    def test_time_range_purge(self):
+        """Test that --after/--before delete only logs inside the range"""
+        start = timezone.now() - timedelta(hours=10, minutes=30)
+        end = timezone.now() - timedelta(hours=4, minutes=30)
+        expected = LogEntry.objects.filter(timestamp__gte=start, timestamp__lt=end).count()
+
+        out = io.StringIO()
+        call_command(
+            'clear_logs', '--yes', '--after', start.isoformat(), '--before', end.isoformat(),
+            '--chunk-size', '2', stdout=out
+        )
+
+        self.assertEqual(LogEntry.objects.count(), 20 - expected)
+        self.assertFalse(LogEntry.objects.filter(timestamp__gte=start, timestamp__lt=end).exists())
+        self.assertIn(f'{expected}/{expected} logs', out.getvalue())
+        self.assert_aggregates_match_rebuild()
+
+    def test_full_clear(self):
+        """Test that clear_logs without filters empties logs, anomalies and aggregates"""
+        call_command('clear_logs', '--yes', stdout=io.StringIO())
+
+        self.assertFalse(LogEntry.objects.exists())
+        self.assertFalse(Anomaly.objects.exists())
+        self.assertFalse(LogRollup.objects.exists())
+        self.assertEqual(get_counters()['total_logs'], 0)
+
+
+class SyntheticDataTests(TestCase):
+    """Test the high-volume synthetic data generator"""
+
+    def setUp(self):
+        cache.clear()
+        self.config = build_config(
+            logs=600, metrics=50, days=7, hosts=20, bursts=2, burst_share=0.05,
+            batch_size=200, seed=3, end=timezone.now(),
+        )
+
+    def test_generates_every_table_with_exact_aggregates(self):
+        """Test that generated rows are counted in the rollups and counters"""
+        from api.models import Alert, SystemMetric
+
+        progress = []
+        totals = generate(self.config, progress=lambda totals, elapsed: progress.append(dict(totals)))
+
+        self.assertEqual(LogEntry.objects.count(), 600)
+        self.assertEqual(Anomaly.objects.count(), totals['anomalies'])
+        self.assertGreater(totals['anomalies'], 0)
+        self.assertEqual(Alert.objects.count(), 2)
+        self.assertEqual(SystemMetric.objects.count(), 50)
+        self.assertEqual(progress[-1], totals)
+        self.assertFalse(LogEntry.objects.filter(ip_numeric__isnull=True).exists())
+
+        start = self.config['end'] - timedelta(days=7)
+        self.assertFalse(LogEntry.objects.filter(timestamp__lt=start).exists())
+        self.assertFalse(LogEntry.objects.filter(timestamp__gt=self.config['end']).exists())
+
+        counters = get_counters()
+        self.assertEqual(counters['total_logs'], 600)
+        rebuild_counters()
+        self.assertEqual(get_counters(), counters)
+
+    def test_same_seed_same_rows(self):
+        """Test that a seed reproduces the same dataset"""
+        fields = ('timestamp', 'host_ip', 'source', 'log_type', 'log_message')
+        anomaly_fields = ('detected_at', 'anomaly_score', 'log_entry__timestamp')
+        generate(self.config)
+        first = sorted(LogEntry.objects.values_list(*fields))
+        first_anomalies = sorted(Anomaly.objects.values_list(*anomaly_fields))
+        self.assertTrue(all(detected_at == timestamp for detected_at, _, timestamp in first_anomalies))
+        LogEntry.objects.all().delete()
+
+        generate(self.config)
+        self.assertEqual(sorted(LogEntry.objects.values_list(*fields)), first)
+        self.assertEqual(sorted(Anomaly.objects.values_list(*anomaly_fields)), first_anomalies)
+
+    def test_command_prints_end_to_reproduce(self):
+        """Test that rerunning the command with the --end it printed rebuilds the same rows"""
+        fields = ('timestamp', 'host_ip', 'source', 'log_type', 'log_message')
+        args = ['--logs', '100', '--metrics', '5', '--days', '2', '--hosts', '5', '--bursts', '1', '--seed', '7']
+        out = io.StringIO()
+        call_command('generate_synthetic_data', *args, stdout=out)
+        end = re.search(r'--end (\S+?)\.\.\.', out.getvalue()).group(1)
+        first = sorted(LogEntry.objects.values_list(*fields))
+        LogEntry.objects.all().delete()
+
+        call_command('generate_synthetic_data', *args, '--end', end, stdout=io.StringIO())
+        self.assertEqual(sorted(LogEntry.objects.values_list(*fields)), first)
+
+    def test_parse_weights(self):
+        """Test parsing of --sources/--log-types weight specs"""
+        self.assertEqual(parse_weights('apache:4, linux'), {'apache': 4.0, 'linux': 1.0})
+        with self.assertRaises(ValueError):
+            parse_weights('apache:-1')
+        with self.assertRaises(ValueError):
+            parse_weights(',')
+
+
+class EventStreamTests(TestCase):
+    """Test the Server-Sent Events stream behind the overview page"""
+
+    def setUp(self):
+        cache.clear()
+        self.log = LogEntry.objects.create(host_ip='10.0.0.1', log_message='seen', log_type='ERROR')
+        self.seen = Anomaly.objects.create(log_entry=self.log, anomaly_score=0.7)
+
+    def parse_events(self, frames):
+        events = []
+        for frame in frames:
+            fields = dict(line.split(': ', 1) for line in frame.strip().split('\n') if line and not line.startswith(':'))
+            if 'data' in fields:
+                events.append((fields.get('event'), fields.get('id'), json.loads(fields['data'])))
+        return events
+
+    def test_sends_only_new_anomalies_and_stats(self):
+        """Test that the stream replays anomalies after the resume id, then stats"""
+        log = LogEntry.objects.create(host_ip='10.0.0.2', log_message='new one', log_type='ERROR')
+        new = Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        events = self.parse_events(event_stream(last_id=self.seen.id, max_seconds=0))
+
+        self.assertEqual([(event, event_id) for event, event_id, _ in events], [
+            ('anomaly', str(new.id)), ('stats', None),
+        ])
+        self.assertIn('new one', events[0][2]['html'])
+        self.assertIn(f'data-anomaly-id="{new.id}"', events[0][2]['html'])
+        self.assertEqual(events[1][2], {
+            'total_logs': 2, 'total_anomalies': 2, 'delta': {'total_logs': 0, 'total_anomalies': 0},
+        })
+
+    def test_idle_stream_reads_only_the_totals(self):
+        """Test that ticks without a data change cost two small queries"""
+        stream = event_stream(poll_interval=0, max_seconds=3600, heartbeat=0)
+        self.assertTrue(next(stream).startswith('retry:'))
+        self.assertEqual(self.parse_events([next(stream)])[0][0], 'stats')
+        self.assertEqual(next(stream), ': keepalive\n\n')
+
+        with self.assertNumQueries(2):
+            self.assertEqual(next(stream), ': keepalive\n\n')
+        stream.close()
+
+    def test_sees_writes_without_a_cache_bump(self):
+        """Test that changes are detected from the database, e.g. writes by another process"""
+        stream = event_stream(poll_interval=0, max_seconds=3600, heartbeat=3600)
+        next(stream)
+        next(stream)
+
+        # The test transaction never commits, so the cached data version
+        # stays put, as it does for writes made by another process
+        version = get_data_version()
+        log = LogEntry.objects.create(host_ip='10.0.0.3', log_message='elsewhere', log_type='ERROR')
+        anomaly = Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+        self.assertEqual(get_data_version(), version)
+
+        events = self.parse_events([next(stream), next(stream)])
+        self.assertEqual([(event, event_id) for event, event_id, _ in events], [
+            ('anomaly', str(anomaly.id)), ('stats', None),
+        ])
+        self.assertEqual(events[1][2]['delta'], {'total_logs': 1, 'total_anomalies': 1})
+        stream.close()
+
+    def test_concurrent_streams_are_capped(self):
+        """Test that clients over DASHBOARD_STREAM_MAX_CLIENTS get a 503 until a stream closes"""
+        from authentication.models import AdminUser
+        self.client.force_login(AdminUser.objects.create_user(username='admin', password='pw'))
+
+        with override_settings(DASHBOARD_STREAM_MAX_CLIENTS=1):
+            first = self.client.get(reverse('dashboard:dashboard_stream'))
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(self.client.get(reverse('dashboard:dashboard_stream')).status_code, 503)
+
+            first.close()
+            second = self.client.get(reverse('dashboard:dashboard_stream'))
+            self.assertEqual(second.status_code, 200)
+            second.close()
+
+    def test_view_resumes_from_last_event_id(self):
+        """Test that the view honours Last-Event-ID and rejects bad ids"""
+        from authentication.models import AdminUser
+        self.client.force_login(AdminUser.objects.create_user(username='admin', password='pw'))
+        log = LogEntry.objects.create(host_ip='10.0.0.2', log_message='y', log_type='ERROR')
+        new = Anomaly.objects.create(log_entry=log, anomaly_score=0.9)
+
+        with override_settings(DASHBOARD_STREAM_MAX_SECONDS=0):
+            response = self.client.get(reverse('dashboard:dashboard_stream'), HTTP_LAST_EVENT_ID=str(self.seen.id))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            events = self.parse_events(b''.join(response.streaming_content).decode().split('\n\n'))
+        self.assertEqual([event_id for event, event_id, _ in events if event == 'anomaly'], [str(new.id)])
+
+        response = self.client.get(reverse('dashboard:dashboard_stream'), {'last_event_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_asgi_stream_sends_frames_as_they_are_produced(self):
+        """Test that under ASGI the first anomaly arrives without waiting for the stream to end"""
+        from contextlib import aclosing
+        from asgiref.sync import sync_to_async
+        from authentication.models import AdminUser
+        from .stream import stream_limit
+
+        user = await sync_to_async(AdminUser.objects.create_user)(username='admin', password='pw')
+        await self.async_client.aforce_login(user)
+
+        with override_settings(DASHBOARD_STREAM_POLL_INTERVAL=0.01, DASHBOARD_STREAM_MAX_SECONDS=300):
+            response = await self.async_client.get(
+                reverse('dashboard:dashboard_stream'), headers={'Last-Event-ID': str(self.seen.id - 1)},
+            )
+            self.assertTrue(response.is_async)
+            # Consumed the way ASGIHandler.send_response does
+            async with aclosing(aiter(response)) as content:
+                frames = [await asyncio.wait_for(anext(content), timeout=10) for _ in range(2)]
+            await sync_to_async(response.close)()
+
+        self.assertTrue(frames[0].startswith(b'retry:'))
+        events = self.parse_events([frames[1].decode()])
+        self.assertEqual(events[0][:2], ('anomaly', str(self.seen.id)))
+        self.assertEqual(stream_limit.open, 0)
+
+    def test_format_event(self):
+        """Test SSE frame formatting"""
+        self.assertEqual(format_event({'a': 1}, event='stats', event_id=5), 'id: 5\nevent: stats\ndata: {"a":1}\n\n')
+
+
+class DynamicThresholdTests(TestCase):
+    """Test the threshold the Kafka worker recomputes from recent scores"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = str(Path(self.dir.name) / 'threshold.pkl')
+        self.now = 0.0
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def clock(self):
+        return self.now
+
+    def test_moves_to_best_candidate_and_persists(self):
+        """Test that a strictly better threshold is taken after the interval and saved"""
+        threshold = DynamicThreshold(0.5, interval=60, path=self.path, clock=self.clock)
+        threshold.observe([0.1, 0.2, 0.55, 0.58, 0.9, 0.95])
+        self.assertEqual(threshold.threshold, 0.5)
+
+        # A threshold reloaded from elsewhere misses two of the window's anomalies
+        threshold.threshold = 0.6
+        self.now = 61
+        with self.assertLogs('dashboard.dynamic_threshold', 'INFO'):
+            threshold.observe([])
+        self.assertEqual(threshold.threshold, 0.2)
+        self.assertEqual(DynamicThreshold.load(0.5, path=self.path).threshold, 0.2)
+
+    def test_stationary_scores_keep_the_threshold(self):
+        """Test that a self-labelled window does not ratchet the threshold down"""
+        rng = random.Random(5)
+        threshold = DynamicThreshold(0.5, window_size=1000, interval=60, path=self.path, clock=self.clock)
+        for _ in range(500):
+            self.now += 60
+            threshold.observe([rng.betavariate(2, 5) for _ in range(50)])
+
+        self.assertEqual(threshold.threshold, 0.5)
+        self.assertFalse(Path(self.path).exists())
+
+    def test_needs_both_sides(self):
+        """Test that a window without abnormal scores leaves the threshold alone"""
+        threshold = DynamicThreshold(0.5, interval=0, path=self.path, clock=self.clock)
+        threshold.observe([0.1, 0.2])
+        self.assertEqual(threshold.threshold, 0.5)
+        self.assertFalse(Path(self.path).exists())
+
+    def test_load_falls_back_to_default(self):
+        """Test that a missing or unreadable threshold file gives the default"""
+        self.assertEqual(DynamicThreshold.load(0.42, path=self.path).threshold, 0.42)
+        with open(self.path, 'w') as f:
+            f.write('not a pickle')
+        self.assertEqual(DynamicThreshold.load(0.42, path=self.path).threshold, 0.42)
+
+
+class MicroBatchingTests(TestCase):
+    """Test the micro-batcher in front of model inference"""
+
+    def setUp(self):
+        self.calls = []
+
+    def predict(self, items):
+        self.calls.append(len(items))
+        time.sleep(0.01)  # stands in for a forward pass
+        return [item * 2 for item in items]
+
+    def test_concurrent_requests_share_batches(self):
+        """Test that concurrent single requests are coalesced and answered in order"""
+        batcher = MicroBatcher(self.predict, max_batch_size=8, max_wait=0.05)
+        results = {}
+
+        def client(n):
+            results[n] = batcher.submit(n).result(timeout=5)
+
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(batcher.map(range(5)), [0, 2, 4, 6, 8])
+        batcher.close(timeout=5)
+
+        self.assertEqual(results, {n: n * 2 for n in range(40)})
+        self.assertLess(len(self.calls), 45)
+        self.assertLessEqual(max(self.calls), 8)
+
+        stats = batcher.stats()
+        self.assertEqual(stats['items'], 45)
+        self.assertEqual(sum(size * count for size, count in stats['batch_sizes'].items()), 45)
+        self.assertGreater(stats['mean_batch_size'], 1)
+        self.assertGreaterEqual(stats['latency_ms']['p99'], stats['latency_ms']['p50'])
+        self.assertGreater(stats['forward_ms']['p50'], 0)
+
+    def test_lone_request_flushed_after_max_wait(self):
+        """Test that a single request is not held for a full batch"""
+        batcher = MicroBatcher(self.predict, max_batch_size=32, max_wait=0.01)
+        self.assertEqual(batcher.submit(21).result(timeout=1), 42)
+        self.assertEqual(self.calls, [1])
+        batcher.close(timeout=5)
+        with self.assertRaises(RuntimeError):
+            batcher.submit(1)
+
+    def test_failed_batch_fails_every_request(self):
+        """Test that a predict error reaches every future in the batch"""
+        def broken(items):
+            raise ValueError('model exploded')
+
+        batcher = MicroBatcher(broken, max_batch_size=4, max_wait=0.05)
+        with self.assertLogs('dashboard.batching', level='ERROR'):
+            futures = batcher.submit_many([1, 2, 3])
+            for future in futures:
+                with self.assertRaisesMessage(ValueError, 'model exploded'):
+                    future.result(timeout=5)
+            batcher.close(timeout=5)
+        self.assertEqual(batcher.stats()['errors'], 1)
+
+    def test_threads_run_batches_in_parallel(self):
+        """Test that several schedulers take batches from one queue concurrently"""
+        lock = threading.Lock()
+        running = [0, 0]  # now, peak
+
+        def slow(items):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return items
+
+        batcher = MicroBatcher(slow, max_batch_size=4, max_wait=0.01, threads=4)
+        self.assertEqual(batcher.map(range(16), timeout=5), list(range(16)))
+        batcher.close(timeout=5)
+        self.assertGreater(running[1], 1)
+        self.assertEqual(batcher.stats()['threads'], 4)
+
+    def test_pool_threads_per_worker(self):
+        """Test that pool workers split the cores between them"""
+        with patch('os.cpu_count', return_value=8):
+            self.assertEqual([default_threads(n) for n in (1, 2, 3, 16)], [8, 4, 2, 1])
+
+    def test_percentiles(self):
+        """Test nearest-rank percentiles"""
+        self.assertEqual(percentiles(range(1, 101)), {'p50': 50, 'p90': 90, 'p99': 99, 'max': 100})
+        self.assertEqual(percentiles([]), {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0})
+
+
+class ScoreCacheTests(TestCase):
+    """Test the template-keyed score cache in front of the model"""
+
+    def setUp(self):
+        self.calls = []
+
+    def predict(self, messages):
+        self.calls.append(list(messages))
+        return [len(message) / 100 for message in messages]
+
+    def test_normalize_message(self):
+        """Test that variable parts are masked and the rest of the template kept"""
+        self.assertEqual(
+            normalize_message('sshd[4121]: Failed password for root from 10.1.2.3 port 52231 ssh2'),
+            'sshd[<NUM>]: Failed password for root from <IP> port <NUM> ssh2',
+        )
+        self.assertEqual(
+            normalize_message('GET /api/v1/users/42  HTTP/1.1 200'),
+            'GET <PATH> HTTP/<NUM> <NUM>',
+        )
+        self.assertEqual(
+            normalize_message('job 550e8400-e29b-41d4-a716-446655440000 at 0x7ffe12 from 10.0.0.1:8080'),
+            'job <HEX> at <HEX> from <IP>',
+        )
+
+    def test_scores_each_template_once(self):
+        """Test that only unseen templates reach the model"""
+        cache = ScoreCache(max_size=10)
+        first = cache.score(['user 1 login', 'user 2 login', 'disk full'], self.predict)
+        second = cache.score(['user 99 login', 'disk full'], self.predict)
+
+        self.assertEqual(self.calls, [['user 1 login', 'disk full']])
+        self.assertEqual(first, [0.12, 0.12, 0.09])
+        self.assertEqual(second, [0.12, 0.09])
+        self.assertEqual(cache.stats(), {
+            'size': 2, 'max_size': 10, 'hits': 2, 'misses': 3, 'evictions': 0, 'hit_rate': 0.4,
+        })
+
+    def test_lru_eviction(self):
+        """Test that the least recently used template is evicted"""
+        cache = ScoreCache(max_size=2)
+        cache.score(['a'], self.predict)
+        cache.score(['b'], self.predict)
+        cache.score(['a'], self.predict)  # b is now the oldest
+        cache.score(['c'], self.predict)
+        cache.score(['a', 'b'], self.predict)
+        self.assertEqual(self.calls, [['a'], ['b'], ['c'], ['b']])
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_failed_prediction_is_not_cached(self):
+        """Test that model errors propagate and leave the cache untouched"""
+        def broken(messages):
+            raise RuntimeError('no model')
+
+        cache = ScoreCache()
+        with self.assertRaises(RuntimeError):
+            cache.score(['x'], broken)
+        self.assertEqual(len(cache), 0)
+
+    def test_persistence(self):
+        """Test that a saved cache is reloaded, unless it was for another model"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'scores.json'
+            cache = ScoreCache(path=str(path), model_key='v1')
+            cache.score(['user 1 login'], self.predict)
+            self.assertTrue(cache.save())
+
+            warm = ScoreCache(path=str(path), model_key='v1')
+            self.assertEqual(warm.score(['user 7 login'], self.predict), [0.12])
+            self.assertEqual(len(self.calls), 1)
+
+            with self.assertLogs('dashboard.score_cache', level='INFO'):
+                self.assertEqual(len(ScoreCache(path=str(path), model_key='v2')), 0)
+                path.write_text('not json')
+                self.assertEqual(len(ScoreCache(path=str(path), model_key='v1')), 0)
+
+
+class InferenceBackendTests(TestCase):
+    """Test the backend-independent parts of the inference backends"""
+
+    def test_parity(self):
+        """Test score comparison against the fp32 reference"""
+        result = parity([0.1, 0.49, 0.9], [0.1, 0.51, 0.895], tolerance=0.05)
+        self.assertEqual(result['messages'], 3)
+        self.assertAlmostEqual(result['max_abs_diff'], 0.02)
+        self.assertEqual(result['flipped'], 1)
+        self.assertTrue(result['ok'])
+        self.assertFalse(parity([0.1], [0.2], tolerance=0.05)['ok'])
+        with self.assertRaises(ValueError):
+            parity([0.1, 0.2], [0.1])
+
+    def test_unknown_backend(self):
+        """Test that a bad MODEL_BACKEND fails before importing anything"""
+        with self.assertRaisesMessage(ValueError, "Unknown model backend 'fp16'"):
+            load_backend('fp16')
+
+    def test_missing_export(self):
+        """Test that an exported backend without its file points at export_model"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaisesMessage(FileNotFoundError, 'manage.py export_model --format onnx'):
+                load_backend('onnx', export_dir=tmp)
+
+    def test_holdout_messages(self):
+        """Test that the parity sample has one message per template and skips trace inputs"""
+        for message in [
+            'user 1 logged in', 'user 2 logged in', 'disk /dev/sda1 full',
+            'Database query executed in 9.1 seconds',
+        ]:
+            LogEntry.objects.create(host_ip='10.0.0.1', log_message=message, log_type='INFO')
+        self.assertEqual(holdout_messages(10), ['disk /dev/sda1 full', 'user 2 logged in'])
+        self.assertEqual(holdout_messages(1), ['disk /dev/sda1 full'])
+
+
+class FakeBackend:
+    tensor_type = 'pt'
+
+    def predict(self, inputs):
+        return [len(message) / 10 for message in inputs['messages']]
+
+
+@override_settings(MODEL_BACKEND='eager', MODEL_BATCHING_ENABLED=False, MODEL_SCORE_CACHE_ENABLED=False)
+class ModelLoadingTests(TestCase):
+    """Test lazy and background loading in ModelManager"""
+
+    def setUp(self):
+        # A fresh singleton per test, with the heavy loaders replaced
+        patcher = patch.object(ModelManager, '_instance', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.release.set()
+        self.loaders = {
+            'load_tokenizer': patch(
+                'dashboard.inference.load_tokenizer',
+                return_value=lambda messages, **kwargs: {'messages': messages},
+            ),
+            'load_fp32_model': patch('dashboard.inference.load_fp32_model', side_effect=self.load_model),
+            'load_backend': patch('dashboard.inference.load_backend', return_value=FakeBackend()),
+        }
+        self.mocks = {name: loader.start() for name, loader in self.loaders.items()}
+        for loader in self.loaders.values():
+            self.addCleanup(loader.stop)
+
+    def load_model(self):
+        self.release.wait(5)
+        return object()
+
+    def test_nothing_loaded_until_first_prediction(self):
+        """Test that constructing the manager is free and predicting loads the model"""
+        manager = ModelManager()
+        self.assertEqual(manager.state, UNLOADED)
+        self.assertFalse(manager.is_loaded())
+        self.mocks['load_tokenizer'].assert_not_called()
+
+        self.assertEqual(manager.predict_batch(['abcde', 'ab']), [0.5, 0.2])
+        self.assertEqual(manager.status()['state'], READY)
+        self.assertIsNotNone(manager.status()['load_seconds'])
+        manager.predict_single('x')
+        self.assertEqual(self.mocks['load_fp32_model'].call_count, 1)
+
+    def test_background_load(self):
+        """Test that load_in_background returns at once and callers can wait for readiness"""
+        self.release.clear()
+        manager = ModelManager()
+        manager.load_in_background()
+        manager.load_in_background()  # already under way: no second load
+        time.sleep(0.05)
+        self.assertEqual(manager.state, LOADING)
+        self.assertFalse(manager.ensure_loaded(timeout=0.01))
+
+        self.release.set()
+        self.assertTrue(manager.ensure_loaded(timeout=5))
+        self.assertEqual(self.mocks['load_fp32_model'].call_count, 1)
+
+    def test_failed_load(self):
+        """Test that a load error is reported and predictions fall back to defaults"""
+        self.mocks['load_tokenizer'].side_effect = ImportError('No module named transformers')
+        manager = ModelManager()
+        self.assertEqual(manager.predict_batch(['a', 'b']), [0.5, 0.5])
+        self.assertEqual(manager.status()['state'], FAILED)
+        self.assertIn('transformers', manager.status()['error'])
+
+    def test_worker_pool(self):
+        """Test that MODEL_INFERENCE_WORKERS scores through the pool with one scheduler per worker"""
+        class FakePool:
+            def __init__(self, workers, threads_per_worker=None):
+                self.workers = workers
+
+            def predict_batch(self, messages):
+                return [0.9] * len(messages)
+
+        with override_settings(MODEL_INFERENCE_WORKERS=3, MODEL_BATCHING_ENABLED=True), \
+                patch('dashboard.ml_utils.InferencePool', FakePool):
+            manager = ModelManager()
+            self.assertEqual(manager.predict_batch(['a', 'b']), [0.9, 0.9])
+            self.assertEqual(manager.status()['workers'], 3)
+            self.assertEqual(manager.batching_stats()['threads'], 3)
+            manager.get_batcher().close(timeout=5)
+        self.mocks['load_tokenizer'].assert_not_called()
+
+
+class ThresholdSweepTests(TestCase):
+    """Test the vectorized anomaly threshold sweep"""
+
+    def brute_force(self, normal, abnormal, thresholds):
+        best = None
+        for threshold in sorted(thresholds):
+            fp = sum(1 for s in normal if s > threshold)
+            tp = sum(1 for s in abnormal if s > threshold)
+            if tp == 0:
+                continue
+            precision = tp / (tp + fp)
+            recall = tp / len(abnormal)
+            f1 = 2 * precision * recall / (precision + recall)
+            if best is None or f1 > best[1]:
+                best = (threshold, f1, tp, fp)
+        return best
+
+    def test_matches_brute_force_over_every_score(self):
+        """Test that the sweep finds the same best threshold as checking each one"""
+        rng = random.Random(7)
+        normal = [rng.betavariate(2, 5) for _ in range(300)]
+        abnormal = [rng.betavariate(5, 2) for _ in range(100)]
+
+        sweep = threshold_sweep(normal, abnormal)
+        threshold, f1, tp, fp = self.brute_force(normal, abnormal, set(normal + abnormal))
+        self.assertEqual(sweep['best']['threshold'], threshold)
+        self.assertAlmostEqual(sweep['best']['f1'], f1)
+        self.assertEqual((sweep['best']['tp'], sweep['best']['fp']), (tp, fp))
+        self.assertEqual(sweep['best']['tn'] + sweep['best']['fp'], 300)
+        self.assertEqual(len(sweep['thresholds']), len(set(normal + abnormal)))
+        self.assertEqual(len(sweep['f1']), len(sweep['thresholds']))
+
+    def test_curves(self):
+        """Test precision/recall/F1 at each threshold (scores strictly above count)"""
+        sweep = threshold_sweep([0.1, 0.4], [0.4, 0.8])
+        self.assertEqual(sweep['thresholds'].tolist(), [0.1, 0.4, 0.8])
+        self.assertEqual(sweep['tp'].tolist(), [2, 1, 0])
+        self.assertEqual(sweep['fp'].tolist(), [1, 0, 0])
+        self.assertEqual(sweep['precision'].tolist(), [2 / 3, 1.0, 0.0])
+        self.assertEqual(sweep['recall'].tolist(), [1.0, 0.5, 0.0])
+        self.assertAlmostEqual(sweep['f1'][0], 0.8)
+        self.assertEqual(sweep['best']['threshold'], 0.1)
+
+    def test_grid_and_edge_cases(self):
+        """Test the fixed grid, ties and data with nothing to find"""
+        sweep = threshold_sweep([0.1, 0.2], [0.9], steps=11)
+        self.assertEqual(len(sweep['thresholds']), 11)
+        # 0.2 through 0.8 all separate perfectly: the lowest wins
+        self.assertAlmostEqual(sweep['best']['threshold'], 0.2)
+        self.assertEqual(sweep['best']['f1'], 1.0)
+
+        self.assertIsNone(find_best_threshold([0.1, 0.5], []))
+        self.assertIsNone(find_best_threshold([], []))
+        self.assertEqual(find_best_threshold([], [0.3, 0.6]), 0.3)
@@ -0,0 +1,96 @@
+"""
+Anomaly threshold sweep.
+
+``threshold_sweep`` scores every candidate threshold at once from sorted
+NumPy arrays: a message counts as an anomaly when its score is strictly
+above the threshold, so the true and false positives at threshold ``t``
+are the scores right of ``t`` in the sorted abnormal and normal arrays,
+found with one ``searchsorted`` per array. Sorting dominates, so the
+whole sweep is O(n log n) however many thresholds are tried.
+
+By default every distinct score in [0, 1] is a candidate (thresholds
+between two neighbouring scores behave like the lower one); ``steps``
+uses an evenly spaced grid over [0, 1] instead.
+
+``dynamic_threshold`` uses it to recalibrate the threshold the Kafka
+worker flags anomalies with. NumPy is listed in requirements.txt; like
+the model, this runs on the local side, not on the PythonAnywhere web app.
+"""
+import numpy as np
+
+
+def _as_sorted(scores):
+    return np.sort(np.asarray(scores, dtype=np.float64).ravel())
+
+
+def threshold_sweep(normal_scores, abnormal_scores, steps=None):
+    """
+    Precision/recall/F1 curves over the candidate thresholds, and the best point.
+
+    Returns ``{'thresholds', 'precision', 'recall', 'f1', 'tp', 'fp'}``
+    arrays (thresholds ascending) plus ``'best'``: the threshold with the
+    highest F1, the lowest one on ties, with its counts and metrics; None
+    when no threshold catches any abnormal score.
+    """
+    normal = _as_sorted(normal_scores)
+    abnormal = _as_sorted(abnormal_scores)
+
+    if steps:
+        thresholds = np.linspace(0.0, 1.0, steps)
+    else:
+        thresholds = np.unique(np.concatenate([normal, abnormal]))
+        thresholds = thresholds[(thresholds >= 0.0) & (thresholds <= 1.0)]
+
+    # Scores strictly above each threshold
+    fp = len(normal) - np.searchsorted(normal, thresholds, side='right')
+    tp = len(abnormal) - np.searchsorted(abnormal, thresholds, side='right')
+
+    flagged = tp + fp
+    precision = np.divide(tp, flagged, out=np.zeros(len(thresholds)), where=flagged > 0)
+    recall = tp / len(abnormal) if len(abnormal) else np.zeros(len(thresholds))
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros(len(thresholds)), where=total > 0)
+
+    best = None
+    if len(thresholds) and tp.max() > 0:
+        # argmax returns the first maximum: the lowest of equally good thresholds
+        i = int(np.argmax(np.where(tp > 0, f1, -1.0)))
+        best = {
+            'threshold': float(thresholds[i]),
+            'precision': float(precision[i]),
+            'recall': float(recall[i]),
+            'f1': float(f1[i]),
+            'tp': int(tp[i]),
+            'fp': int(fp[i]),
+            'tn': int(len(normal) - fp[i]),
+            'fn': int(len(abnormal) - tp[i]),
+        }
+
+    return {
+        'thresholds': thresholds,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'tp': tp,
+        'fp': fp,
+        'best': best,
+    }
+
+
+def threshold_f1(normal_scores, abnormal_scores, threshold):
+    """F1 of flagging the scores strictly above ``threshold``"""
+    normal = np.asarray(normal_scores, dtype=np.float64).ravel()
+    abnormal = np.asarray(abnormal_scores, dtype=np.float64).ravel()
+    tp = int(np.count_nonzero(abnormal > threshold))
+    fp = int(np.count_nonzero(normal > threshold))
+    if not tp:
+        return 0.0
+    precision = tp / (tp + fp)
+    recall = tp / len(abnormal)
+    return 2 * precision * recall / (precision + recall)
+
+
+def find_best_threshold(normal_scores, abnormal_scores, steps=None):
+    """The F1-maximising threshold, or None when no threshold catches an abnormal score"""
+    best = threshold_sweep(normal_scores, abnormal_scores, steps)['best']
+    return best['threshold'] if best else None
@@ -9,8 +9,10 @@ urlpatterns = [
     path('logs/', views.log_details, name='log_details'),
     path('partials/anomaly-feed/', views.anomaly_feed_partial, name='anomaly_feed_partial'),
     path('partials/stats/', views.dashboard_stats, name='dashboard_stats'),
+    path('stream/', views.dashboard_stream, name='dashboard_stream'),
     path('api/dashboard-data/', views.api_dashboard_data, name='api_dashboard_data'),
     path('api/anomaly-feed/', views.api_anomaly_feed, name='api_anomaly_feed'),
+    path('api/search/', views.api_log_search, name='api_log_search'),
     path('api/log/<int:log_id>/', views.api_log_detail, name='api_log_detail'),
     # New API endpoints for Streamlit
     path('api/streamlit/chart-data/', views.api_streamlit_chart_data, name='api_streamlit_chart_data'),
@@ -1,37 +1,68 @@
+import threading
+import time
 from django.core.cache import cache
-from django.db.models import Count, Case, When, IntegerField, Q
+from django.db import transaction
+from django.db.models import Count, Case, When, IntegerField, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
-from .models import LogEntry, Anomaly, SystemStatus
+from .models import LogEntry, Anomaly, SystemStatus, LogRollup
+from .counters import get_counters, log_type_count
+from .iputils import cidr_q
+from .rollups import rollup_queryset
+from .search import filter_by_message, filter_by_substring
 from django.conf import settings
 
 
+# Log/anomaly caches are keyed by a data version (generation counter).
+# Writes bump the version instead of deleting keys; entries written under
+# an older version are never read again and simply expire via their TTL.
+DATA_VERSION_KEY = 'log_data_version'
+
+_pending_bump = threading.local()
+
+# Log types broken out in the hourly chart (matched case-insensitively)
+CHART_LOG_TYPES = ('error', 'warning', 'info', 'debug')
+
+
+def get_data_version():
+    """Return the current log data version, seeding it if missing"""
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost key never reuses an old generation
+        cache.add(DATA_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def versioned_cache_key(name):
+    """Cache key for ``name`` under the current data version"""
+    return f'{name}_v{get_data_version()}'
+
+
+def bump_data_version():
+    """Start a new data generation, making every versioned cache entry stale"""
+    try:
+        cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        get_data_version()
+
+
 def get_cached_log_stats():
-    """Get log statistics with caching"""
-    cache_key = 'log_stats'
+    """Get log statistics from the global counters with caching"""
+    cache_key = versioned_cache_key('log_stats')
     stats = cache.get(cache_key)
     
     if stats is None:
-        # Single aggregation query instead of multiple counts
-        stats = LogEntry.objects.aggregate(
-            total_logs=Count('id'),
-            error_count=Count(Case(
-                When(log_type__iexact='ERROR', then=1),
-                output_field=IntegerField()
-            )),
-            warning_count=Count(Case(
-                When(log_type__iexact='WARNING', then=1),
-                output_field=IntegerField()
-            )),
-            info_count=Count(Case(
-                When(log_type__iexact='INFO', then=1),
-                output_field=IntegerField()
-            )),
-            debug_count=Count(Case(
-                When(log_type__iexact='DEBUG', then=1),
-                output_field=IntegerField()
-            ))
-        )
+        counters = get_counters()
+        stats = {
+            'total_logs': counters['total_logs'],
+            'total_anomalies': counters['total_anomalies'],
+            'unacknowledged_anomalies': counters['unacknowledged_anomalies'],
+            'error_count': log_type_count(counters, 'ERROR'),
+            'warning_count': log_type_count(counters, 'WARNING'),
+            'info_count': log_type_count(counters, 'INFO'),
+            'debug_count': log_type_count(counters, 'DEBUG'),
+        }
         
         # Cache for 5 minutes
         cache.set(cache_key, stats, getattr(settings, 'CACHE_TTL', {}).get('log_counts', 300))
@@ -41,7 +72,7 @@ def get_cached_log_stats():
 
 def get_cached_recent_anomalies(limit=10):
     """Get recent anomalies with caching and optimized query"""
-    cache_key = f'recent_anomalies_{limit}'
+    cache_key = versioned_cache_key(f'recent_anomalies_{limit}')
     anomalies = cache.get(cache_key)
     
     if anomalies is None:
@@ -67,31 +98,38 @@ def get_cached_recent_anomalies(limit=10):
 
 
 def get_cached_hourly_chart_data(hours=24):
-    """Get hourly chart data with database aggregation and caching"""
-    cache_key = f'hourly_chart_data_{hours}'
+    """Get hourly chart data from the hour rollups with caching"""
+    cache_key = versioned_cache_key(f'hourly_chart_data_{hours}')
     data = cache.get(cache_key)
     
     if data is None:
-        from django.db.models.functions import TruncHour
-        
         end_time = timezone.now()
         start_time = end_time - timedelta(hours=hours)
         
-        # Use database aggregation instead of Python loops
-        hourly_data = LogEntry.objects.filter(
-            timestamp__range=(start_time, end_time)
-        ).annotate(
-            hour=TruncHour('timestamp')
-        ).values('hour').annotate(
-            total_logs=Count('id'),
-            error_logs=Count(Case(When(log_type='error', then=1))),
-            warning_logs=Count(Case(When(log_type='warning', then=1))),
-            info_logs=Count(Case(When(log_type='info', then=1))),
-            debug_logs=Count(Case(When(log_type='debug', then=1)))
-        ).order_by('hour')
-        
-        # Convert to list for caching
-        data = list(hourly_data)
+        rows = rollup_queryset(start_time, end_time, 'hour')\
+            .values('bucket', 'log_type')\
+            .annotate(count=Sum('log_count'))\
+            .order_by('bucket')
+        
+        # Fold per-log_type rows into one entry per hour
+        hourly_data = {}
+        for row in rows:
+            item = hourly_data.get(row['bucket'])
+            if item is None:
+                item = hourly_data[row['bucket']] = {
+                    'hour': row['bucket'],
+                    'total_logs': 0,
+                    'error_logs': 0,
+                    'warning_logs': 0,
+                    'info_logs': 0,
+                    'debug_logs': 0,
+                }
+            item['total_logs'] += row['count']
+            log_type = row['log_type'].lower()
+            if log_type in CHART_LOG_TYPES:
+                item[f'{log_type}_logs'] += row['count']
+        
+        data = [item for item in hourly_data.values() if item['total_logs'] > 0]
         
         # Cache for 10 minutes
         cache.set(cache_key, data, getattr(settings, 'CACHE_TTL', {}).get('chart_data', 600))
@@ -99,35 +137,58 @@ def get_cached_hourly_chart_data(hours=24):
     return data
 
 
-def get_optimized_filtered_logs(host_ip=None, log_type=None, date_from=None, date_to=None):
-    """Get filtered logs with optimized query"""
+def parse_filter_datetime(value):
+    """Parse a date/datetime-local filter value; returns None if invalid"""
+    if not value:
+        return None
+    try:
+        from datetime import datetime
+        parsed = datetime.fromisoformat(value.replace('T', ' '))
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_optimized_filtered_logs(host_ip=None, log_type=None, date_from=None, date_to=None,
+                                source=None, query=None, cidr=None, using=None):
+    """Get filtered logs with optimized query
+    
+    ``host_ip``/``source`` are substring matches served by the trigram index,
+    ``query`` is a full-text message search (see dashboard.search) and
+    ``cidr`` is a subnet range scan on ip_numeric. Raises SearchQueryError
+    or InvalidCIDR for invalid values. ``using`` selects a database alias,
+    e.g. an archive segment (see dashboard.archive).
+    """
     # Start with base queryset
-    logs = LogEntry.objects.all()
+    logs = LogEntry.objects.using(using)
     
-    # Build filters efficiently
-    filters = Q()
+    if cidr:
+        logs = logs.filter(cidr_q(cidr))
     
     if host_ip:
-        filters &= Q(host_ip__icontains=host_ip)
+        logs = filter_by_substring(logs, 'host_ip', host_ip)
+    
+    if source:
+        logs = filter_by_substring(logs, 'source', source)
+    
+    if query:
+        logs = filter_by_message(logs, query)
+    
+    # Build filters efficiently
+    filters = Q()
     
     if log_type:
         filters &= Q(log_type=log_type)
     
-    if date_from:
-        try:
-            from datetime import datetime
-            from_datetime = datetime.fromisoformat(date_from.replace('T', ' '))
-            filters &= Q(timestamp__gte=from_datetime)
-        except ValueError:
-            pass
-    
-    if date_to:
-        try:
-            from datetime import datetime
-            to_datetime = datetime.fromisoformat(date_to.replace('T', ' '))
-            filters &= Q(timestamp__lte=to_datetime)
-        except ValueError:
-            pass
+    from_datetime = parse_filter_datetime(date_from)
+    if from_datetime:
+        filters &= Q(timestamp__gte=from_datetime)
+    
+    to_datetime = parse_filter_datetime(date_to)
+    if to_datetime:
+        filters &= Q(timestamp__lte=to_datetime)
     
     # Apply filters and order
     if filters:
@@ -136,34 +197,80 @@ def get_optimized_filtered_logs(host_ip=None, log_type=None, date_from=None, dat
     return logs.order_by('-timestamp')
 
 
+def estimate_filtered_log_stats(host_ip=None, log_type=None, date_from=None, date_to=None,
+                                source=None, cidr=None):
+    """
+    Estimate log counts for the log_details filters from the rollups.
+    
+    Uses the same filters as get_optimized_filtered_logs. Date ranges are
+    widened to whole rollup buckets, so totals are approximate at the edges.
+    """
+    from_datetime = parse_filter_datetime(date_from)
+    to_datetime = parse_filter_datetime(date_to)
+    
+    if from_datetime or to_datetime:
+        rollups = rollup_queryset(
+            from_datetime or timezone.now() - timedelta(days=3650),
+            to_datetime or timezone.now(),
+        )
+    else:
+        rollups = LogRollup.objects.filter(resolution='day')
+    
+    if host_ip:
+        rollups = rollups.filter(host_ip__icontains=host_ip)
+    if source:
+        rollups = rollups.filter(source__icontains=source)
+    if cidr:
+        rollups = rollups.filter(cidr_q(cidr))
+    if log_type:
+        rollups = rollups.filter(log_type=log_type)
+    
+    stats = {
+        'total_logs': 0,
+        'error_count': 0,
+        'warning_count': 0,
+        'info_count': 0,
+        'debug_count': 0,
+    }
+    for row in rollups.values('log_type').annotate(count=Sum('log_count')).order_by():
+        stats['total_logs'] += row['count']
+        row_type = row['log_type'].lower()
+        if row_type in CHART_LOG_TYPES:
+            stats[f'{row_type}_count'] += row['count']
+    return stats
+
+
 def get_cached_log_distributions(hours=24):
-    """Get log type and source distributions with caching"""
-    cache_key = f'log_distributions_{hours}'
+    """Get log type and source distributions from the rollups with caching"""
+    cache_key = versioned_cache_key(f'log_distributions_{hours}')
     data = cache.get(cache_key)
     
     if data is None:
         end_time = timezone.now()
         start_time = end_time - timedelta(hours=hours)
         
-        logs = LogEntry.objects.filter(timestamp__range=(start_time, end_time))
+        rollups = rollup_queryset(start_time, end_time)
         
         # Get distributions in single queries
         log_type_distribution = list(
-            logs.values('log_type')
-                .annotate(count=Count('log_type'))
-                .order_by('-count')
+            rollups.values('log_type')
+                   .annotate(count=Sum('log_count'))
+                   .filter(count__gt=0)
+                   .order_by('-count')
         )
         
         host_distribution = list(
-            logs.values('host_ip')
-                .annotate(count=Count('host_ip'))
-                .order_by('-count')[:10]
+            rollups.values('host_ip')
+                   .annotate(count=Sum('log_count'))
+                   .filter(count__gt=0)
+                   .order_by('-count')[:10]
         )
         
         source_distribution = list(
-            logs.values('source')
-                .annotate(count=Count('source'))
-                .order_by('-count')
+            rollups.values('source')
+                   .annotate(count=Sum('log_count'))
+                   .filter(count__gt=0)
+                   .order_by('-count')
         )
         
         data = {
@@ -178,26 +285,31 @@ def get_cached_log_distributions(hours=24):
     return data
 
 
-def invalidate_log_caches():
-    """Invalidate all log-related caches when new data is added"""
-    cache_keys = [
-        'log_stats',
-        'recent_anomalies_10',
-        'recent_anomalies_5',
-    ]
-    
-    # Clear specific cache keys
-    cache.delete_many(cache_keys)
+def invalidate_log_caches(using=None):
+    """Mark all log-related caches stale when data changes.
+
+    Bumps the data version once per transaction: inside an atomic block the
+    bump is deferred to commit and repeated calls are coalesced, so a batch
+    insert costs a single cache write. Outside a transaction it bumps
+    immediately.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        bump_data_version()
+        return
     
-    # Clear pattern-based caches
-    for hours in [1, 6, 12, 24, 48]:
-        cache.delete(f'hourly_chart_data_{hours}')
-        cache.delete(f'log_distributions_{hours}')
+    # run_on_commit is replaced with a new list after every commit or
+    # rollback, so it identifies the current transaction
+    hooks = connection.run_on_commit
+    if getattr(_pending_bump, 'hooks', None) is hooks:
+        return
+    _pending_bump.hooks = hooks
+    transaction.on_commit(bump_data_version, using=using)
 
 
 def get_cached_system_metrics():
-    """Get system metrics with caching"""
-    cache_key = 'system_metrics'
+    """Get system metrics from the rollups with caching"""
+    cache_key = versioned_cache_key('system_metrics')
     metrics = cache.get(cache_key)
     
     if metrics is None:
@@ -205,29 +317,29 @@ def get_cached_system_metrics():
         end_time = timezone.now()
         start_time = end_time - timedelta(hours=24)
         
-        recent_logs = LogEntry.objects.filter(timestamp__range=(start_time, end_time))
-        recent_anomalies = Anomaly.objects.filter(
-            log_entry__timestamp__range=(start_time, end_time)
-        )
+        rollups = rollup_queryset(start_time, end_time)
+        totals = rollups.aggregate(logs=Sum('log_count'), anomalies=Sum('anomaly_count'))
         
         # Calculate metrics
-        logs_count = recent_logs.count()
-        anomalies_count = recent_anomalies.count()
+        logs_count = totals['logs'] or 0
+        anomalies_count = totals['anomalies'] or 0
         logs_per_hour = logs_count / 24
         anomalies_per_hour = anomalies_count / 24
         anomaly_rate = (anomalies_count / logs_count * 100) if logs_count > 0 else 0
         
         # Get top sources and hosts
         top_sources = list(
-            recent_logs.values('source')
-                      .annotate(count=Count('id'))
-                      .order_by('-count')[:5]
+            rollups.values('source')
+                   .annotate(count=Sum('log_count'))
+                   .filter(count__gt=0)
+                   .order_by('-count')[:5]
         )
         
         top_hosts = list(
-            recent_logs.values('host_ip')
-                      .annotate(count=Count('id'))
-                      .order_by('-count')[:5]
+            rollups.values('host_ip')
+                   .annotate(count=Sum('log_count'))
+                   .filter(count__gt=0)
+                   .order_by('-count')[:5]
         )
         
         metrics = {
@@ -1,18 +1,27 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.core.paginator import Paginator
-from django.db.models import Count, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from django.views.decorators.cache import cache_page
 from django.core.cache import cache
 from datetime import datetime, timedelta
-from .models import LogEntry, Anomaly, SystemStatus, PlatformSettings
+from urllib.parse import urlencode
+from .models import LogEntry, Anomaly, SystemStatus, PlatformSettings, LogRollup
 from api.models import Alert, SystemMetric, LogStatistic  # Import real API models
+from .archive import archive_aliases, get_log
+from .iputils import InvalidCIDR, cidr_q, cidr_range
+from .pagination import InvalidCursor, paginate_by_cursor
+from .stream import open_event_stream
+from .search import (
+    MATCH_COUNT_LIMIT, SearchQueryError, count_message_matches, highlight_terms,
+    parse_search_query, query_terms, search_logs
+)
 from .utils import (
     get_cached_log_stats, get_cached_recent_anomalies, 
     get_cached_hourly_chart_data, get_optimized_filtered_logs,
-    get_cached_log_distributions, get_cached_system_metrics
+    get_cached_log_distributions, get_cached_system_metrics,
+    estimate_filtered_log_stats, parse_filter_datetime
 )
 import json
 import threading
@@ -23,6 +32,7 @@ import time
 from django.conf import settings
 from django.views.decorators.http import require_POST
 from django.http import HttpResponse, HttpResponseBadRequest
+from django.core.handlers.asgi import ASGIRequest
 
 
 @login_required
@@ -71,7 +81,7 @@ def dashboard_overview(request):
     
     context = {
         'total_logs': stats['total_logs'],
-        'total_anomalies': Anomaly.objects.count(),  # TODO: Cache this too
+        'total_anomalies': stats['total_anomalies'],
         'error_count': stats['error_count'],
         'warning_count': stats['warning_count'],
         'info_count': stats['info_count'],
@@ -105,10 +115,39 @@ def dashboard_stats(request):
     
     return JsonResponse({
         'total_logs': stats['total_logs'],
-        'total_anomalies': Anomaly.objects.count(),
+        'total_anomalies': stats['total_anomalies'],
     })
 
 
+@login_required
+def dashboard_stream(request):
+    """Server-Sent Events stream of new anomalies and stats changes
+    
+    Resumes after the ``Last-Event-ID`` header, or ``last_event_id`` on the
+    first connect (EventSource cannot set headers itself). Under ASGI the
+    body is an async iterator, so frames are sent as they are produced.
+    Answers 503 when DASHBOARD_STREAM_MAX_CLIENTS streams are already open;
+    the page then polls instead.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return HttpResponseBadRequest('Invalid Last-Event-ID')
+    
+    stream = open_event_stream(last_id, asynchronous=isinstance(request, ASGIRequest))
+    if stream is None:
+        response = HttpResponse('Too many open event streams', status=503)
+        response['Retry-After'] = '60'
+        return response
+    
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx-style proxies not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def log_details(request):
     """Log details page with optimized search and filtering"""
@@ -122,42 +161,92 @@ def log_details(request):
     log_type = request.GET.get('log_type')
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
+    source = request.GET.get('source')
+    query = request.GET.get('q', '').strip()
+    cidr = request.GET.get('cidr', '').strip()
+    
+    cidr_error = None
+    if cidr:
+        try:
+            cidr_range(cidr)
+        except InvalidCIDR as e:
+            cidr_error = str(e)
+            cidr = ''
     
-    # Use optimized filtering
-    logs = get_optimized_filtered_logs(host_ip, log_type, date_from, date_to)
-    
-    # Calculate statistics based on filtered logs (not global stats)
-    # This ensures stats match what user sees
-    from django.db.models import Case, When, IntegerField
-    
-    filtered_stats = logs.aggregate(
-        total_logs=Count('id'),
-        error_count=Count(Case(
-            When(log_type__iexact='ERROR', then=1),
-            output_field=IntegerField()
-        )),
-        warning_count=Count(Case(
-            When(log_type__iexact='WARNING', then=1),
-            output_field=IntegerField()
-        )),
-        info_count=Count(Case(
-            When(log_type__iexact='INFO', then=1),
-            output_field=IntegerField()
-        )),
-        debug_count=Count(Case(
-            When(log_type__iexact='DEBUG', then=1),
-            output_field=IntegerField()
-        ))
-    )
-    
-    # Pagination with user's preferred items per page
-    paginator = Paginator(logs, items_per_page)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Use optimized filtering (full-text search for q)
+    search_error = None
+    try:
+        logs = get_optimized_filtered_logs(host_ip, log_type, date_from, date_to, source, query, cidr)
+    except SearchQueryError as e:
+        search_error = str(e)
+        query = ''
+        logs = get_optimized_filtered_logs(host_ip, log_type, date_from, date_to, source, cidr=cidr)
+    
+    # Statistics for the filtered logs, estimated from the rollups instead
+    # of aggregating every matching row
+    filtered_stats = estimate_filtered_log_stats(host_ip, log_type, date_from, date_to, source, cidr)
+    total_logs_capped = False
+    if query:
+        # The rollups know nothing about message text; cap by the match
+        # count, which itself stops at MATCH_COUNT_LIMIT (shown as "1000+")
+        matches = count_message_matches(query, MATCH_COUNT_LIMIT)
+        if matches > MATCH_COUNT_LIMIT and filtered_stats['total_logs'] > MATCH_COUNT_LIMIT:
+            filtered_stats['total_logs'] = MATCH_COUNT_LIMIT
+            total_logs_capped = True
+        else:
+            filtered_stats['total_logs'] = min(filtered_stats['total_logs'], matches)
+    
+    # Archived months are only read when a date bound reaches back to them
+    # (a date_to alone covers everything before it)
+    from_datetime = parse_filter_datetime(date_from)
+    to_datetime = parse_filter_datetime(date_to)
+    if from_datetime or to_datetime:
+        logs = [logs] + [
+            get_optimized_filtered_logs(host_ip, log_type, date_from, date_to, source, query, cidr, using=alias)
+            for alias in archive_aliases(from_datetime, to_datetime)
+        ]
+    
+    # Keyset pagination: each page is one indexed range scan, however deep
+    try:
+        page_obj = paginate_by_cursor(
+            logs, 'timestamp',
+            cursor=request.GET.get('cursor'),
+            page_size=items_per_page,
+            estimated_total=filtered_stats['total_logs'],
+        )
+    except InvalidCursor:
+        page_obj = paginate_by_cursor(
+            logs, 'timestamp', page_size=items_per_page,
+            estimated_total=filtered_stats['total_logs'],
+        )
+    
+    # Links keep the current filters
+    filter_params = {
+        key: value for key, value in (
+            ('host_ip', host_ip), ('log_type', log_type),
+            ('date_from', date_from), ('date_to', date_to),
+            ('source', source), ('q', query), ('cidr', cidr),
+        ) if value
+    }
+    first_page_url = '?' + urlencode(filter_params)
+    next_page_url = previous_page_url = None
+    if page_obj.next_cursor:
+        next_page_url = '?' + urlencode({**filter_params, 'cursor': page_obj.next_cursor})
+    if page_obj.previous_cursor:
+        previous_page_url = '?' + urlencode({**filter_params, 'cursor': page_obj.previous_cursor})
+    
+    if query:
+        terms = query_terms(parse_search_query(query))
+        for log in page_obj:
+            log.snippet = highlight_terms(log.log_message, terms, length=120)
     
     context = {
         'page_obj': page_obj,
+        'first_page_url': first_page_url,
+        'next_page_url': next_page_url,
+        'previous_page_url': previous_page_url,
         'total_logs': filtered_stats['total_logs'],
+        'total_logs_capped': total_logs_capped,
         'error_count': filtered_stats['error_count'],
         'warning_count': filtered_stats['warning_count'],
         'info_count': filtered_stats['info_count'],
@@ -166,6 +255,11 @@ def log_details(request):
         'log_type': log_type,
         'date_from': date_from,
         'date_to': date_to,
+        'source': source,
+        'query': query,
+        'search_error': search_error,
+        'cidr': cidr,
+        'cidr_error': cidr_error,
     }
     
     return render(request, 'dashboard/log_details.html', context)
@@ -176,17 +270,16 @@ def api_dashboard_data(request):
     try:
         from .utils import get_system_status
         
-        # Get total logs count
-        total_logs = LogEntry.objects.count()
-        
-        # Get total anomalies count
-        total_anomalies = Anomaly.objects.count()
+        # Totals come from the global counters (no table scans)
+        stats = get_cached_log_stats()
+        total_logs = stats['total_logs']
+        total_anomalies = stats['total_anomalies']
         
         # Get log type counts
-        error_count = LogEntry.objects.filter(log_type='ERROR').count()
-        warning_count = LogEntry.objects.filter(log_type='WARNING').count()
-        info_count = LogEntry.objects.filter(log_type='INFO').count()
-        debug_count = LogEntry.objects.filter(log_type='DEBUG').count()
+        error_count = stats['error_count']
+        warning_count = stats['warning_count']
+        info_count = stats['info_count']
+        debug_count = stats['debug_count']
     except Exception as e:
         # Return error details for debugging
         import traceback
@@ -285,18 +378,39 @@ def api_dashboard_data(request):
 
 
 def api_anomaly_feed(request):
-    """API endpoint for real-time anomaly feed"""
-    # Get recent anomalies with pagination
-    page = int(request.GET.get('page', 1))
-    per_page = int(request.GET.get('per_page', 10))
+    """API endpoint for real-time anomaly feed
     
-    anomalies = Anomaly.objects.select_related('log_entry').order_by('-detected_at')
-    paginator = Paginator(anomalies, per_page)
+    Cursor paginated: pass ``cursor`` from ``next_cursor``/``previous_cursor``
+    to move between pages. ``cidr`` limits the feed to a subnet.
+    """
+    try:
+        per_page = min(max(int(request.GET.get('per_page', 10)), 1), 200)
+    except ValueError:
+        per_page = 10
+    
+    anomalies = Anomaly.objects.select_related('log_entry')
+    estimated_total = get_cached_log_stats()['total_anomalies']
+    
+    # Optional subnet filter, e.g. ?cidr=10.0.0.0/8
+    cidr = request.GET.get('cidr')
+    if cidr:
+        try:
+            anomalies = anomalies.filter(cidr_q(cidr, 'log_entry__ip_numeric'))
+        except InvalidCIDR as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        estimated_total = LogRollup.objects.filter(
+            cidr_q(cidr), resolution='day'
+        ).aggregate(total=Sum('anomaly_count'))['total'] or 0
     
     try:
-        page_obj = paginator.page(page)
-    except:
-        page_obj = paginator.page(1)
+        page_obj = paginate_by_cursor(
+            anomalies, 'detected_at',
+            cursor=request.GET.get('cursor'),
+            page_size=per_page,
+            estimated_total=estimated_total,
+        )
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
     
     anomalies_data = []
     for anomaly in page_obj:
@@ -313,16 +427,63 @@ def api_anomaly_feed(request):
         'anomalies': anomalies_data,
         'has_next': page_obj.has_next(),
         'has_previous': page_obj.has_previous(),
-        'current_page': page_obj.number,
-        'total_pages': paginator.num_pages,
+        'next_cursor': page_obj.next_cursor,
+        'previous_cursor': page_obj.previous_cursor,
+        'estimated_total': page_obj.estimated_total,
+    })
+
+
+@login_required
+def api_log_search(request):
+    """API endpoint for ranked full-text log search
+    
+    GET ?q=<query>[&host_ip=&source=&cidr=&log_type=&date_from=&date_to=&limit=]
+    Query syntax: words, "phrases", prefix*, AND/OR/NOT, -exclude, (groups).
+    Results are best match first with <mark>-highlighted snippets.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+    except ValueError:
+        limit = 50
+    
+    started = time.perf_counter()
+    try:
+        logs = get_optimized_filtered_logs(
+            request.GET.get('host_ip'), request.GET.get('log_type'),
+            request.GET.get('date_from'), request.GET.get('date_to'),
+            request.GET.get('source'), cidr=request.GET.get('cidr'),
+        )
+        results = search_logs(query, logs, limit=limit)
+    except (SearchQueryError, InvalidCIDR) as e:
+        return JsonResponse({'error': str(e), 'query': query}, status=400)
+    
+    return JsonResponse({
+        'query': query,
+        'count': len(results),
+        'took_ms': round((time.perf_counter() - started) * 1000, 2),
+        'results': [
+            {
+                'id': result['log'].id,
+                'timestamp': result['log'].timestamp.isoformat(),
+                'host_ip': result['log'].host_ip,
+                'log_type': result['log'].log_type,
+                'source': result['log'].source,
+                'rank': result['rank'],
+                'snippet': result['snippet'],
+            } for result in results
+        ],
     })
 
 
 @login_required
 def api_log_detail(request, log_id):
-    """API endpoint to get detailed information about a specific log entry"""
+    """API endpoint to get detailed information about a specific log entry
+    
+    Falls back to the cold archive for logs no longer in the main table.
+    """
     try:
-        log = LogEntry.objects.get(id=log_id)
+        log = get_log(log_id)
         
         # Check if this log has any anomalies
         anomalies = log.anomalies.all()
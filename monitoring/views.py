@@ -11,6 +11,7 @@ import json
 def system_monitoring(request):
     """System monitoring page"""
     from dashboard.models import LogEntry, Anomaly
+    from dashboard.counters import get_counters
     from api.models import LocalSystemStatus
     from datetime import timedelta
     import psutil
@@ -92,7 +93,7 @@ def system_monitoring(request):
         db_status = 'Healthy'
         db_badge = 'bg-success'
         try:
-            log_count = LogEntry.objects.count()
+            log_count = get_counters()['total_logs']
             db_detail = f'{log_count} total log entries'
         except Exception as db_error:
             db_status = 'Error'
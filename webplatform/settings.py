@@ -73,6 +73,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.RequestDecompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -278,6 +279,81 @@ REST_FRAMEWORK = {
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
 }
 
+# Log ingestion
+# Maximum number of records accepted by a single batch request
+API_MAX_BATCH_SIZE = int(os.environ.get('API_MAX_BATCH_SIZE', '5000'))
+# Streamed NDJSON pushes are committed in chunks of this many records
+API_STREAM_CHUNK_SIZE = int(os.environ.get('API_STREAM_CHUNK_SIZE', '1000'))
+# Longest single NDJSON line accepted by the streaming endpoint (bytes)
+API_STREAM_MAX_LINE_BYTES = 1024 * 1024
+# Limits on decompressed request bodies (Content-Encoding: gzip/zstd),
+# guarding against zip bombs. Streaming endpoints decode incrementally.
+API_MAX_DECOMPRESSED_BODY_SIZE = int(os.environ.get('API_MAX_DECOMPRESSED_BODY_SIZE', 64 * 1024 * 1024))
+API_MAX_DECOMPRESSED_STREAM_SIZE = int(os.environ.get('API_MAX_DECOMPRESSED_STREAM_SIZE', 2 * 1024 ** 3))
+
+# 'sync' writes logs to the database inside the request. 'write_behind'
+# appends them to a local spool and returns 202; run
+# `python manage.py drain_ingest_spool` (e.g. as an always-on task) to load them.
+LOG_INGEST_MODE = os.environ.get('LOG_INGEST_MODE', 'sync')
+LOG_SPOOL_PATH = Path(os.environ.get('LOG_SPOOL_PATH', BASE_DIR / 'spool' / 'ingest_spool.sqlite3'))
+LOG_SPOOL_DRAIN_BATCH_SIZE = int(os.environ.get('LOG_SPOOL_DRAIN_BATCH_SIZE', '5000'))
+
+# Cold archive: `python manage.py archive_logs` (e.g. nightly from cron) moves
+# logs older than LOG_ARCHIVE_AFTER_DAYS into one SQLite file per month under
+# LOG_ARCHIVE_DIR, keeping the hot LogEntry table and its indexes small.
+LOG_ARCHIVE_DIR = Path(os.environ.get('LOG_ARCHIVE_DIR', BASE_DIR / 'archive'))
+LOG_ARCHIVE_AFTER_DAYS = int(os.environ.get('LOG_ARCHIVE_AFTER_DAYS', '90'))
+LOG_ARCHIVE_BATCH_SIZE = int(os.environ.get('LOG_ARCHIVE_BATCH_SIZE', '5000'))
+
+# Overview page live updates (Server-Sent Events). Each stream checks the
+# log/anomaly counters every DASHBOARD_STREAM_POLL_INTERVAL seconds and closes
+# after DASHBOARD_STREAM_MAX_SECONDS, after which the browser reconnects.
+# Under a sync (WSGI) server an open stream holds a worker thread for that
+# whole time, so each process serves at most DASHBOARD_STREAM_MAX_CLIENTS
+# streams (0: no limit); further clients get a 503 and the page polls. Keep
+# it below the worker's thread count.
+DASHBOARD_STREAM_POLL_INTERVAL = float(os.environ.get('DASHBOARD_STREAM_POLL_INTERVAL', '1.0'))
+DASHBOARD_STREAM_MAX_SECONDS = int(os.environ.get('DASHBOARD_STREAM_MAX_SECONDS', '300'))
+DASHBOARD_STREAM_MAX_CLIENTS = int(os.environ.get('DASHBOARD_STREAM_MAX_CLIENTS', '4'))
+DASHBOARD_STREAM_HEARTBEAT = 15
+
+# Channel layer for the WebSocket feed (ASGI deployments). The in-memory layer
+# only reaches consumers in the same process, so each server process runs its
+# own publisher; with CHANNEL_REDIS_URL set (needs channels-redis), run one
+# `python manage.py publish_dashboard_events` for all of them.
+CHANNEL_REDIS_URL = os.environ.get('CHANNEL_REDIS_URL')
+if CHANNEL_REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [CHANNEL_REDIS_URL]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}
+    }
+
+# SystemMetric retention: raw samples are kept for METRIC_RAW_RETENTION_DAYS,
+# then folded into 1-minute and 1-hour buckets, which are kept for
+# METRIC_MINUTE_RETENTION_DAYS and METRIC_HOUR_RETENTION_DAYS. Applied by
+# `python manage.py apply_metric_retention` (looping, or --once from cron).
+METRIC_RAW_RETENTION_DAYS = int(os.environ.get('METRIC_RAW_RETENTION_DAYS', '7'))
+METRIC_MINUTE_RETENTION_DAYS = int(os.environ.get('METRIC_MINUTE_RETENTION_DAYS', '30'))
+METRIC_HOUR_RETENTION_DAYS = int(os.environ.get('METRIC_HOUR_RETENTION_DAYS', '365'))
+METRIC_RETENTION_BATCH_SIZE = int(os.environ.get('METRIC_RETENTION_BATCH_SIZE', '5000'))
+# Log rollup minute buckets (dashboard.rollups) are dropped by the same command
+# after LOG_ROLLUP_MINUTE_RETENTION_DAYS; older windows read hour buckets.
+LOG_ROLLUP_MINUTE_RETENTION_DAYS = int(os.environ.get('LOG_ROLLUP_MINUTE_RETENTION_DAYS', '7'))
+
+# Ingestion viewsets (router basenames: alert, metric, statistic, raw-output)
+# that validate with the compiled fast validator instead of DRF serializers
+API_FAST_VALIDATION_ENDPOINTS = [
+    endpoint.strip()
+    for endpoint in os.environ.get('API_FAST_VALIDATION_ENDPOINTS', '').split(',')
+    if endpoint.strip()
+]
+
 # CORS Configuration
 # Allow local network to push data to PythonAnywhere
 # Read from environment variable: CORS_ALLOWED_ORIGINS=http://school1.edu,http://192.168.1.100
@@ -301,3 +377,55 @@ if os.environ.get('CORS_ALLOW_ALL_ORIGINS', 'False') == 'True':
 KAFKA_BROKER_URL = os.environ.get('KAFKA_BROKER_URL', 'localhost:9092')
 KAFKA_TOPIC_LOGS = os.environ.get('KAFKA_TOPIC_LOGS', 'log_topic')
 KAFKA_TOPIC_ANOMALIES = os.environ.get('KAFKA_TOPIC_ANOMALIES', 'anomalies')
+
+# Model inference micro-batching (dashboard.batching). Concurrent
+# predict_batch/predict_single calls are queued and run together once
+# MODEL_BATCH_MAX_SIZE messages are waiting or the oldest has waited
+# MODEL_BATCH_MAX_WAIT_MS, trading a few milliseconds of latency for
+# full forward passes under load.
+MODEL_BATCHING_ENABLED = os.environ.get('MODEL_BATCHING_ENABLED', 'True') == 'True'
+MODEL_BATCH_MAX_SIZE = int(os.environ.get('MODEL_BATCH_MAX_SIZE', '32'))
+MODEL_BATCH_MAX_WAIT_MS = float(os.environ.get('MODEL_BATCH_MAX_WAIT_MS', '5'))
+
+# Template-keyed score cache in front of the model (dashboard.score_cache).
+# Messages are reduced to templates (numbers, IPs, hex ids and paths masked)
+# and only templates not seen yet are scored; MODEL_SCORE_CACHE_SIZE bounds
+# the LRU. With MODEL_SCORE_CACHE_PATH set the cache is saved there every
+# MODEL_SCORE_CACHE_SAVE_INTERVAL seconds and on exit, and reloaded on start.
+MODEL_SCORE_CACHE_ENABLED = os.environ.get('MODEL_SCORE_CACHE_ENABLED', 'True') == 'True'
+MODEL_SCORE_CACHE_SIZE = int(os.environ.get('MODEL_SCORE_CACHE_SIZE', '100000'))
+MODEL_SCORE_CACHE_PATH = os.environ.get('MODEL_SCORE_CACHE_PATH')
+MODEL_SCORE_CACHE_SAVE_INTERVAL = int(os.environ.get('MODEL_SCORE_CACHE_SAVE_INTERVAL', '300'))
+
+# Model files for ModelManager (dashboard.ml_utils). Relative paths resolve
+# against the working directory. MODEL_TOKENIZER is a Hugging Face name or a
+# local directory. Nothing is loaded at import: the first prediction loads the
+# model, or MODEL_WARM_ON_START=True starts loading in a background thread
+# when the process starts (set it for the processes that score logs).
+MODEL_PATH = os.environ.get('MODEL_PATH', '../output/university_logs/bert/best_bert.pth')
+MODEL_VOCAB_PATH = os.environ.get('MODEL_VOCAB_PATH', '../output/university_logs/vocab.pkl')
+MODEL_TOKENIZER = os.environ.get('MODEL_TOKENIZER', 'bert-base-uncased')
+MODEL_WARM_ON_START = os.environ.get('MODEL_WARM_ON_START', 'False') == 'True'
+
+# CPU inference backend for ModelManager (dashboard.inference): 'eager' (fp32
+# PyTorch), 'int8' (dynamic quantization), or 'torchscript' / 'onnx', which
+# load the graphs written to MODEL_EXPORT_DIR by `python manage.py export_model`.
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'eager')
+MODEL_EXPORT_DIR = Path(os.environ.get('MODEL_EXPORT_DIR', BASE_DIR / 'model_exports'))
+
+# Dynamic anomaly threshold used by run_kafka_worker when it scores logs
+# (dashboard.dynamic_threshold): every ANOMALY_THRESHOLD_RECOMPUTE_INTERVAL
+# seconds it moves to the best-F1 candidate for the last
+# ANOMALY_THRESHOLD_WINDOW_SIZE scores on each side, and saves it to
+# ANOMALY_THRESHOLD_PATH (the threshold file written by model evaluation).
+ANOMALY_THRESHOLD_PATH = os.environ.get('ANOMALY_THRESHOLD_PATH', '../output/university_logs/bert_threshold.pkl')
+ANOMALY_THRESHOLD_WINDOW_SIZE = int(os.environ.get('ANOMALY_THRESHOLD_WINDOW_SIZE', '1000'))
+ANOMALY_THRESHOLD_RECOMPUTE_INTERVAL = int(os.environ.get('ANOMALY_THRESHOLD_RECOMPUTE_INTERVAL', '300'))
+
+# Multi-process scoring (dashboard.inference_pool). With MODEL_INFERENCE_WORKERS
+# > 0 ModelManager scores in that many worker processes, each running eager
+# fp32 with MODEL_INFERENCE_THREADS intra-op threads (default: cores / workers)
+# on weights memory-mapped from one file (`export_model --format weights`), so
+# the weights are held in RAM once. MODEL_BACKEND does not apply to the pool.
+MODEL_INFERENCE_WORKERS = int(os.environ.get('MODEL_INFERENCE_WORKERS', '0'))
+MODEL_INFERENCE_THREADS = int(os.environ.get('MODEL_INFERENCE_THREADS', '0')) or None